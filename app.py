@@ -1,27 +1,47 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import (Flask, Response, g, has_request_context, render_template, request,
+                   jsonify, send_file, session, stream_with_context, url_for)
 import pandas as pd
 import numpy as np
-import matplotlib; matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.metrics import accuracy_score
-from sklearn.inspection import permutation_importance
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
+import joblib
+from pandas.api.types import union_categoricals
+from threadpoolctl import threadpool_limits
 import io
-import base64
+import bisect
+import click
+import functools
+import glob
+import hashlib
+import importlib
+import json
 import logging
+import math
 import os
+import queue
+import secrets
+import shutil
+import sys
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 import time
 import threading
 import webbrowser
 import warnings; warnings.filterwarnings('ignore')
+try:
+    import fcntl
+except ImportError:  # Windows, where files are locked with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+# matplotlib, scikit-learn and reportlab take over a second to import and
+# most requests never touch them, so they are imported where they are used;
+# preload_analytics loads them up front (e.g. in the gunicorn master)
+ANALYTICS_MODULES = ['matplotlib.figure', 'matplotlib.backends.backend_agg',
+                     'reportlab.platypus', 'reportlab.lib.styles', 'sklearn.ensemble',
+                     'sklearn.model_selection', 'sklearn.preprocessing',
+                     'sklearn.metrics']
 
 # Configure logging
 logging.basicConfig(filename='tmp/app.log', level=logging.DEBUG, 
@@ -29,14 +49,444 @@ logging.basicConfig(filename='tmp/app.log', level=logging.DEBUG,
 
 app = Flask(__name__)
 
-# Global variables
-global_data = None
-global_model = None
-feature_importance = None
-model_accuracy = None
-churn_rate = None
-is_churn = None
-current_revenue = 0
+# Background job settings
+JOBS_DIR = os.path.join('tmp', 'jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', max(2, os.cpu_count() or 1)))
+# Threads (and search processes) each job may use, so that JOB_WORKERS jobs
+# running side by side do not oversubscribe the cores
+JOB_THREADS = int(os.environ.get('JOB_THREADS',
+                                 max(1, (os.cpu_count() or 1) // JOB_WORKERS)))
+JOB_TTL_SECONDS = 24 * 60 * 60
+PIPELINE_STAGES = ['clean', 'train', 'importance', 'charts']
+
+# Compute governor: the analysis jobs of all web workers share COMPUTE_CORES
+# cores (default: all but COMPUTE_RESERVED_CORES, left to request handling).
+# A job starts once a core is free and gets up to JOB_THREADS of them;
+# waiting jobs start in COMPUTE_PRIORITIES order. Requests that would take
+# a priority past its COMPUTE_QUEUE_LIMITS queued or running jobs get 429
+# with a Retry-After estimate. Job and chart processes run at COMPUTE_NICE.
+COMPUTE_DIR = os.path.join('tmp', 'compute')
+COMPUTE_RESERVED_CORES = int(os.environ.get('COMPUTE_RESERVED_CORES',
+                                            1 if (os.cpu_count() or 1) > 1 else 0))
+COMPUTE_CORES = int(os.environ.get(
+    'COMPUTE_CORES', max(1, (os.cpu_count() or 1) - COMPUTE_RESERVED_CORES)))
+COMPUTE_PRIORITIES = ['interactive', 'batch']
+COMPUTE_QUEUE_LIMITS = {
+    'interactive': int(os.environ.get('COMPUTE_QUEUE_INTERACTIVE', 8)),
+    'batch': int(os.environ.get('COMPUTE_QUEUE_BATCH', 16))
+}
+COMPUTE_NICE = int(os.environ.get('COMPUTE_NICE', 10))
+COMPUTE_POLL_SECONDS = 0.2
+COMPUTE_DEFAULT_SECONDS = 30
+
+# Model training settings
+PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [10, 20, None],
+    'min_samples_split': [2, 5]
+}
+CV_FOLDS = 5
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+PERMUTATION_REPEATS = 10
+
+# Feature importance engine (see IMPORTANCE_ENGINES); every engine stops
+# after IMPORTANCE_MAX_SECONDS (0 = no limit) with its estimate so far
+IMPORTANCE_METHOD = os.environ.get('IMPORTANCE_METHOD', 'permutation')
+IMPORTANCE_MAX_SECONDS = float(os.environ.get('IMPORTANCE_MAX_SECONDS', 10))
+IMPORTANCE_SAMPLE_ROWS = 500
+IMPORTANCE_STACK_ROWS = 100000
+IMPORTANCE_BLOCK_ROWS = 256
+
+# Hyperparameter search: 'grid' (exhaustive GridSearchCV) or 'halving'
+# (successive halving over sample count and trees, stopped by the budgets)
+SEARCH_STRATEGY = os.environ.get('SEARCH_STRATEGY', 'grid')
+HALVING_FACTOR = 3
+SEARCH_MAX_FITS = int(os.environ.get('SEARCH_MAX_FITS', 0))
+SEARCH_MAX_SECONDS = float(os.environ.get('SEARCH_MAX_SECONDS', 0))
+
+# Model engine (see MODEL_ENGINES): 'random_forest', tuned by the search
+# above, or 'hist_gradient_boosting', which splits text features natively on
+# their category codes and picks its number of iterations by early stopping.
+# Tree engines need no feature scaling. With MODEL_COMPARE the other engines
+# are trained on the same split too, so their accuracy and training time can
+# be compared; set MODEL_COMPARE=0 to train only MODEL_ENGINE.
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', 'random_forest')
+MODEL_COMPARE = os.environ.get('MODEL_COMPARE', '1') != '0'
+BOOSTING_MAX_ITER = 500
+BOOSTING_LEARNING_RATE = 0.1
+BOOSTING_MAX_BINS = 255
+BOOSTING_VALIDATION = 0.1
+BOOSTING_PATIENCE = 10
+BOOSTING_MIN_VALIDATION_ROWS = 50
+
+# Append uploads add a slice of customers to the current dataset. The slice
+# grows the forest with warm-started trees unless the drift check finds a
+# feature whose population stability index is above DRIFT_PSI_THRESHOLD or
+# accuracy on the slice more than DRIFT_ACCURACY_DROP below the stored
+# accuracy; then the combined dataset is retrained from scratch.
+APPEND_STAGES = ['clean', 'drift', 'train', 'importance', 'charts']
+APPEND_MIN_TREES = 10
+DRIFT_BINS = 10
+DRIFT_PSI_THRESHOLD = float(os.environ.get('DRIFT_PSI_THRESHOLD', 0.25))
+DRIFT_ACCURACY_DROP = float(os.environ.get('DRIFT_ACCURACY_DROP', 0.05))
+
+# Uploads of PROGRESSIVE_MIN_BYTES or more (or sent with progressive=1) are
+# analysed in steps, each published on the job as it finishes: a preview
+# from rows sampled across the file before it is read in full, then a model
+# trained on a PROGRESSIVE_SAMPLE_ROWS sample of the cleaned data with exact
+# churn rate and charts, then the full analysis. Samples are stratified by
+# churn and PROGRESSIVE_STRATA and trained with PROGRESSIVE_ENGINE.
+# Preliminary results are read-only: they cannot be appended to, retrained,
+# scored against or loaded as models, and are deleted with the job.
+PROGRESSIVE_STAGES = ['preview', 'clean', 'sample', 'train', 'importance', 'charts']
+PROGRESSIVE_MIN_BYTES = int(os.environ.get('PROGRESSIVE_MIN_BYTES', 50 * 1024 * 1024))
+PROGRESSIVE_PREVIEW_ROWS = int(os.environ.get('PROGRESSIVE_PREVIEW_ROWS', 10000))
+PROGRESSIVE_SAMPLE_ROWS = int(os.environ.get('PROGRESSIVE_SAMPLE_ROWS', 100000))
+PROGRESSIVE_BLOCKS = 200
+PROGRESSIVE_STRATA = ['contract']
+PROGRESSIVE_ENGINE = 'hist_gradient_boosting'
+PROGRESSIVE_IMPORTANCE_SECONDS = 1
+PRELIMINARY_ERROR = 'Preliminary results are read-only; wait for the full analysis'
+
+# Bump when the stored analysis format changes so old entries are not reused
+ANALYSIS_VERSION = 10
+
+# Chart settings; images are served with Cache-Control max-age CHART_MAX_AGE
+CHART_WORKERS = int(os.environ.get('CHART_WORKERS', 2))
+CHART_MAX_AGE = 7 * 24 * 60 * 60
+CHART_TENURE_BINS = 30
+CHART_TENURE_GROUPS = 10
+CHART_CHARGES_BINS = 60
+
+# Segment cube: customers, churned customers and monthly charges of every
+# category of each text/boolean column with at most SEGMENT_MAX_LABELS
+# values, of tenure and charge bands, and of the SEGMENT_PAIRS crossings.
+# Numeric 0/1 flags such as SeniorCitizen count as boolean columns
+SEGMENT_MAX_LABELS = 50
+SEGMENT_TENURE_EDGES = [0, 6, 12, 24, 36, 48, 60]
+SEGMENT_PAIRS = [
+    ('contract', 'internetservice'),
+    ('contract', 'paymentmethod'),
+    ('contract', 'tenure_band'),
+    ('paymentmethod', 'tenure_band'),
+    ('internetservice', 'techsupport'),
+    ('internetservice', 'onlinesecurity'),
+    ('contract', 'charges_band'),
+    ('seniorcitizen', 'contract')
+]
+SEGMENT_METRICS = ['customers', 'churned', 'charges', 'churned_charges']
+SEGMENT_MIN_CUSTOMERS = 20
+SEGMENT_ALIASES = {
+    'paymentmethod': ['payment method', 'payment'],
+    'internetservice': ['internet service', 'internet'],
+    'techsupport': ['tech support'],
+    'onlinesecurity': ['online security'],
+    'onlinebackup': ['online backup'],
+    'deviceprotection': ['device protection'],
+    'streamingtv': ['streaming tv'],
+    'streamingmovies': ['streaming movies'],
+    'multiplelines': ['multiple lines'],
+    'phoneservice': ['phone service'],
+    'paperlessbilling': ['paperless billing', 'paperless'],
+    'seniorcitizen': ['senior citizen', 'senior'],
+    'tenure_band': ['tenure'],
+    'charges_band': ['monthly charges', 'charges']
+}
+
+# Revenue projection: customers are grouped into PROJECTION_BINS bins of
+# similar churn probability, and PROJECTION_SCENARIOS month-by-month
+# survival paths are simulated PROJECTION_CHUNK scenarios at a time
+PROJECTION_BINS = 8
+PROJECTION_MONTHS = int(os.environ.get('PROJECTION_MONTHS', 12))
+PROJECTION_MAX_MONTHS = 60
+PROJECTION_SCENARIOS = int(os.environ.get('PROJECTION_SCENARIOS', 10000))
+PROJECTION_MAX_SCENARIOS = 50000
+PROJECTION_CHUNK = 2000
+PROJECTION_NORMAL_VARIANCE = 9
+PROJECTION_PERCENTILES = [5, 50, 95]
+
+# PDF reports are built in the background by REPORT_WORKERS threads of the
+# web process and cached per dataset and revenue; a build that has not
+# finished after REPORT_BUILD_TIMEOUT seconds is started again
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 1))
+REPORT_STAGES = ['charts', 'pdf']
+REPORT_BUILD_TIMEOUT = 10 * 60
+
+# Analysis store settings
+STORE_DIR = os.path.join('tmp', 'store')
+STORE_MAX_BYTES = int(os.environ.get('STORE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+
+# Upload ingestion settings: uploads are spooled to disk and cleaned in chunks
+UPLOADS_DIR = os.path.join('tmp', 'uploads')
+UPLOAD_BLOCK_BYTES = 1024 * 1024
+INGEST_CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 100000))
+MEDIAN_GATHER_LIMIT = 1 << 20
+
+# Single-customer scoring: concurrent requests are scored together, up to
+# PREDICT_BATCH_ROWS at a time, waiting at most PREDICT_BATCH_WAIT seconds
+# for company (0 only batches requests that are already queued)
+PREDICT_BATCH_ROWS = int(os.environ.get('PREDICT_BATCH_ROWS', 64))
+PREDICT_BATCH_WAIT = float(os.environ.get('PREDICT_BATCH_WAIT', 0))
+FOREST_ARRAYS = ['forest_feature', 'forest_threshold', 'forest_left', 'forest_right',
+                 'forest_value', 'forest_roots']
+
+# Tracing: request, span and job stage durations are histograms kept per
+# process and written to METRICS_DIR every METRICS_FLUSH_SECONDS; /metrics
+# adds up all processes. With PROFILE_SLOW_SECONDS > 0 the stacks of running
+# requests and jobs are sampled every PROFILE_INTERVAL seconds and those
+# that took at least PROFILE_SLOW_SECONDS are written to PROFILE_DIR.
+METRICS_DIR = os.path.join('tmp', 'metrics')
+METRICS_FLUSH_SECONDS = 5
+METRICS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+                   60, 120, 300]
+METRICS_HELP = {
+    'churn_request_duration_seconds': 'Time to handle an HTTP request.',
+    'churn_span_duration_seconds': 'Time spent in a traced block of work.',
+    'churn_job_stage_duration_seconds':
+        'Time spent in a stage of a background analysis job.'
+}
+PROFILE_SLOW_SECONDS = float(os.environ.get('PROFILE_SLOW_SECONDS', 0))
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = os.path.join('tmp', 'profiles')
+
+_job_executor = None
+_job_threads = -1
+_batch_lock = threading.Lock()
+_job_executor_lock = threading.Lock()
+_chart_executor = None
+_chart_executor_lock = threading.Lock()
+_prediction_batcher = None
+_prediction_batcher_lock = threading.Lock()
+_report_executor = None
+_report_executor_lock = threading.Lock()
+
+class Metrics:
+    """Duration histograms, exposed in the Prometheus text format.
+
+    Each process counts into its own histograms and writes them to
+    directory/<pid>.json now and then; render() adds up the files of all
+    processes, so job workers and every web worker appear in one scrape.
+    A forked child starts from empty histograms.
+    """
+
+    def __init__(self, directory, buckets):
+        """Flush histograms to directory; buckets are upper bounds in seconds."""
+        self.directory = directory
+        self.buckets = buckets
+        self._reset()
+        if hasattr(os, 'register_at_fork'):  # Windows spawns rather than forks
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Start with no histograms; also run in forked children."""
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._dirty = False
+
+    def observe(self, name, seconds, **labels):
+        """Count seconds in the histogram of name and labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            histogram['counts'][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            self._dirty = True
+
+    def _snapshot(self):
+        """This process's histograms as JSON-ready entries."""
+        with self._lock:
+            return [{'name': name, 'labels': dict(labels), 'counts': list(h['counts']),
+                     'sum': h['sum']}
+                    for (name, labels), h in self._histograms.items()]
+
+    def flush(self, force=True):
+        """Write this process's histograms for /metrics.
+
+        Unforced flushes happen at most every METRICS_FLUSH_SECONDS.
+        """
+        recent = time.time() - self._flushed_at < METRICS_FLUSH_SECONDS
+        if not self._dirty or (not force and recent):
+            return
+        self._dirty, self._flushed_at = False, time.time()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Histograms of all processes, summed per name and labels."""
+        own = os.path.join(self.directory, f'{os.getpid()}.json')
+        entries = self._snapshot()
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    entries.extend(json.load(f))
+            except (OSError, ValueError):
+                continue
+        merged = {}
+        for entry in entries:
+            key = (entry['name'], tuple(sorted(entry['labels'].items())))
+            if key not in merged:
+                merged[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            merged[key]['counts'] = [a + b for a, b in
+                                     zip(merged[key]['counts'], entry['counts'])]
+            merged[key]['sum'] += entry['sum']
+        return merged
+
+    def render(self):
+        """All histograms in the Prometheus text format."""
+        lines, previous = [], None
+        for (name, labels), histogram in sorted(self.collect().items()):
+            if name != previous:
+                lines += [f'# HELP {name} {METRICS_HELP.get(name, name)}',
+                          f'# TYPE {name} histogram']
+                previous = name
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            prefix = f'{label_text},' if label_text else ''
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_text}}} {histogram["sum"]:.6f}')
+            lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+class SlowWorkProfiler:
+    """Sampling profiler that keeps the stacks of slow requests and jobs.
+
+    Threads register with start(); a daemon thread samples their stacks
+    every interval seconds. stop() discards the samples of fast work and
+    writes those of work slower than threshold seconds to directory as
+    folded stacks ("outer;inner;leaf count" lines, as read by flamegraph.pl
+    and speedscope).
+    """
+
+    def __init__(self, directory, interval, threshold):
+        """Sample every interval seconds; keep work slower than threshold seconds."""
+        self.directory = directory
+        self.interval = interval
+        self.threshold = threshold
+        self._reset()
+        if hasattr(os, 'register_at_fork'):  # Windows spawns rather than forks
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Forget all samples and the sampling thread; also run in forked children."""
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+    def start(self):
+        """Sample the calling thread, starting the sampler if needed."""
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self, label, seconds):
+        """Return the path of the written profile, or None if the work was fast."""
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+        if not samples or seconds < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = ''.join(c if c.isalnum() else '_' for c in label).strip('_')
+        stamp = f'{datetime.now():%Y%m%d-%H%M%S}'
+        path = os.path.join(self.directory, f'{stamp}-{name}-{os.getpid()}.folded')
+        with open(path, 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in samples.most_common())
+        logging.warning(f"Slow {label}: {seconds:.2f}s, profile written to {path}")
+        return path
+
+    def _run(self):
+        """Add the folded stack of every registered thread each interval."""
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                idents = list(self._samples)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame, stack = frames.get(ident), []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f'{code.co_name} ({filename}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                with self._lock:
+                    if ident in self._samples and stack:
+                        self._samples[ident][';'.join(reversed(stack))] += 1
+
+metrics = Metrics(METRICS_DIR, METRICS_BUCKETS)
+profiler = SlowWorkProfiler(PROFILE_DIR, PROFILE_INTERVAL, PROFILE_SLOW_SECONDS)
+
+@contextmanager
+def span(name):
+    """Time a block of work for /metrics and the request's Server-Timing header."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe('churn_span_duration_seconds', seconds, span=name)
+        if has_request_context():
+            g.setdefault('spans', []).append((name, seconds))
+
+@contextmanager
+def profiled(label):
+    """Sample the stacks of a job run when PROFILE_SLOW_SECONDS is set."""
+    if not PROFILE_SLOW_SECONDS:
+        yield
+        return
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop(label, time.perf_counter() - started)
+
+def is_text(values):
+    """True for text columns, whether plain object or categorical."""
+    return values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype)
+
+def compact_numbers(values):
+    """Numeric array in the narrowest dtype that keeps every value exactly."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return pd.to_numeric(values, downcast='integer')
+    if values.dtype.kind == 'f' and values.dtype.itemsize > 4:
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow, values, equal_nan=True):
+            return narrow
+    return values
+
+def compact_frame(df):
+    """Hold a cleaned frame in its smallest exact dtypes, in place.
+
+    Text becomes categorical, a yes/no churn column boolean and numbers
+    the narrowest integer type, or float32 where no value changes.
+    """
+    churn_col = find_churn_column(df)
+    for col in df.columns:
+        values = df[col]
+        if is_text(values):
+            if col == churn_col and set(values.dropna().unique()) <= {'yes', 'no'}:
+                df[col] = (values == 'yes').to_numpy()
+            elif values.dtype == object:
+                df[col] = values.astype('category')
+        elif values.dtype.kind in 'iuf':
+            df[col] = compact_numbers(values.to_numpy())
+    return df
 
 def clean_data(df):
     """Clean and preprocess the input dataframe."""
@@ -103,119 +553,1088 @@ def clean_data(df):
         data_quality_score = 100 * (1 - (missing_ratio + duplicate_ratio) / 2)
         
         logging.info("Data cleaning completed successfully")
-        return df, data_quality_score
+        return compact_frame(df), data_quality_score
     
     except Exception as e:
         logging.error(f"Error in clean_data: {str(e)}")
         raise
 
-def generate_charts(df):
-    """Generate charts for visualization with error handling."""
-    try:
-        logging.info("Generating charts")
-        churn_col = is_churn
-        charts = {}
-
-        # Churn Distribution
-        plt.figure(figsize=(8, 6))
-        churn_counts = df[churn_col].replace({'yes': 1, 'no': 0, True: 1, False: 0}).value_counts()
-        labels = ['Retained', 'Churned'] if 0 in churn_counts.index else ['Churned']
-        plt.pie(churn_counts, labels=labels, autopct='%1.1f%%', colors=['#4CAF50', '#F44336'])
-        plt.title('Customer Churn Distribution', fontweight='bold')
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight')
-        buffer.seek(0)
-        charts['churn_distribution'] = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-
-        # Tenure vs Churn
-        if 'tenure' in df.columns and not df['tenure'].isnull().all():
-            plt.figure(figsize=(10, 6))
-            sns.histplot(data=df, x='tenure', hue=churn_col, multiple='stack')
-            plt.title("Tenure vs Churn", fontweight='bold')
-            plt.xlabel("Tenure (Months)", fontweight='bold')
-            plt.ylabel("Count", fontweight='bold')
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight')
-            buffer.seek(0)
-            charts['tenure_vs_churn'] = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-
-        # Monthly Charges vs Churn
+def _float_sort_keys(values):
+    """Map float64 values to uint64 keys that sort in the same order."""
+    bits = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    return np.where(bits >> np.uint64(63), ~bits, bits | np.uint64(1 << 63))
+
+def _sort_keys_to_floats(keys):
+    """Invert _float_sort_keys, turning sort keys back into float64 values."""
+    keys = np.asarray(keys, dtype=np.uint64)
+    bits = np.where(keys >> np.uint64(63), keys & ~np.uint64(1 << 63), ~keys)
+    return bits.view(np.float64)
+
+def _select_sort_key(blocks, k):
+    """k-th smallest key of the key blocks yielded by blocks(), by radix select.
+
+    Each pass counts the next 16-bit digit of the keys that share the prefix
+    found so far, until few enough candidates remain to partition in memory.
+    """
+    prefix, shift = np.uint64(0), 64
+    while shift:
+        shift -= 16
+        counts = np.zeros(1 << 16, dtype=np.int64)
+        for keys in blocks():
+            if shift < 48:
+                keys = keys[(keys >> np.uint64(shift + 16)) == prefix]
+            digits = ((keys >> np.uint64(shift)) & np.uint64(0xFFFF)).astype(np.intp)
+            counts += np.bincount(digits, minlength=1 << 16)
+        cumulative = np.cumsum(counts)
+        digit = int(np.searchsorted(cumulative, k, side='right'))
+        k -= int(cumulative[digit - 1]) if digit else 0
+        if shift < 48:
+            prefix = (prefix << np.uint64(16)) | np.uint64(digit)
+        else:
+            prefix = np.uint64(digit)
+        if counts[digit] <= MEDIAN_GATHER_LIMIT:
+            candidates = np.concatenate(
+                [keys[(keys >> np.uint64(shift)) == prefix] for keys in blocks()])
+            return np.partition(candidates, k)[k]
+    return prefix
+
+def spooled_median(column, keep=None, block_rows=INGEST_CHUNK_ROWS):
+    """Exact median of a memory-mapped float column, skipping NaN.
+
+    Only a block of rows and a 64K-entry histogram are held in memory, so the
+    column can be far larger than RAM. keep optionally masks rows out.
+    """
+    def blocks():
+        """Sort keys of the non-missing kept values, one block at a time."""
+        for start in range(0, len(column), block_rows):
+            values = np.asarray(column[start:start + block_rows])
+            if keep is not None:
+                values = values[keep[start:start + block_rows]]
+            yield _float_sort_keys(values[~np.isnan(values)])
+
+    count = sum(len(keys) for keys in blocks())
+    if count == 0:
+        return float('nan')
+    middle = sorted({(count - 1) // 2, count // 2})
+    keys = [_select_sort_key(blocks, k) for k in middle]
+    return float(np.mean(_sort_keys_to_floats(keys)))
+
+class StreamingCleaner:
+    """Apply the clean_data rules to a CSV file in one streaming pass.
+
+    Chunks are lower-cased and appended column by column to raw spool files:
+    numbers as float64, anything else as int32 codes into a per-column value
+    dictionary whose code frequencies give the imputation modes. ID columns
+    are only kept as a 64-bit hash per row, since cleaning drops them. Once
+    the file is read, medians come from a radix select over the spooled
+    columns and duplicates from a 64-bit hash of each imputed row, and the
+    cleaned columns are written back as memory-mapped .npy files, text as
+    categoricals over the value dictionary (see compact_frame).
+
+    Peak memory is a chunk-sized working set plus a small constant per row,
+    not a multiple of the file size: about 36 bytes per row while
+    duplicates are found (8 for the row hashes, some 28 for the hashtable
+    that spots the repeats) and the in-memory columns of the cleaned frame,
+    whose numeric columns stay memory-mapped.
+    Column types are taken from the first chunk; numbers that fail to parse
+    in later chunks count as missing values. Missing IDs are hashed as
+    missing rather than imputed first.
+    """
+
+    CHARGE_COLUMNS = {'totalcharges': 'TotalCharges',
+                      'monthlycharges': 'MonthlyCharges'}
+
+    def __init__(self, directory, chunk_rows=INGEST_CHUNK_ROWS):
+        """Spool into directory, reading chunk_rows rows of CSV at a time."""
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.columns = []
+        self.id_columns = []
+        self.numeric = {}       # column -> True for float spool, False for codes
+        self.integer = {}       # numeric column parsed as int64 in every chunk
+        self.boolean = set()    # coded columns holding True/False
+        self.missing = {}
+        self.categories = {}
+        self.frequencies = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _spool_path(self, name):
+        """Path of the spool file of a column."""
+        return os.path.join(self.directory, f'{name}.spool')
+
+    def _append(self, name, values):
+        """Append values to a column's spool file."""
+        with open(self._spool_path(name), 'ab') as f:
+            f.write(np.ascontiguousarray(values).tobytes())
+
+    def _spool(self, name, dtype):
+        """Memory-map a column's spool file as rows of dtype."""
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._spool_path(name), dtype=dtype, mode='r',
+                         shape=(self.rows,))
+
+    def clean(self, path):
+        """Clean the CSV at path; returns (df, profile)."""
+        logging.info("Starting streaming data cleaning process")
+        head = pd.read_csv(path, nrows=self.chunk_rows)
+        text_columns = {col: object for col in head.columns
+                        if head[col].dtype == object}
+        for chunk in pd.read_csv(path, chunksize=self.chunk_rows, dtype=text_columns):
+            self.add(chunk)
+        return self.finish()
+
+    def _start(self, chunk):
+        """Take the columns and their types from the first chunk."""
+        self.columns = list(chunk.columns)
+        for col in self.columns:
+            if 'id' in col:
+                self.id_columns.append(col)
+            self.numeric[col] = chunk[col].dtype.kind in 'iuf'
+            self.integer[col] = self.numeric[col]
+            if chunk[col].dtype == bool:
+                self.boolean.add(col)
+            self.missing[col] = 0
+            self.categories[col] = pd.Index([], dtype=object)
+            self.frequencies[col] = np.zeros(0, dtype=np.int64)
+
+    def add(self, chunk):
+        """Lower-case, encode and spool one chunk."""
+        chunk.columns = chunk.columns.str.lower()
+        if not self.columns:
+            self._start(chunk)
+        ids = {}
+        for col in self.columns:
+            values = chunk[col]
+            if self.numeric[col]:
+                if values.dtype.kind not in 'iuf':
+                    values = pd.to_numeric(values, errors='coerce')
+                    logging.warning(
+                        f"Non-numeric values in column {col} treated as missing")
+                self.integer[col] = self.integer[col] and values.dtype.kind in 'iu'
+                values = values.to_numpy(dtype=np.float64)
+            elif col not in self.boolean:
+                values = values.str.lower()
+            if col in self.id_columns:
+                self.missing[col] += int(pd.isna(values).sum())
+                ids[col] = values
+                continue
+            if not self.numeric[col]:
+                values = self._encode(col, values)
+            missing = np.isnan(values) if self.numeric[col] else values < 0
+            self.missing[col] += int(missing.sum())
+            self._append(col, values)
+        if ids:
+            hashed = pd.util.hash_pandas_object(pd.DataFrame(ids), index=False)
+            self._append('ids', hashed.to_numpy())
+        self.rows += len(chunk)
+
+    def _encode(self, col, values):
+        """Codes of values in a column's dictionary, adding new values."""
+        categories = self.categories[col]
+        codes = categories.get_indexer(values)
+        unseen = (codes < 0) & values.notna().to_numpy()
+        if unseen.any():
+            categories = categories.append(
+                pd.Index(pd.unique(values[unseen]), dtype=object))
+            self.categories[col] = categories
+            codes = categories.get_indexer(values)
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        counts[:len(self.frequencies[col])] += self.frequencies[col]
+        self.frequencies[col] = counts
+        return codes.astype(np.int32)
+
+    def _mode_code(self, col):
+        """Most frequent code, ties going to the smallest value like Series.mode."""
+        frequencies = self.frequencies[col]
+        tied = np.flatnonzero(frequencies == frequencies.max())
+        return min(tied, key=lambda code: self.categories[col][code])
+
+    def _blocks(self):
+        """(start, stop) row ranges of one chunk each."""
+        for start in range(0, self.rows, self.chunk_rows):
+            yield start, min(start + self.chunk_rows, self.rows)
+
+    def _filled(self, col, fills, start, stop):
+        """Spooled values of rows start:stop with missing ones imputed."""
+        dtype = np.float64 if self.numeric[col] else np.int32
+        values = self._spool(col, dtype)[start:stop]
+        if col not in fills:
+            return np.asarray(values)
+        missing = np.isnan(values) if self.numeric[col] else values < 0
+        return np.where(missing, fills[col], values)
+
+    def _charges_to_numeric(self, col, fills, keep):
+        """pd.to_numeric on a text charges column, imputing over the kept rows."""
+        numbers = pd.to_numeric(pd.Series(self.categories[col]), errors='coerce')
+        numbers = numbers.to_numpy(dtype=np.float64)
+        name = f'{col}.numeric'
+        for start, stop in self._blocks():
+            self._append(name, numbers[self._filled(col, fills, start, stop)])
+        values = self._spool(name, np.float64)
+        median = spooled_median(values, keep, self.chunk_rows)
+        if np.isnan(median):
+            raise ValueError(f"{self.CHARGE_COLUMNS[col]} contains only invalid values")
+        os.replace(self._spool_path(name), self._spool_path(col))
+        self.numeric[col], self.integer[col] = True, False
+        fills[col] = median
+
+    def finish(self):
+        """Impute, drop duplicates and ID columns; returns (df, profile)."""
+        if not self.rows:
+            raise ValueError("Uploaded dataset is empty")
+        if self.rows < 10:
+            raise ValueError("Dataset too small (minimum 10 rows required)")
+        for col in self.columns:
+            if self.missing[col] == self.rows:
+                raise ValueError(f"Column {col} contains only missing values")
+
+        columns = [col for col in self.columns if col not in self.id_columns]
+        fills = {}
+        for col in columns:
+            if self.missing[col] and self.numeric[col]:
+                fills[col] = spooled_median(self._spool(col, np.float64),
+                                            block_rows=self.chunk_rows)
+            elif self.missing[col]:
+                fills[col] = self._mode_code(col)
+
+        hashes = np.empty(self.rows, dtype=np.uint64)
+        for start, stop in self._blocks():
+            block = {col: self._filled(col, fills, start, stop) for col in columns}
+            if self.id_columns:
+                block['ids'] = np.asarray(self._spool('ids', np.uint64)[start:stop])
+            hashed = pd.util.hash_pandas_object(pd.DataFrame(block), index=False)
+            hashes[start:stop] = hashed.to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        del hashes
+        kept = int(keep.sum())
+        logging.info(f"Removed {self.rows - kept} duplicates")
+
+        for col in self.CHARGE_COLUMNS:
+            if col in columns and not self.numeric[col]:
+                self._charges_to_numeric(col, fills, keep)
+
+        frame = {}
+        for col in columns:
+            if self.numeric[col]:
+                as_float = not self.integer[col] or col in ('tenure', 'monthlycharges')
+                dtype = np.float64 if as_float else np.int64
+            else:
+                dtype = np.int32
+            path = os.path.join(self.directory, f'{col}.npy')
+            out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(kept,))
+            position = 0
+            for start, stop in self._blocks():
+                values = self._filled(col, fills, start, stop)[keep[start:stop]]
+                out[position:position + len(values)] = values
+                position += len(values)
+            out.flush()
+            del out
+            os.remove(self._spool_path(col))
+            values = np.load(path, mmap_mode='r')
+            if col in self.boolean:
+                values = np.asarray(self.categories[col], dtype=bool)[values]
+            elif not self.numeric[col]:
+                values = pd.Categorical.from_codes(values, self.categories[col])
+            frame[col] = values
+        df = compact_frame(pd.DataFrame(frame, copy=False))
+
+        imputed = {col: self.missing[col] for col in columns}
+        profile = build_profile(df, self.rows, imputed)
+        logging.info("Data cleaning completed successfully")
+        return df, profile
+
+def sample_csv(path, rows, blocks=PROGRESSIVE_BLOCKS):
+    """About `rows` rows read from across a CSV file without parsing all of it.
+
+    The file is cut into `blocks` equal segments and a run of consecutive
+    lines is read at a random offset in each, after skipping the partial
+    line the offset lands in, so sorted exports are covered end to end.
+    Runs span a fixed number of bytes rather than lines, which gives every
+    line about the same chance of being picked even where line lengths
+    differ between parts of the file. Returns the rows as a frame and the
+    file's row count, estimated from the mean line length. Files of up to
+    about twice `rows` lines are read whole.
+    """
+    rng = np.random.RandomState(RANDOM_STATE)
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = f.tell()
+        head = f.readlines(UPLOAD_BLOCK_BYTES)
+        line_bytes = max(1, np.mean([len(line) for line in head] or [1]))
+        run_bytes = rows / blocks * line_bytes
+        segment = (size - start) / blocks
+        slack = int(segment - 2 * run_bytes)
+        f.seek(start)
+        if slack <= 0:
+            lines = f.readlines()
+        else:
+            lines = []
+            for block in range(blocks):
+                f.seek(start + int(block * segment) + rng.randint(slack))
+                f.readline()
+                lines.extend(f.readlines(int(run_bytes)))
+    lines = [line if line.endswith(b'\n') else line + b'\n'
+             for line in lines if line.strip()]
+    if not lines:
+        raise ValueError("Uploaded dataset is empty")
+    if slack <= 0:
+        estimated_rows = len(lines)
+    else:
+        estimated_rows = round((size - start) / np.mean([len(line) for line in lines]))
+    return pd.read_csv(io.BytesIO(header + b''.join(lines))), estimated_rows
+
+def stratified_sample(df, churn_col, rows, seed=RANDOM_STATE):
+    """Sorted positions of a random sample of `rows` rows.
+
+    The sample is stratified by churn and the PROGRESSIVE_STRATA columns.
+
+    Every stratum (say churned month-to-month customers) keeps its share of
+    df, with largest-remainder rounding, so the sample's churn rate and
+    contract mix match the data's. df is returned whole if it is no larger.
+    """
+    if len(df) <= rows:
+        return np.arange(len(df))
+    keys = [df[churn_col]] + [df[col] for col in PROGRESSIVE_STRATA
+                              if col in df.columns and col != churn_col]
+    strata = df.groupby(keys, observed=True, sort=False, dropna=False).ngroup()
+    strata = strata.to_numpy()
+    order = np.random.RandomState(seed).permutation(len(df))
+    order = order[np.argsort(strata[order], kind='stable')]
+    counts = np.bincount(strata)
+    shares = counts * rows / len(df)
+    quotas = np.floor(shares).astype(np.int64)
+    quotas[np.argsort(quotas - shares)[:rows - quotas.sum()]] += 1
+    starts = np.cumsum(counts) - counts
+    return np.sort(np.concatenate([order[start:start + quota]
+                                   for start, quota in zip(starts, quotas)]))
+
+def profile_column(values, imputed=None):
+    """Dtype, null and distinct counts and the value range of one column."""
+    entry = {
+        'name': values.name,
+        'dtype': str(values.dtype),
+        'nulls': int(values.isna().sum()),
+        'distinct': int(values.nunique()),
+        'memory_bytes': int(values.memory_usage(index=False, deep=True))
+    }
+    if imputed is not None:
+        entry['imputed'] = int(imputed)
+    if entry['nulls'] == len(values):
+        return entry
+    if values.dtype.kind in 'iuf':
+        numbers = values.to_numpy(dtype=np.float64)
+        entry.update(min=float(np.nanmin(numbers)), max=float(np.nanmax(numbers)),
+                     median=spooled_median(numbers))
+    elif values.dtype.kind == 'M':
+        entry.update(min=str(values.min().date()), max=str(values.max().date()))
+    return entry
+
+def build_profile(df, source_rows=None, imputed=None):
+    """Profile a cleaned dataset once so later requests need not touch its rows.
+
+    source_rows is the upload's row count before duplicates were dropped and
+    imputed the number of values filled in per column while cleaning.
+    memory_bytes is what the frame takes in memory, column by column.
+    """
+    source_rows = source_rows or len(df)
+    imputed = imputed or {}
+    columns = [profile_column(df[col], imputed.get(col)) for col in df.columns]
+    nulls = sum(column['nulls'] for column in columns)
+    missing_ratio = nulls / (len(df) * len(columns))
+    duplicate_ratio = (source_rows - len(df)) / source_rows
+    return {
+        'rows': int(len(df)),
+        'source_rows': int(source_rows),
+        'duplicate_ratio': float(duplicate_ratio),
+        'missing_ratio': float(missing_ratio),
+        'data_quality_score': quality_score(missing_ratio, duplicate_ratio),
+        'memory_bytes': sum(column['memory_bytes'] for column in columns),
+        'columns': columns
+    }
+
+def update_profile(profile, df, columns):
+    """Refresh the entries of columns converted after cleaning (e.g. parsed dates)."""
+    for i, entry in enumerate(profile['columns']):
+        if entry['name'] in columns:
+            profile['columns'][i] = profile_column(df[entry['name']],
+                                                   entry.get('imputed'))
+    profile['memory_bytes'] = sum(column['memory_bytes']
+                                  for column in profile['columns'])
+    return profile
+
+def quality_score(missing_ratio, duplicate_ratio):
+    """Data quality out of 100 from the share of missing cells and duplicate rows."""
+    return float(100 * (1 - (missing_ratio + duplicate_ratio) / 2))
+
+def filter_profile(profile, df, parent_id):
+    """Profile of rows selected from a profiled dataset.
+
+    Column statistics and the missing ratio are recomputed for the subset;
+    duplicates were dropped from the whole upload, so the duplicate ratio
+    and imputation counts stay those of the parent.
+    """
+    columns = [profile_column(df[col]) for col in df.columns]
+    nulls = sum(column['nulls'] for column in columns)
+    missing_ratio = nulls / (len(df) * len(columns))
+    return {
+        **profile,
+        'rows': int(len(df)),
+        'parent': parent_id,
+        'missing_ratio': float(missing_ratio),
+        'data_quality_score': quality_score(missing_ratio, profile['duplicate_ratio']),
+        'memory_bytes': sum(column['memory_bytes'] for column in columns),
+        'columns': columns
+    }
+
+def chart_layout(df, churn_col):
+    """Fix bin edges and categories for the chart aggregates of a dataset.
+
+    Aggregates computed with the same layout can simply be summed, which is
+    what lets per-day cubes answer any date range without the raw rows.
+    """
+    layout = {'churn_col': churn_col, 'blocks': {}, 'width': 0}
+
+    def add_block(name, size):
+        """Reserve the next size columns of the aggregate vector for name."""
+        layout['blocks'][name] = [layout['width'], layout['width'] + size]
+        layout['width'] += size
+
+    add_block('customers', 1)
+    add_block('churned', 1)
+    add_block('missing', 1)
+    if 'tenure' in df.columns and not df['tenure'].isnull().all():
+        layout['tenure_edges'] = np.linspace(
+            df['tenure'].min(), df['tenure'].max(), CHART_TENURE_BINS + 1).tolist()
+        add_block('tenure_counts', 2 * CHART_TENURE_BINS)
         if 'monthlycharges' in df.columns:
-            plt.figure(figsize=(10, 6))
-            sns.kdeplot(data=df, x='monthlycharges', hue=churn_col, fill=True)
-            plt.title("Monthly Charges vs Churn", fontweight='bold')
-            plt.xlabel("Monthly Charges", fontweight='bold')
-            plt.ylabel("Density", fontweight='bold')
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight')
-            buffer.seek(0)
-            charts['charges_vs_churn'] = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-
-        # Contract Type vs Churn
-        if 'contract' in df.columns and not df['contract'].isnull().all():
-            plt.figure(figsize=(10, 6))
-            sns.countplot(data=df, x='contract', hue=churn_col)
-            plt.title("Churn by Contract Type", fontweight='bold')
-            plt.xlabel("Contract Type", fontweight='bold')
-            plt.ylabel("Count", fontweight='bold')
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight')
-            buffer.seek(0)
-            charts['contract_vs_churn'] = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-
-        # Feature Importance
-        if feature_importance is not None:
-            plt.figure(figsize=(12, 6))
-            importance_df = pd.DataFrame(feature_importance)
-            plt.barh(importance_df['Feature'], importance_df['Importance'], color='#4B5EAA')
-            plt.xlabel("Feature Importance", fontweight='bold')
-            plt.ylabel("Features", fontweight='bold')
-            plt.title("Most Important Features for Churn Prediction", fontweight='bold')
-            plt.gca().invert_yaxis()
-            plt.tight_layout()
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight')
-            buffer.seek(0)
-            charts['feature_importance'] = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-
-        # Churn Rate Over Time
-        if 'tenure' in df.columns and 'monthlycharges' in df.columns:
-            plt.figure(figsize=(12, 6))
-            tenure_bins = pd.cut(df['tenure'], bins=10)
-            churn_by_tenure = df.groupby(tenure_bins, observed=True)[churn_col].apply(
-                lambda x: x.replace({'yes': 1, 'no': 0, True: 1, False: 0}).mean() * 100
-            )
-            revenue_loss = df.groupby(tenure_bins, observed=True).apply(
-                lambda x: x[churn_col].replace({'yes': 1, 'no': 0, True: 1, False: 0}).sum() * x['monthlycharges'].mean()
-            )
-            ax1 = plt.gca()
-            line1, = ax1.plot(churn_by_tenure.index.astype(str), churn_by_tenure.values, marker='o', color='#D32F2F', label='Churn Rate (%)')
-            ax1.set_xlabel("Tenure Range", fontweight='bold')
-            ax1.set_ylabel("Churn Rate (%)", fontweight='bold')
-            ax1.set_title("Churn Rate and Revenue Loss Over Tenure", fontweight='bold')
-            ax2 = ax1.twinx()
-            line2, = ax2.plot(revenue_loss.index.astype(str), revenue_loss.values, marker='s', color='#1976D2', label='Revenue Loss (₹)')
-            ax2.set_ylabel("Revenue Loss (₹)", fontweight='bold')
-            lines = [line1, line2]
-            labels = [line.get_label() for line in lines]
-            ax1.legend(lines, labels, loc='upper right')
-            plt.tight_layout()
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight')
-            buffer.seek(0)
-            charts['churn_over_time'] = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-
-        logging.info(f"Generated {len(charts)} charts successfully")
-        return charts
-    except Exception as e:
-        logging.error(f"Error in generate_charts: {str(e)}")
-        return {}
+            add_block('tenure_charges', CHART_TENURE_BINS)
+    if 'monthlycharges' in df.columns:
+        charges = df['monthlycharges']
+        layout['charges_edges'] = np.linspace(
+            charges.min(), charges.max(), CHART_CHARGES_BINS + 1).tolist()
+        add_block('charges_counts', 2 * CHART_CHARGES_BINS)
+    if 'contract' in df.columns and not df['contract'].isnull().all():
+        labels = df['contract'].dropna().astype(str).unique()
+        layout['contract_labels'] = sorted(labels.tolist())
+        add_block('contract_counts', 2 * len(layout['contract_labels']))
+    return layout
+
+def _bin_index(values, edges):
+    """Right-closed bin of each value, matching pd.cut with the same edges."""
+    bins = np.searchsorted(edges, np.asarray(values, dtype=float), side='left') - 1
+    return np.clip(bins, 0, len(edges) - 2)
+
+def compute_aggregates(df, layout, groups=None, n_groups=1):
+    """Sum the chart aggregates of df per group in one vectorised pass.
+
+    groups assigns each row a group number (rows with -1 are skipped); the
+    result has one row of layout['width'] values per group.
+    """
+    churn = pd.to_numeric(encode_churn(df[layout['churn_col']]), errors='coerce')
+    churn = churn.fillna(0).to_numpy(dtype=float)
+    if groups is None:
+        groups = np.zeros(len(df), dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    valid = groups >= 0
+    groups, churn = groups[valid], churn[valid]
+    churned = (churn > 0).astype(np.int64)
+    blocks = layout['blocks']
+    result = np.zeros((n_groups, layout['width']))
+
+    def fill(name, keys, weights=None):
+        """Sum weights per group into the columns of name's block."""
+        start, stop = blocks[name]
+        size = stop - start
+        result[:, start:stop] = np.bincount(
+            groups * size + keys, weights=weights, minlength=n_groups * size
+        ).reshape(n_groups, size)
+
+    fill('customers', 0)
+    fill('churned', 0, churn)
+    fill('missing', 0, df.isna().sum(axis=1).to_numpy(dtype=float)[valid])
+    charges = None
+    if 'monthlycharges' in df.columns:
+        charges = df['monthlycharges'].to_numpy(dtype=float)[valid]
+    if 'tenure_counts' in blocks:
+        tenure_bins = _bin_index(df['tenure'].to_numpy()[valid], layout['tenure_edges'])
+        fill('tenure_counts', churned * CHART_TENURE_BINS + tenure_bins)
+        if 'tenure_charges' in blocks:
+            fill('tenure_charges', tenure_bins, charges)
+    if 'charges_counts' in blocks:
+        charge_bins = _bin_index(charges, layout['charges_edges'])
+        fill('charges_counts', churned * CHART_CHARGES_BINS + charge_bins)
+    if 'contract_counts' in blocks:
+        labels = layout['contract_labels']
+        contract = df['contract']
+        if not is_text(contract):
+            contract = contract.astype(str)
+        codes = pd.Categorical(contract, categories=labels).codes.astype(np.int64)
+        codes = codes[valid]
+        known = codes >= 0
+        start, stop = blocks['contract_counts']
+        size = stop - start
+        keys = (groups[known] * len(labels) * 2 + churned[known] * len(labels)
+                + codes[known])
+        result[:, start:stop] = np.bincount(
+            keys, minlength=n_groups * size).reshape(n_groups, size)
+    return result
+
+def unpack_aggregates(vector, layout):
+    """Turn one row of summed aggregates into named chart inputs."""
+    blocks = layout['blocks']
+
+    def block(name, parts=1):
+        """The values of name's block, split into parts rows."""
+        start, stop = blocks[name]
+        values = np.asarray(vector[start:stop])
+        return values.reshape(parts, -1) if parts > 1 else values
+
+    aggregates = {'customers': float(vector[blocks['customers'][0]]),
+                  'churned': float(vector[blocks['churned'][0]]),
+                  'missing': float(vector[blocks['missing'][0]])}
+    if 'tenure_counts' in blocks:
+        counts = block('tenure_counts', 2)
+        aggregates['tenure'] = {'edges': layout['tenure_edges'],
+                                'retained': counts[0], 'churned': counts[1]}
+        if 'tenure_charges' in blocks:
+            aggregates['tenure']['charges'] = block('tenure_charges')
+    if 'charges_counts' in blocks:
+        counts = block('charges_counts', 2)
+        aggregates['charges'] = {'edges': layout['charges_edges'],
+                                 'retained': counts[0], 'churned': counts[1]}
+    if 'contract_counts' in blocks:
+        counts = block('contract_counts', 2)
+        aggregates['contract'] = {'labels': layout['contract_labels'],
+                                  'retained': counts[0], 'churned': counts[1]}
+    return aggregates
+
+def kde_from_histogram(edges, counts, total, points=200):
+    """Gaussian KDE of binned values (Scott's bandwidth), normalised by total."""
+    edges = np.asarray(edges, dtype=float)
+    centers = (edges[:-1] + edges[1:]) / 2
+    grid = np.linspace(edges[0], edges[-1], points)
+    n = counts.sum()
+    if n < 2 or total <= 0:
+        return grid, np.zeros_like(grid)
+    mean = (counts * centers).sum() / n
+    std = np.sqrt((counts * (centers - mean) ** 2).sum() / n)
+    bandwidth = max(std * n ** (-1 / 5), (edges[1] - edges[0]) / 2)
+    distances = (grid[:, None] - centers[None, :]) / bandwidth
+    kernel = np.exp(-0.5 * distances ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    return grid, kernel @ counts / total
+
+def tenure_churn_profile(tenure):
+    """Churn rate (%) and revenue loss per tenure range, from tenure aggregates."""
+    edges = np.asarray(tenure['edges'])
+    group = CHART_TENURE_BINS // CHART_TENURE_GROUPS
+    retained = tenure['retained'].reshape(-1, group).sum(axis=1)
+    churned = tenure['churned'].reshape(-1, group).sum(axis=1)
+    charges = tenure['charges'].reshape(-1, group).sum(axis=1)
+    customers = retained + churned
+    observed = customers > 0
+    group_edges = edges[::group]
+    labels = [f"({lo:.1f}, {hi:.1f}]"
+              for lo, hi in zip(group_edges[:-1], group_edges[1:])]
+    churn_rate = churned[observed] / customers[observed] * 100
+    revenue_loss = churned[observed] * charges[observed] / customers[observed]
+    labels = [label for label, keep in zip(labels, observed) if keep]
+    return labels, churn_rate, revenue_loss
+
+def _draw_churn_distribution(fig, aggregates, importance):
+    """Pie of retained and churned customers."""
+    ax = fig.subplots()
+    retained = aggregates['customers'] - aggregates['churned']
+    churned = aggregates['churned']
+    counts = [retained, churned] if retained > 0 else [churned]
+    labels = ['Retained', 'Churned'] if retained > 0 else ['Churned']
+    colors = ['#4CAF50', '#F44336'] if retained > 0 else ['#F44336']
+    ax.pie(counts, labels=labels, autopct='%1.1f%%', colors=colors)
+    ax.set_title('Customer Churn Distribution', fontweight='bold')
+
+def _draw_tenure_vs_churn(fig, aggregates, importance):
+    """Stacked bars of retained and churned customers per tenure bin."""
+    ax = fig.subplots()
+    tenure = aggregates['tenure']
+    edges = np.asarray(tenure['edges'])
+    ax.bar(edges[:-1], tenure['retained'], width=np.diff(edges), align='edge',
+           color='#4CAF50', alpha=0.8, label='Retained')
+    ax.bar(edges[:-1], tenure['churned'], width=np.diff(edges), align='edge',
+           bottom=tenure['retained'], color='#F44336', alpha=0.8, label='Churned')
+    ax.legend()
+    ax.set_title("Tenure vs Churn", fontweight='bold')
+    ax.set_xlabel("Tenure (Months)", fontweight='bold')
+    ax.set_ylabel("Count", fontweight='bold')
+
+def _draw_charges_vs_churn(fig, aggregates, importance):
+    """Monthly charge densities of retained and churned customers."""
+    ax = fig.subplots()
+    charges = aggregates['charges']
+    for key, label, color in (('retained', 'Retained', '#4CAF50'),
+                              ('churned', 'Churned', '#F44336')):
+        grid, density = kde_from_histogram(charges['edges'], charges[key],
+                                           aggregates['customers'])
+        ax.fill_between(grid, density, alpha=0.4, color=color, label=label)
+        ax.plot(grid, density, color=color)
+    ax.legend()
+    ax.set_title("Monthly Charges vs Churn", fontweight='bold')
+    ax.set_xlabel("Monthly Charges", fontweight='bold')
+    ax.set_ylabel("Density", fontweight='bold')
+
+def _draw_contract_vs_churn(fig, aggregates, importance):
+    """Side-by-side bars of retained and churned customers per contract."""
+    ax = fig.subplots()
+    contract = aggregates['contract']
+    positions = np.arange(len(contract['labels']))
+    ax.bar(positions - 0.2, contract['retained'], width=0.4, color='#4CAF50',
+           label='Retained')
+    ax.bar(positions + 0.2, contract['churned'], width=0.4, color='#F44336',
+           label='Churned')
+    ax.set_xticks(positions, contract['labels'])
+    ax.legend()
+    ax.set_title("Churn by Contract Type", fontweight='bold')
+    ax.set_xlabel("Contract Type", fontweight='bold')
+    ax.set_ylabel("Count", fontweight='bold')
+
+def _draw_feature_importance(fig, aggregates, importance):
+    """Horizontal bars of the top features, most important first."""
+    ax = fig.subplots()
+    importance_df = pd.DataFrame(importance)
+    ax.barh(importance_df['Feature'], importance_df['Importance'], color='#4B5EAA')
+    ax.set_xlabel("Feature Importance", fontweight='bold')
+    ax.set_ylabel("Features", fontweight='bold')
+    ax.set_title("Most Important Features for Churn Prediction", fontweight='bold')
+    ax.invert_yaxis()
+    fig.tight_layout()
+
+def _draw_churn_over_time(fig, aggregates, importance):
+    """Churn rate and revenue loss per tenure range on twin axes."""
+    tenure_labels, churn_by_tenure, revenue_loss = tenure_churn_profile(
+        aggregates['tenure'])
+    ax1 = fig.subplots()
+    line1, = ax1.plot(tenure_labels, churn_by_tenure, marker='o', color='#D32F2F',
+                      label='Churn Rate (%)')
+    ax1.set_xlabel("Tenure Range", fontweight='bold')
+    ax1.set_ylabel("Churn Rate (%)", fontweight='bold')
+    ax1.set_title("Churn Rate and Revenue Loss Over Tenure", fontweight='bold')
+    ax2 = ax1.twinx()
+    line2, = ax2.plot(tenure_labels, revenue_loss, marker='s', color='#1976D2',
+                      label='Revenue Loss (₹)')
+    ax2.set_ylabel("Revenue Loss (₹)", fontweight='bold')
+    lines = [line1, line2]
+    ax1.legend(lines, [line.get_label() for line in lines], loc='upper right')
+    fig.tight_layout()
+
+# Chart name -> (figure size, draw function), in dashboard and report order
+CHART_RENDERERS = OrderedDict([
+    ('churn_distribution', ((8, 6), _draw_churn_distribution)),
+    ('tenure_vs_churn', ((10, 6), _draw_tenure_vs_churn)),
+    ('charges_vs_churn', ((10, 6), _draw_charges_vs_churn)),
+    ('contract_vs_churn', ((10, 6), _draw_contract_vs_churn)),
+    ('feature_importance', ((12, 6), _draw_feature_importance)),
+    ('churn_over_time', ((12, 6), _draw_churn_over_time))
+])
+
+def available_charts(aggregates, importance=None):
+    """Names of the charts that can be drawn from these inputs."""
+    inputs = {
+        'churn_distribution': True,
+        'tenure_vs_churn': 'tenure' in aggregates,
+        'charges_vs_churn': 'charges' in aggregates,
+        'contract_vs_churn': 'contract' in aggregates,
+        'feature_importance': importance is not None,
+        'churn_over_time': ('tenure' in aggregates
+                            and 'charges' in aggregates['tenure'])
+    }
+    return [name for name in CHART_RENDERERS if inputs[name]]
+
+def render_chart(name, aggregates, importance=None):
+    """Render one chart to PNG bytes.
+
+    Uses a standalone Figure instead of pyplot's global state, so any number
+    of charts can be drawn at once in threads or processes.
+    """
+    from matplotlib.figure import Figure
+    size, draw = CHART_RENDERERS[name]
+    fig = Figure(figsize=size)
+    draw(fig, aggregates, importance)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+def _rounded(values, digits=4):
+    """Values as a list of floats rounded to digits, for JSON."""
+    return np.round(np.asarray(values, dtype=float), digits).tolist()
+
+def chart_data(aggregates, importance=None):
+    """The numbers behind each available chart, as compact JSON for the browser.
+
+    Everything comes from the summed aggregates, so the payload size does not
+    depend on the number of customers.
+    """
+    data = {}
+    for name in available_charts(aggregates, importance):
+        if name == 'churn_distribution':
+            churned = int(aggregates['churned'])
+            data[name] = {'labels': ['Retained', 'Churned'],
+                          'values': [int(aggregates['customers']) - churned, churned]}
+        elif name == 'tenure_vs_churn':
+            tenure = aggregates['tenure']
+            data[name] = {'edges': _rounded(tenure['edges'], 2),
+                          'retained': _rounded(tenure['retained'], 0),
+                          'churned': _rounded(tenure['churned'], 0)}
+        elif name == 'charges_vs_churn':
+            charges = aggregates['charges']
+            grid, retained = kde_from_histogram(charges['edges'], charges['retained'],
+                                                aggregates['customers'], 100)
+            _, churned = kde_from_histogram(charges['edges'], charges['churned'],
+                                            aggregates['customers'], 100)
+            data[name] = {'grid': _rounded(grid, 2), 'retained': _rounded(retained, 6),
+                          'churned': _rounded(churned, 6)}
+        elif name == 'contract_vs_churn':
+            contract = aggregates['contract']
+            data[name] = {'labels': contract['labels'],
+                          'retained': _rounded(contract['retained'], 0),
+                          'churned': _rounded(contract['churned'], 0)}
+        elif name == 'feature_importance':
+            data[name] = {'features': [item['Feature'] for item in importance],
+                          'importance': _rounded(
+                              [item['Importance'] for item in importance], 5)}
+        elif name == 'churn_over_time':
+            labels, churn_rate, revenue_loss = tenure_churn_profile(
+                aggregates['tenure'])
+            data[name] = {'labels': labels, 'churn_rate': _rounded(churn_rate, 2),
+                          'revenue_loss': _rounded(revenue_loss, 2)}
+    return data
+
+def chart_urls(dataset_id, names, view=None):
+    """Image URLs of a dataset's charts; a date view adds its period to the query."""
+    query = f"?start={view['start']}&end={view['end']}" if view else ''
+    return {name: f'/charts/{dataset_id}/{name}.png{query}' for name in names}
+
+def ensure_charts(dataset_id, analysis, names, period=None):
+    """Render the charts not cached yet, concurrently in the chart pool.
+
+    Charts of the whole dataset are drawn from its stored aggregates and
+    feature importance, those of a [start, end) period from the date cube.
+    Returns {chart name: path of the cached PNG}.
+    """
+    view = f'{period[0]}_{period[1] - 1}' if period else None
+    paths = OrderedDict((name, analysis_store.chart_path(dataset_id, name, view))
+                        for name in names)
+    missing = [name for name, path in paths.items() if not os.path.exists(path)]
+    if missing:
+        if period:
+            vector, importance = aggregate_period(dataset_id, *period), None
+        else:
+            vector = analysis_store.load_array(dataset_id, 'aggregates')
+            importance = analysis['feature_importance']
+        aggregates = unpack_aggregates(vector, analysis['chart_layout'])
+        executor = get_chart_executor()
+        with span('charts.render'):
+            futures = {name: executor.submit(render_chart, name, aggregates, importance)
+                       for name in missing}
+            for name, future in futures.items():
+                analysis_store.save_chart(dataset_id, name, future.result(), view)
+        logging.info(f"Rendered {len(missing)} charts for {dataset_id} {view or ''}")
+    return paths
+
+def detect_date_column(df):
+    """Find the column holding customer dates, e.g. 'date' or 'signupdate'.
+
+    Columns named like a date are tried first; a column qualifies when at
+    least 90% of a sample of its values parse as dates.
+    """
+    columns = df.select_dtypes(include=['object', 'category', 'datetime']).columns
+    candidates = sorted(columns, key=lambda col: 'date' not in col)
+    for col in candidates:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+        sample = df[col].dropna().head(1000)
+        if sample.empty:
+            continue
+        if pd.to_datetime(sample, errors='coerce').notna().mean() >= 0.9:
+            return col
+    return None
+
+def parse_dates(values):
+    """pd.to_datetime of a column, parsing each distinct value of a categorical once."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        dates = pd.to_datetime(values.cat.categories, errors='coerce')
+        codes = values.cat.codes.to_numpy()
+        parsed = np.where(codes >= 0, dates.to_numpy()[codes], np.datetime64('NaT'))
+        return pd.Series(parsed, index=values.index, name=values.name)
+    return pd.to_datetime(values, errors='coerce')
+
+def build_date_index(df, date_col, layout):
+    """Sort rows by date and sum chart aggregates per day and per month.
+
+    The cubes answer month, year and date-range filters from a handful of
+    rows; date_order/date_sorted locate the raw rows when a filtered view is
+    retrained.
+    """
+    dates = df[date_col].to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(dates)
+    order = np.argsort(dates, kind='stable')[:int(valid.sum())]
+    arrays = {'date_order': order.astype(np.int64), 'date_sorted': dates[order]}
+    for unit, name in (('D', 'daily'), ('M', 'monthly')):
+        periods = dates.astype(f'datetime64[{unit}]')
+        keys, codes = np.unique(periods[valid], return_inverse=True)
+        groups = np.full(len(df), -1, dtype=np.int64)
+        groups[valid] = codes
+        arrays[f'cube_{name}_keys'] = keys
+        arrays[f'cube_{name}'] = compute_aggregates(df, layout, groups, len(keys))
+    return arrays
+
+def append_date_index(dataset_id, df, date_col, layout, offset):
+    """Merge the date index of rows appended at offset into a stored dataset's."""
+    arrays = build_date_index(df, date_col, layout)
+    dates = np.concatenate([analysis_store.load_array(dataset_id, 'date_sorted'),
+                            arrays['date_sorted']])
+    order = np.concatenate([analysis_store.load_array(dataset_id, 'date_order'),
+                            arrays['date_order'] + offset])
+    merged = np.argsort(dates, kind='stable')
+    arrays.update(date_order=order[merged], date_sorted=dates[merged])
+    for name in ('daily', 'monthly'):
+        stored_keys = analysis_store.load_array(dataset_id, f'cube_{name}_keys')
+        keys = np.union1d(stored_keys, arrays[f'cube_{name}_keys'])
+        cube = np.zeros((len(keys), layout['width']))
+        stored = analysis_store.load_array(dataset_id, f'cube_{name}')
+        cube[np.searchsorted(keys, stored_keys)] += stored
+        added_keys = arrays[f'cube_{name}_keys']
+        cube[np.searchsorted(keys, added_keys)] += arrays[f'cube_{name}']
+        arrays.update({f'cube_{name}_keys': keys, f'cube_{name}': cube})
+    return arrays
+
+def parse_period(data):
+    """Read {month, year} or {start, end} into a half-open [start, end) day range."""
+    if data.get('start') and data.get('end'):
+        start = np.datetime64(pd.Timestamp(data['start']).date(), 'D')
+        end = np.datetime64(pd.Timestamp(data['end']).date(), 'D') + 1
+    elif data.get('month') and data.get('year'):
+        start = np.datetime64(f"{int(data['year']):04d}-{int(data['month']):02d}", 'M')
+        end = (start + 1).astype('datetime64[D]')
+        start = start.astype('datetime64[D]')
+    else:
+        raise AnalysisError('Missing month or year')
+    if end <= start:
+        raise AnalysisError('End date must not be before start date')
+    return start, end
+
+def aggregate_period(dataset_id, start, end):
+    """Sum the date cube over [start, end), using whole months where possible."""
+    months_aligned = (start.astype('datetime64[M]').astype('datetime64[D]') == start
+                      and end.astype('datetime64[M]').astype('datetime64[D]') == end)
+    unit, name = ('M', 'monthly') if months_aligned else ('D', 'daily')
+    keys = analysis_store.load_array(dataset_id, f'cube_{name}_keys')
+    cube = analysis_store.load_array(dataset_id, f'cube_{name}')
+    lo, hi = np.searchsorted(keys, [start.astype(f'datetime64[{unit}]'),
+                                    end.astype(f'datetime64[{unit}]')])
+    return np.asarray(cube[lo:hi]).sum(axis=0)
+
+def period_rows(dataset_id, start, end):
+    """Row positions, in file order, of customers dated within [start, end)."""
+    dates = analysis_store.load_array(dataset_id, 'date_sorted')
+    order = analysis_store.load_array(dataset_id, 'date_order')
+    lo, hi = np.searchsorted(dates, [start.astype(dates.dtype),
+                                     end.astype(dates.dtype)])
+    return np.sort(order[lo:hi])
+
+def segment_layout(df, churn_col):
+    """Pick the segment dimensions of a dataset and lay out the cube cells.
+
+    Text and boolean columns keep their sorted values as labels, numeric 0/1
+    flags become 'false'/'true' like booleans; tenure and monthly charges
+    are cut into bands (fixed tenure edges, charge quartiles). Each
+    dimension and each SEGMENT_PAIRS crossing present gets a run of cells:
+    one per label, or per label pair in row-major order.
+    """
+    dimensions, bands = OrderedDict(), {}
+    for col in df.columns:
+        segmentable = is_text(df[col]) or df[col].dtype == bool or is_flag(df[col])
+        if col == churn_col or 'id' in col or not segmentable:
+            continue
+        labels = sorted(_segment_values(df[col]).dropna().unique().tolist())
+        if 1 < len(labels) <= SEGMENT_MAX_LABELS:
+            dimensions[col] = labels
+    if 'tenure' in df.columns:
+        edges = SEGMENT_TENURE_EDGES
+        bands['tenure_band'] = {'column': 'tenure', 'edges': edges[1:]}
+        dimensions['tenure_band'] = (
+            [f'{lo}-{hi - 1} months' for lo, hi in zip(edges, edges[1:])]
+            + [f'{edges[-1]}+ months'])
+    if 'monthlycharges' in df.columns and df['monthlycharges'].nunique() > 4:
+        quartiles = df['monthlycharges'].quantile([0.25, 0.5, 0.75]).to_numpy()
+        edges = np.unique(np.round(quartiles, 2)).tolist()
+        bounds = [None, *edges, None]
+        bands['charges_band'] = {'column': 'monthlycharges', 'edges': edges}
+        dimensions['charges_band'] = [
+            f'under {hi:g}' if lo is None else f'{lo:g}+' if hi is None
+            else f'{lo:g}-{hi:g}'
+            for lo, hi in zip(bounds, bounds[1:])]
+
+    layout = {'dimensions': dimensions, 'bands': bands, 'cells': OrderedDict(),
+              'width': 0}
+    keys = [[name] for name in dimensions] + [
+        list(pair) for pair in SEGMENT_PAIRS
+        if all(name in dimensions for name in pair)]
+    for names in keys:
+        size = int(np.prod([len(dimensions[name]) for name in names]))
+        layout['cells'][','.join(names)] = [layout['width'], layout['width'] + size]
+        layout['width'] += size
+    return layout
+
+def is_flag(values):
+    """True for numeric columns holding only 0 and 1, such as SeniorCitizen."""
+    if values.dtype == bool or not pd.api.types.is_numeric_dtype(values):
+        return False
+    present = pd.unique(values.dropna())
+    return len(present) == 2 and set(present.tolist()) <= {0, 1}
+
+def _segment_values(values):
+    """Booleans and 0/1 flags as 'true'/'false' to match the segment categories."""
+    if values.dtype == bool:
+        return values.astype(str).str.lower()
+    if pd.api.types.is_numeric_dtype(values):
+        return values.map({0: 'false', 1: 'true'})
+    return values
+
+def _segment_codes(df, name, layout):
+    """Each row's category or band code in dimension name; -1 if unknown."""
+    band = layout['bands'].get(name)
+    if band:
+        values = df[band['column']].to_numpy(dtype=float)
+        codes = np.where(np.isnan(values), -1, np.digitize(values, band['edges']))
+        return codes.astype(np.int64)
+    values = pd.Categorical(_segment_values(df[name]),
+                            categories=layout['dimensions'][name])
+    return values.codes.astype(np.int64)
+
+def compute_segment_cube(df, layout):
+    """Sum SEGMENT_METRICS for every cell of the layout, one pass per cell run."""
+    churn = pd.to_numeric(encode_churn(df[find_churn_column(df)]), errors='coerce')
+    churn = churn.fillna(0).to_numpy(dtype=float)
+    charges = (df['monthlycharges'].to_numpy(dtype=float)
+               if 'monthlycharges' in df.columns else np.zeros(len(df)))
+    weights = [None, churn, charges, churn * charges]
+    codes = {name: _segment_codes(df, name, layout) for name in layout['dimensions']}
+    cube = np.zeros((layout['width'], len(SEGMENT_METRICS)))
+    for key, (start, stop) in layout['cells'].items():
+        keys = np.zeros(len(df), dtype=np.int64)
+        valid = np.ones(len(df), dtype=bool)
+        for name in key.split(','):
+            keys = keys * len(layout['dimensions'][name]) + codes[name]
+            valid &= codes[name] >= 0
+        for i, weight in enumerate(weights):
+            cube[start:stop, i] = np.bincount(
+                keys[valid], None if weight is None else weight[valid],
+                minlength=stop - start)
+    return cube
+
+def _segment_records(layout, cube, key, cells=None):
+    """One record per cell of a cell run (or of the given cell offsets within it)."""
+    names = key.split(',')
+    start, stop = layout['cells'][key]
+    cells = np.arange(stop - start) if cells is None else np.asarray(cells)
+    sizes = [len(layout['dimensions'][name]) for name in names]
+    records = []
+    for cell, values in zip(cells, np.asarray(cube[start:stop])[cells]):
+        customers, churned, charges, churned_charges = (float(v) for v in values)
+        labels = np.unravel_index(cell, sizes)
+        records.append({
+            'segment': OrderedDict((name, layout['dimensions'][name][i])
+                                   for name, i in zip(names, labels)),
+            'customers': int(customers),
+            'churned': int(churned),
+            'churn_rate': churned / customers if customers else 0.0,
+            'charges': round(charges, 2),
+            'churned_charges': round(churned_charges, 2)
+        })
+    return records
+
+def query_segments(layout, cube, by, where=None):
+    """Segments of one dimension, or of a pair 'a,b', read from the cube.
+
+    where ({dimension: label}) drills down into one label of another
+    dimension; that needs the crossing of the two to be in the cube.
+    """
+    where = where or {}
+    names = by.split(',')
+    unknown = [name for name in [*names, *where] if name not in layout['dimensions']]
+    if unknown:
+        raise AnalysisError(f"Unknown segment dimension: {', '.join(unknown)}")
+    if len(names) + len(where) > 2:
+        raise AnalysisError('Segments can be broken down by at most two dimensions')
+    for name, label in where.items():
+        if label not in layout['dimensions'][name]:
+            raise AnalysisError(f'Unknown {name} value: {label}')
+    wanted = [*names, *where]
+    key = next((','.join(order) for order in (wanted, wanted[::-1])
+                if ','.join(order) in layout['cells']), None)
+    if key is None:
+        raise AnalysisError(f"No segment cube for {' x '.join(wanted)}")
+    records = _segment_records(layout, cube, key)
+    return [record for record in records
+            if all(record['segment'][name] == label for name, label in where.items())]
+
+def riskiest_segments(layout, cube, top=10, min_customers=SEGMENT_MIN_CUSTOMERS):
+    """Segments of every dimension and crossing with the highest churn rate."""
+    customers = np.asarray(cube)[:, 0]
+    rates = np.divide(np.asarray(cube)[:, 1], customers, out=np.zeros(len(customers)),
+                      where=customers > 0)
+    rates[customers < max(min_customers, 1)] = -1
+    records = []
+    for position in np.argsort(-rates, kind='stable')[:top]:
+        if rates[position] < 0:
+            break
+        key = next(key for key, (start, stop) in layout['cells'].items()
+                   if start <= position < stop)
+        offset = position - layout['cells'][key][0]
+        records.extend(_segment_records(layout, cube, key, [offset]))
+    return records
+
+def describe_segment(segment):
+    """Human-readable name of a segment, e.g. "contract month-to-month"."""
+    return ', '.join(f"{describe_dimension(name)} {label}"
+                     for name, label in segment.items())
+
+def segment_answer(layout, cube, query):
+    """Answer a /chat segment question from the cube.
+
+    Mentioned dimensions ('payment method', 'contract', 'tenure' ...) pick
+    the breakdown; without any, the riskiest segments overall are listed.
+    """
+    positions = {}
+    for name in layout['dimensions']:
+        aliases = (name, *SEGMENT_ALIASES.get(name, []))
+        found = [query.find(alias) for alias in aliases if alias in query]
+        if found:
+            positions[name] = min(found)
+    mentioned = sorted(positions, key=positions.get)[:2]
+    crossings = (','.join(mentioned), ','.join(mentioned[::-1]))
+    if len(mentioned) == 2 and any(key in layout['cells'] for key in crossings):
+        records = query_segments(layout, cube, ','.join(mentioned))
+        names = ' and '.join(describe_dimension(name) for name in mentioned)
+        title = f"Churn by {names} (riskiest first):"
+        records = [r for r in records
+                   if r['customers'] >= SEGMENT_MIN_CUSTOMERS] or records
+        records = sorted(records, key=lambda r: r['churn_rate'], reverse=True)[:5]
+    elif mentioned:
+        records = sorted(query_segments(layout, cube, mentioned[0]),
+                         key=lambda r: r['churn_rate'], reverse=True)
+        title = f"Churn by {describe_dimension(mentioned[0])}:"
+    else:
+        records = riskiest_segments(layout, cube, top=3)
+        title = "Customer segments with the highest churn:"
+    return title + "\n" + "\n".join(
+        f"{describe_segment(r['segment'])}: {r['churn_rate']*100:.2f}% "
+        f"({r['customers']} customers)" for r in records)
+
+def describe_dimension(name):
+    """The name a dimension goes by in questions and answers."""
+    return SEGMENT_ALIASES.get(name, [name.replace('_', ' ')])[0]
 
 def generate_recommendations(feature_importance):
     """Generate actionable recommendations based on feature importance."""
@@ -245,41 +1664,61 @@ def generate_recommendations(feature_importance):
 
 def generate_pdf_report(data_info, insights, charts, recommendations, data_quality_score, revenue_message):
     """Generate a formatted PDF report."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer
     try:
         logging.info("Generating PDF report")
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter)
         styles = getSampleStyleSheet()
+        normal = styles['Normal']
         story = []
 
         # Title
         story.append(Paragraph("Customer Churn Analysis Report", styles['Title']))
-        story.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+        generated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        story.append(Paragraph(f"Generated on: {generated}", normal))
         story.append(Spacer(1, 0.2 * inch))
 
         # Dataset Overview
         story.append(Paragraph("Dataset Overview", styles['Heading2']))
-        story.append(Paragraph(f"Total Customers: {data_info['rows']}", styles['Normal']))
-        story.append(Paragraph(f"Columns: {data_info['columns']}", styles['Normal']))
-        story.append(Paragraph(f"Missing Values: {data_info['missing_values']}", styles['Normal']))
-        story.append(Paragraph(f"Data Quality Score: {data_quality_score:.2f}%", styles['Normal']))
+        story.append(Paragraph(f"Total Customers: {data_info['rows']}", normal))
+        story.append(Paragraph(f"Columns: {data_info['columns']}", normal))
+        story.append(Paragraph(
+            f"Missing Values: {data_info['missing_values']}", normal))
+        story.append(Paragraph(
+            f"Data Quality Score: {data_quality_score:.2f}%", normal))
         story.append(Spacer(1, 0.2 * inch))
 
         # Churn Statistics
         story.append(Paragraph("Churn Statistics", styles['Heading2']))
-        story.append(Paragraph(f"Churn Rate: {insights['churn_rate']*100:.2f}%", styles['Normal']))
-        story.append(Paragraph(f"Model Accuracy: {insights['model_accuracy']*100:.2f}%", styles['Normal']))
-        if insights['potential_monthly_loss'] is not None and insights['potential_monthly_loss'] > 0:
-            story.append(Paragraph(f"Monthly Revenue at Risk: ₹{insights['potential_monthly_loss']:.2f}", styles['Normal']))
-            story.append(Paragraph(f"Annual Revenue at Risk: ₹{insights['potential_yearly_loss']:.2f}", styles['Normal']))
+        story.append(Paragraph(
+            f"Churn Rate: {insights['churn_rate']*100:.2f}%", normal))
+        story.append(Paragraph(
+            f"Model Accuracy: {insights['model_accuracy']*100:.2f}%", normal))
+        for engine in insights.get('engines', []):
+            selected = ' (used for this report)' if engine['selected'] else ''
+            name = engine['engine'].replace('_', ' ').title()
+            story.append(Paragraph(
+                f"{name}: {engine['accuracy']*100:.2f}% accuracy, "
+                f"trained in {engine['seconds']:.1f}s{selected}", normal))
+        monthly_loss = insights['potential_monthly_loss']
+        if monthly_loss is not None and monthly_loss > 0:
+            yearly_loss = insights['potential_yearly_loss']
+            story.append(Paragraph(
+                f"Monthly Revenue at Risk: ₹{monthly_loss:.2f}", normal))
+            story.append(Paragraph(
+                f"Annual Revenue at Risk: ₹{yearly_loss:.2f}", normal))
         else:
-            story.append(Paragraph(revenue_message, styles['Normal']))
+            story.append(Paragraph(revenue_message, normal))
         story.append(Spacer(1, 0.2 * inch))
 
         # Charts
         story.append(Paragraph("Graphical Analysis", styles['Heading2']))
         for chart_name, chart_data in charts.items():
-            img_buffer = io.BytesIO(base64.b64decode(chart_data))
+            img_buffer = io.BytesIO(chart_data)
             img = Image(img_buffer, width=5*inch, height=3*inch)
             story.append(img)
             story.append(Paragraph(chart_name.replace('_', ' ').title(), styles['Normal']))
@@ -297,288 +1736,2932 @@ def generate_pdf_report(data_info, insights, charts, recommendations, data_quali
         logging.error(f"Error in generate_pdf_report: {str(e)}")
         raise
 
-@app.route('/')
-def index():
-    """Render the main dashboard page."""
-    return render_template("index.html")
+class AnalysisError(ValueError):
+    """Raised for user-facing analysis failures reported without a prefix."""
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    """Handle CSV file upload and analysis."""
-    global global_data, global_model, feature_importance, model_accuracy, churn_rate, is_churn, current_revenue
-    
-    try:
-        logging.info("Processing file upload")
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file part'})
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No selected file'})
-        
-        if not file.filename.endswith('.csv'):
-            return jsonify({'success': False, 'error': 'Invalid file format'})
-        
-        # Get current_revenue from FormData
-        current_revenue = request.form.get('current_revenue', 0)
-        try:
-            current_revenue = float(current_revenue)
-            if current_revenue < 0:
-                current_revenue = 0
-        except (ValueError, TypeError):
-            current_revenue = 0
-        
-        df = pd.read_csv(file)
-        df, data_quality_score = clean_data(df)
-        global_data = df
 
-        # Find Churn column (case-insensitive)
-        churn_cols = [col for col in df.columns if col.lower() == 'churn']
-        if not churn_cols:
-            return jsonify({
-                'success': False,
-                'data_info': {
-                    'rows': int(len(df)),
-                    'columns': int(len(df.columns)),
-                    'missing_values': int(df.isnull().sum().sum()),
-                    'column_names': df.columns.tolist() + ['All'],
-                    'data_quality_score': float(data_quality_score)
-                },
-                'warning': 'No Churn column found.'
-            })
-        is_churn = churn_cols[0]
-
-        data_info = {
-            'rows': int(len(df)),
-            'columns': int(len(df.columns)),
-            'missing_values': int(df.isnull().sum().sum()),
-            'column_names': df.columns.tolist() + ['All'],
-            'data_quality_score': float(data_quality_score)
-        }
+def find_churn_column(df):
+    """Return the churn column name (case-insensitive) or None."""
+    churn_cols = [col for col in df.columns if col.lower() == 'churn']
+    return churn_cols[0] if churn_cols else None
 
-        # Calculate churn rate
-        churn_values = df[is_churn].replace({'yes': 1, 'no': 0, True: 1, False: 0})
-        if churn_values.isna().all():
-            return jsonify({'success': False, 'error': 'Churn column contains invalid values'})
-        churn_rate = float(churn_values.mean())
-        logging.info(f"Churn rate: {churn_rate*100:.2f}%")
-
-        # Prepare data for model
-        df_model = df.copy()
-        le = LabelEncoder()
-        for col in df_model.select_dtypes(include=['object']).columns:
-            df_model[col] = le.fit_transform(df_model[col])
-        
-        X = df_model.drop(is_churn, axis=1)
-        y = df_model[is_churn].replace({'yes': 1, 'no': 0, True: 1, False: 0})
-        
-        if X.empty or len(X.columns) < 1:
-            return jsonify({'success': False, 'error': 'No valid features for model training'})
+def encode_churn(values):
+    """Map churn labels ('yes'/'no' or booleans) to 1/0."""
+    return values.replace({'yes': 1, 'no': 0, True: 1, False: 0})
 
-        # Scale features
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-        if len(X_train) < 5 or len(X_test) < 2:
-            return jsonify({'success': False, 'error': 'Dataset too small for model training'})
-        
-        # Train Random Forest with GridSearchCV
-        rf = RandomForestClassifier(random_state=42)
-        param_grid = {
-            'n_estimators': [100, 200],
-            'max_depth': [10, 20, None],
-            'min_samples_split': [2, 5]
-        }
-        grid_search = GridSearchCV(rf, param_grid, cv=5, n_jobs=-1)
-        grid_search.fit(X_train, y_train)
-        global_model = grid_search.best_estimator_
-        logging.info(f"Best RF params: {grid_search.best_params_}")
-        
-        y_pred = global_model.predict(X_test)
-        model_accuracy = float(accuracy_score(y_test, y_pred))
-        logging.info(f"Model accuracy: {model_accuracy*100:.2f}%")
-        
-        # Feature importance using permutation importance
-        perm_importance = permutation_importance(global_model, X_test, y_test, n_repeats=10, random_state=42)
-        importance_df = pd.DataFrame({
-            'Feature': X.columns,
-            'Importance': perm_importance.importances_mean
-        })
-        importance_df = importance_df.sort_values(by='Importance', ascending=False)
-        feature_importance = importance_df.to_dict(orient='records')
-        logging.info(f"Feature importance: {feature_importance[:5]}")
-
-        # Revenue loss based on current_revenue
-        monthly_loss = float(current_revenue * churn_rate) if current_revenue > 0 else 0
-        yearly_loss = float(monthly_loss * 12) if current_revenue > 0 else 0
-        revenue_message = "Current Revenue is 0, no revenue loss predicted" if current_revenue == 0 else ""
-
-        insights = {
-            'churn_rate': float(churn_rate),
-            'model_accuracy': float(model_accuracy),
-            'potential_monthly_loss': monthly_loss,
-            'potential_yearly_loss': yearly_loss,
-            'feature_importance': [
-                {'Feature': item['Feature'], 'Importance': float(item['Importance'])}
-                for item in feature_importance[:5]
-            ]
-        }
+def build_data_info(profile):
+    """Summarise the cleaned dataset for the dashboard from its profile."""
+    names = [column['name'] for column in profile['columns']]
+    return {
+        'rows': profile['rows'],
+        'columns': len(names),
+        'missing_values': sum(column['nulls'] for column in profile['columns']),
+        'column_names': names + ['All'],
+        'data_quality_score': profile['data_quality_score']
+    }
 
-        charts = generate_charts(df)
-        if not charts:
-            logging.warning("No charts generated")
-        
-        response = {
-            'success': True,
-            'data_info': data_info,
-            'insights': insights,
-            'charts': charts
-        }
-        if revenue_message:
-            response['revenue_message'] = revenue_message
+def period_data_info(profile, aggregates):
+    """Dashboard summary of a date range from its cube aggregates alone."""
+    data_info = build_data_info(profile)
+    rows = int(aggregates['customers'])
+    missing_ratio = aggregates['missing'] / (rows * len(profile['columns']))
+    return {
+        **data_info,
+        'rows': rows,
+        'missing_values': int(aggregates['missing']),
+        'data_quality_score': quality_score(missing_ratio, profile['duplicate_ratio'])
+    }
 
-        return jsonify(response)
-    except Exception as e:
-        logging.error(f"Error in upload: {str(e)}")
-        return jsonify({'success': False, 'error': f'Analysis failed: {str(e)}'})
+def successive_halving_search(X, y, param_grid, n_jobs=-1):
+    """Pick Random Forest params by successive halving, then refit the winner.
 
-@app.route('/filter_by_date', methods=['POST'])
-def filter_by_date():
-    """Filter data by month and year."""
-    global global_data, global_model, feature_importance, model_accuracy, churn_rate, current_revenue
-    
-    try:
-        logging.info("Processing date filter")
-        data = request.json
-        month = data.get('month')
-        year = data.get('year')
+    Every candidate is cross-validated on a small stratified sample with a
+    proportionally small forest; only the best 1/HALVING_FACTOR advance to
+    the next rung, which gets HALVING_FACTOR times more rows and trees, up
+    to every row and the full forest at the last rung. The search stops
+    early once SEARCH_MAX_FITS or SEARCH_MAX_SECONDS is spent and keeps the
+    best candidate seen at the last rung reached. The first candidate is
+    always cross-validated, even on a budget smaller than CV_FOLDS fits; the
+    report then says the budget was overrun.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import ParameterGrid, cross_val_score
+    from sklearn.utils import resample
+    started = time.time()
+    candidates = list(ParameterGrid(param_grid))
+    n_rungs = max(1, math.ceil(math.log(len(candidates), HALVING_FACTOR)))
+    min_samples = min(len(y), CV_FOLDS * 20)
+    survivors = candidates
+    best_params = candidates[0]
+    fits = 0
+    rungs, pruned = [], []
+    budget_exhausted = False
 
-        if not month or not year:
-            return jsonify({'success': False, 'error': 'Missing month or year'})
+    for rung in range(n_rungs):
+        fraction = HALVING_FACTOR ** (rung - (n_rungs - 1))
+        n_samples = max(min_samples, int(len(y) * fraction))
+        if n_samples < len(y):
+            X_rung, y_rung = resample(X, y, n_samples=n_samples, replace=False,
+                                      stratify=y, random_state=RANDOM_STATE)
+        else:
+            X_rung, y_rung = X, y
 
-        # Assume SignupDate column
-        df = global_data.copy()
-        if 'signupdate' not in df.columns:
-            return jsonify({'success': False, 'error': 'SignupDate column not found or invalid'})
-        
-        df['signupdate'] = pd.to_datetime(df['signupdate'], errors='coerce')
-        if df['signupdate'].isna().all():
-            return jsonify({'success': False, 'error': 'Invalid SignupDate values'})
-        
-        df = df[(df['signupdate'].dt.month == int(month)) & (df['signupdate'].dt.year == int(year))]
-        if df.empty:
-            return jsonify({'success': False, 'error': 'No data for selected date range'})
-
-        global_data = df
-        data_info = {
-            'rows': int(len(df)),
-            'columns': int(len(df.columns)),
-            'missing_values': int(df.isnull().sum().sum()),
-            'column_names': df.columns.tolist() + ['All'],
-            'data_quality_score': float(clean_data(df.copy())[1])
-        }
+        scored = []
+        for params in survivors:
+            out_of_fits = SEARCH_MAX_FITS and fits + CV_FOLDS > SEARCH_MAX_FITS
+            out_of_time = (SEARCH_MAX_SECONDS
+                           and time.time() - started > SEARCH_MAX_SECONDS)
+            if fits and (out_of_fits or out_of_time):
+                budget_exhausted = True
+                break
+            n_estimators = max(10, round(params.get('n_estimators', 100) * fraction))
+            rf = RandomForestClassifier(random_state=RANDOM_STATE,
+                                        **{**params, 'n_estimators': n_estimators})
+            score = cross_val_score(rf, X_rung, y_rung, cv=CV_FOLDS,
+                                    n_jobs=n_jobs).mean()
+            fits += CV_FOLDS
+            scored.append((score, params))
+        if not scored:
+            break
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        best_params = scored[0][1]
+        rungs.append({'rung': rung, 'n_samples': n_samples,
+                      'tree_fraction': round(fraction, 4), 'evaluated': len(scored),
+                      'best_score': round(float(scored[0][0]), 4)})
+        if budget_exhausted:
+            break
+        keep = max(1, math.ceil(len(scored) / HALVING_FACTOR))
+        for score, params in scored[keep:]:
+            pruned.append({'params': params, 'rung': rung,
+                           'score': round(float(score), 4),
+                           'seconds': round(time.time() - started, 3)})
+        survivors = [params for _, params in scored[:keep]]
+        if len(survivors) == 1:
+            break
+
+    model = RandomForestClassifier(random_state=RANDOM_STATE, **best_params)
+    model.fit(X, y)
+    report = {
+        'strategy': 'halving',
+        'candidates': len(candidates),
+        'fits': fits + 1,
+        'rungs': rungs,
+        'pruned': pruned,
+        'budget_exhausted': budget_exhausted,
+        'budget_overrun': bool(SEARCH_MAX_FITS and fits > SEARCH_MAX_FITS)
+    }
+    return model, best_params, report
+
+def forest_engine(X, y, categorical, param_grid, n_jobs):
+    """Random Forest with params picked by SEARCH_STRATEGY over param_grid.
+
+    Category codes are split on like numbers, so categorical is not used.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import GridSearchCV, ParameterGrid
+    with span(f'train.search.{SEARCH_STRATEGY}'):
+        if SEARCH_STRATEGY == 'halving':
+            return successive_halving_search(X, y, param_grid, n_jobs)
+        grid_search = GridSearchCV(RandomForestClassifier(random_state=RANDOM_STATE),
+                                   param_grid, cv=CV_FOLDS, n_jobs=n_jobs)
+        grid_search.fit(X, y)
+    search_report = {'strategy': 'grid', 'candidates': len(ParameterGrid(param_grid)),
+                     'fits': len(ParameterGrid(param_grid)) * CV_FOLDS + 1}
+    return grid_search.best_estimator_, grid_search.best_params_, search_report
+
+def boosting_engine(X, y, categorical, param_grid, n_jobs):
+    """Histogram gradient boosting with categorical splits and early stopping.
+
+    Text features with at most BOOSTING_MAX_BINS categories are split on
+    sets of category codes rather than on their order; code -1 (missing or
+    unseen) counts as missing. Boosting stops once BOOSTING_PATIENCE
+    iterations in a row fail to improve the loss on BOOSTING_VALIDATION of
+    the rows, which replaces the forest's param_grid search. Binning and
+    tree growth use the OpenMP threads the compute governor grants the job.
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    early_stopping = len(y) * BOOSTING_VALIDATION >= BOOSTING_MIN_VALIDATION_ROWS
+    model = HistGradientBoostingClassifier(
+        learning_rate=BOOSTING_LEARNING_RATE, max_iter=BOOSTING_MAX_ITER,
+        max_bins=BOOSTING_MAX_BINS,
+        categorical_features=np.asarray(categorical, dtype=bool),
+        early_stopping=early_stopping, validation_fraction=BOOSTING_VALIDATION,
+        n_iter_no_change=BOOSTING_PATIENCE, random_state=RANDOM_STATE)
+    with span('train.boosting'):
+        model.fit(X, y)
+    best_params = {'learning_rate': BOOSTING_LEARNING_RATE,
+                   'max_iter': int(model.n_iter_)}
+    search_report = {'strategy': 'early_stopping' if early_stopping else 'fixed',
+                     'candidates': 1, 'fits': 1, 'iterations': int(model.n_iter_),
+                     'categorical_features': int(np.sum(categorical))}
+    return model, best_params, search_report
+
+# Model engines, selected with MODEL_ENGINE. Each takes (X_train, y_train,
+# categorical feature mask, param_grid, n_jobs) and returns (fitted model,
+# best params, search report).
+MODEL_ENGINES = OrderedDict([
+    ('random_forest', forest_engine),
+    ('hist_gradient_boosting', boosting_engine)
+])
+
+def is_forest(pipeline):
+    """Whether the pipeline's model is a random forest.
+
+    Pipelines stored before engines were added are.
+    """
+    return pipeline.get('engine', 'random_forest') == 'random_forest'
+
+def build_pipeline(df, churn_col):
+    """Learn how to turn customer rows into model features.
+
+    Returns the preprocessing part of a scoring pipeline: the feature columns,
+    the sorted categories of each text column (the codes LabelEncoder would
+    give) and the values used to fill gaps in new rows. Dates are indexed for
+    filtering, not used as model features. train_churn_model adds the engine
+    name and the fitted model; the result is a plain dict so it unpickles
+    anywhere.
+    """
+    features = df.drop(columns=[churn_col]).select_dtypes(exclude=['datetime']).columns
+    pipeline = {'churn_column': churn_col, 'features': list(features),
+                'categories': {}, 'fills': {}}
+    for col in features:
+        if is_text(df[col]):
+            pipeline['categories'][col] = sorted(df[col].dropna().unique())
+            pipeline['fills'][col] = df[col].mode()[0]
+        elif df[col].dtype == bool:
+            pipeline['fills'][col] = float(df[col].mode()[0])
+        else:
+            pipeline['fills'][col] = float(df[col].median())
+    return pipeline
+
+def encode_features(pipeline, df):
+    """Numeric feature frame for the pipeline's model, from cleaned or raw rows.
+
+    Text is lower-cased, categories unseen in training map to -1 and missing
+    or unparseable values are filled with the training median or mode.
+    """
+    missing = [col for col in pipeline['features'] if col not in df.columns]
+    if missing:
+        raise AnalysisError(f"Missing columns: {', '.join(missing)}")
+    # Columns are written straight into one Fortran-ordered float matrix,
+    # which the frame wraps without copying
+    X = np.empty((len(df), len(pipeline['features'])), order='F')
+    for i, col in enumerate(pipeline['features']):
+        values = df[col]
+        categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        if col in pipeline['categories'] and categorical:
+            # Code each category once; the fill's code is appended last so
+            # that missing values (code -1) pick it up
+            categories = pd.Series(values.cat.categories.astype(str)).str.lower()
+            categories = categories.tolist()
+            lookup = pd.Categorical(categories + [pipeline['fills'][col]],
+                                    categories=pipeline['categories'][col]).codes
+            X[:, i] = lookup[values.cat.codes.to_numpy()]
+        elif col in pipeline['categories']:
+            values = values.where(values.isna(), values.astype(str).str.lower())
+            values = values.fillna(pipeline['fills'][col])
+            categories = pipeline['categories'][col]
+            X[:, i] = pd.Categorical(values, categories=categories).codes
+        else:
+            values = pd.to_numeric(values, errors='coerce').astype(float)
+            X[:, i] = values.fillna(pipeline['fills'][col])
+    return pd.DataFrame(X, index=df.index, columns=pipeline['features'], copy=False)
 
-        churn_rate = float(df[is_churn].replace({'yes': 1, 'no': 0, True: 1, False: 0}).mean())
-        df_model = df.copy()
-        le = LabelEncoder()
-        for col in df_model.select_dtypes(include=['object']).columns:
-            df_model[col] = le.fit_transform(df_model[col])
+def model_features(pipeline, X):
+    """Model input for encoded features X.
 
-        X = df_model.drop(is_churn, axis=1)
-        y = df_model[is_churn].replace({'yes': 1, 'no': 0, True: 1, False: 0})
+    Tree engines take the codes and numbers as they are; pipelines stored
+    before the engines were added also carry the StandardScaler they were
+    trained with.
+    """
+    scaler = pipeline.get('scaler')
+    return scaler.transform(X) if scaler is not None else np.asarray(X)
 
+def predict_churn_probability(pipeline, df):
+    """Churn probability of each row of df under a fitted pipeline."""
+    model = pipeline['model']
+    X = model_features(pipeline, encode_features(pipeline, df))
+    return model.predict_proba(X)[:, list(model.classes_).index(1)]
+
+def train_churn_model(df, churn_col, param_grid=None, n_jobs=-1, engine=None,
+                      compare=None):
+    """Encode the dataset and fit a model with the engine (default MODEL_ENGINE).
+
+    Returns the fitted pipeline (see build_pipeline) with the engine's model,
+    the hold-out accuracy, the hold-out split (X_test, y_test, feature names)
+    used for feature importance and a report of the training. With compare
+    (default MODEL_COMPARE) every other engine is fit on the same split as
+    well; the report's engines list gives the accuracy and seconds of each.
+    """
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+    engine = engine or MODEL_ENGINE
+    compare = MODEL_COMPARE if compare is None else compare
+    if engine not in MODEL_ENGINES:
+        raise AnalysisError(f'Unknown model engine: {engine}')
+    with span('train.encode'):
+        pipeline = build_pipeline(df, churn_col)
+        X = encode_features(pipeline, df)
+        churn = df[churn_col]
+        pipeline['churn_labels'] = (sorted(churn.dropna().unique()) if is_text(churn)
+                                    else None)
+        y = encode_target(pipeline, df)
         if X.empty or len(X.columns) < 1:
-            return jsonify({'success': False, 'error': 'No valid features for model training'})
+            raise AnalysisError('No valid features for model training')
+        too_many = range(BOOSTING_MAX_BINS + 1)
+        categorical = [
+            len(pipeline['categories'].get(col, too_many)) <= BOOSTING_MAX_BINS
+            for col in pipeline['features']]
 
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X.to_numpy(), y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    if len(X_train) < 5 or len(X_test) < 2:
+        raise AnalysisError('Dataset too small for model training')
 
-        rf = RandomForestClassifier(random_state=42)
-        grid_search = GridSearchCV(rf, param_grid={'n_estimators': [100, 200], 'max_depth': [10, 20, None]}, cv=5)
-        grid_search.fit(X_train, y_train)
-        global_model = grid_search.best_estimator_
+    param_grid = param_grid or PARAM_GRID
+    others = [name for name in MODEL_ENGINES if name != engine]
+    engines = [engine] + (others if compare else [])
+    compared = []
+    for name in engines:
+        started = time.time()
+        fitted, best_params, report = MODEL_ENGINES[name](
+            X_train, y_train, categorical, param_grid, n_jobs)
+        report['best_params'] = best_params
+        report['seconds'] = round(time.time() - started, 3)
+        with span('train.evaluate'):
+            accuracy = float(accuracy_score(y_test, fitted.predict(X_test)))
+        logging.info(f"{name}: {accuracy*100:.2f}% accuracy, params {best_params} "
+                     f"({report['strategy']}, {report['fits']} fits in "
+                     f"{report['seconds']}s)")
+        compared.append({'engine': name, 'accuracy': accuracy,
+                         'seconds': report['seconds'], 'selected': name == engine})
+        if name == engine:
+            model, model_accuracy, search_report = fitted, accuracy, report
 
-        y_pred = global_model.predict(X_test)
-        model_accuracy = float(accuracy_score(y_test, y_pred))
+    search_report.update(engine=engine, engines=compared)
+    pipeline.update(engine=engine, model=model,
+                    reference=feature_distribution(pipeline, X))
+    return pipeline, model_accuracy, (X_test, y_test, X.columns), search_report
 
-        perm_importance = permutation_importance(global_model, X_test, y_test, n_repeats=10, random_state=42)
-        importance_df = pd.DataFrame({
-            'Feature': X.columns,
-            'Importance': perm_importance.importances_mean
-        })
-        importance_df = importance_df.sort_values(by='Importance', ascending=False)
-        feature_importance = importance_df.to_dict(orient='records')
-
-        # Use stored current_revenue from last upload (not ideal, but aligns with script.js)
-        current_revenue = float(request.form.get('current_revenue', 0)) if request.form.get('current_revenue') else 0
-        monthly_loss = float(current_revenue * churn_rate) if current_revenue > 0 else 0
-        yearly_loss = float(monthly_loss * 12) if current_revenue > 0 else 0
-        revenue_message = "Current Revenue is 0, no revenue loss predicted" if current_revenue == 0 else ""
-
-        insights = {
-            'churn_rate': float(churn_rate),
-            'model_accuracy': float(model_accuracy),
-            'potential_monthly_loss': monthly_loss,
-            'potential_yearly_loss': yearly_loss,
-            'feature_importance': [
-                {'Feature': item['Feature'], 'Importance': float(item['Importance'])}
-                for item in feature_importance[:5]
-            ]
-        }
+def encode_target(pipeline, df):
+    """0/1 churn labels of df, coded as for the pipeline's model (-1 if unseen)."""
+    churn = df[pipeline['churn_column']]
+    if pipeline.get('churn_labels') is not None:
+        codes = pd.Categorical(churn, categories=pipeline['churn_labels']).codes
+        churn = pd.Series(codes, index=churn.index)
+    return encode_churn(churn)
 
-        charts = generate_charts(df)
-        response = {
-            'success': True,
-            'data_info': data_info,
-            'insights': insights,
-            'charts': charts
-        }
-        if revenue_message:
-            response['revenue_message'] = revenue_message
+def feature_distribution(pipeline, X, reference=None):
+    """Histogram of each encoded feature, the baseline of the drift check.
 
-        return jsonify(response)
-    except Exception as e:
-        logging.error(f"Error in filter_by_date: {str(e)}")
-        return jsonify({'success': False, 'error': f'Filter failed: {str(e)}'})
+    Text features are counted per category, unseen ones together; numbers
+    in DRIFT_BINS quantile bins. Passing the training histograms as
+    reference reuses their bins, so the counts can be compared and added.
+    """
+    distribution = {}
+    for col in X.columns:
+        values = X[col].to_numpy(dtype=float)
+        if col in pipeline['categories']:
+            edges = None
+            counts = np.bincount(values.astype(np.int64) + 1,
+                                 minlength=len(pipeline['categories'][col]) + 1)
+        else:
+            edges = reference[col]['edges'] if reference else np.unique(
+                np.quantile(values, np.linspace(0, 1, DRIFT_BINS + 1)[1:-1])).tolist()
+            counts = np.bincount(np.searchsorted(edges, values, side='right'),
+                                 minlength=len(edges) + 1)
+        distribution[col] = {'edges': edges, 'counts': counts.tolist()}
+    return distribution
 
-@app.route('/predict_revenue', methods=['POST'])
-def predict_revenue():
-    """Predict future revenue based on current revenue and churn rate."""
+def population_stability(expected, actual):
+    """Population stability index of two histograms over the same bins."""
+    expected = np.maximum(np.asarray(expected, dtype=float) / max(sum(expected), 1),
+                          1e-4)
+    actual = np.maximum(np.asarray(actual, dtype=float) / max(sum(actual), 1), 1e-4)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
 
-    global current_revenue
-    try:
-        logging.info("Predicting revenue")
-        data = request.json
-        current_revenue = data.get('current_revenue', 0)
-        try:
-            current_revenue = float(current_revenue)
-            if current_revenue < 0:
-                current_revenue = 0
-        except (ValueError, TypeError):
-            current_revenue = 0
-        
-        if current_revenue == 0:
-            return jsonify({
-                'success': True,
+def check_drift(pipeline, accuracy, df):
+    """Decide whether a new slice of customers calls for a full retrain.
+
+    Returns the slice's encoded features, churn labels and feature
+    histograms, and a report: the PSI of each feature against the training
+    data, the current model's accuracy on the slice and the reasons to
+    retrain, if any.
+    """
+    from sklearn.metrics import accuracy_score
+    X = encode_features(pipeline, df)
+    y = encode_target(pipeline, df)
+    if (y < 0).any():
+        raise AnalysisError(
+            'Churn column contains values not seen in the current dataset')
+    reference = pipeline['reference']
+    counts = feature_distribution(pipeline, X, reference)
+    psi = {col: round(population_stability(reference[col]['counts'],
+                                           counts[col]['counts']), 4)
+           for col in X.columns}
+    model = pipeline['model']
+    predicted = model.predict(model_features(pipeline, X))
+    incoming_accuracy = float(accuracy_score(y, predicted))
+
+    reasons = []
+    drifted = [col for col, value in psi.items() if value > DRIFT_PSI_THRESHOLD]
+    if drifted:
+        reasons.append(f"Feature drift (PSI above {DRIFT_PSI_THRESHOLD}): "
+                       f"{', '.join(drifted)}")
+    if accuracy - incoming_accuracy > DRIFT_ACCURACY_DROP:
+        reasons.append(f'Accuracy on the new customers is '
+                       f'{incoming_accuracy*100:.2f}%, down from {accuracy*100:.2f}%')
+    if set(np.unique(y)) != set(model.classes_):
+        reasons.append('The new customers do not include every churn outcome')
+    if not is_forest(pipeline):
+        reasons.append(f"Only random forests can be grown; the {pipeline['engine']} "
+                       f"model is retrained")
+    report = {
+        'psi': psi,
+        'max_psi': max(psi.values(), default=0.0),
+        'incoming_accuracy': incoming_accuracy,
+        'retrain': bool(reasons),
+        'reasons': reasons
+    }
+    return X, y, counts, report
+
+def grow_forest(pipeline, X, y, stored_rows):
+    """Add warm-started trees fit on a new slice of customers to the model.
+
+    The slice gets trees in proportion to its size against the stored_rows
+    the forest was grown on (at least APPEND_MIN_TREES), so old and new
+    customers weigh about as they would in one forest. TEST_SIZE of the
+    slice is held out for the accuracy and feature importance of the result.
+    """
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+    X_train, X_test, y_train, y_test = train_test_split(
+        model_features(pipeline, X), y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    if len(X_train) < 5 or len(X_test) < 2:
+        raise AnalysisError('Too few new customers to update the model')
+    model = pipeline['model']
+    trees = len(model.estimators_)
+    added = max(APPEND_MIN_TREES, math.ceil(trees * len(X) / stored_rows))
+    started = time.time()
+    n_jobs = model.n_jobs
+    model.set_params(warm_start=True, n_estimators=trees + added, n_jobs=job_threads())
+    model.fit(X_train, y_train)
+    model.set_params(warm_start=False, n_jobs=n_jobs)
+    accuracy = float(accuracy_score(y_test, model.predict(X_test)))
+    report = {
+        'engine': 'random_forest',
+        'strategy': 'warm_start',
+        'trees_added': added,
+        'n_estimators': trees + added,
+        'rows': len(X_train),
+        'fits': 1,
+        'seconds': round(time.time() - started, 3)
+    }
+    logging.info(f"Grew forest by {added} trees to {trees + added} in "
+                 f"{report['seconds']}s; accuracy on new customers {accuracy*100:.2f}%")
+    return accuracy, (X_test, y_test, X.columns), report
+
+def score_csv(pipeline, path, chunk_rows=INGEST_CHUNK_ROWS):
+    """Score the customers of a CSV file chunk by chunk.
+
+    Yields (csv_text, rows) per chunk: the file's ID columns, or the row
+    number when it has none, and churn_probability. The first block carries
+    the header. Only one chunk is held in memory at a time.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    text_columns = {name: str for name in header
+                    if name.lower() in pipeline['categories']}
+    chunks = pd.read_csv(path, chunksize=chunk_rows, dtype=text_columns)
+    for i, chunk in enumerate(chunks):
+        chunk.columns = chunk.columns.str.lower()
+        id_columns = [col for col in chunk.columns if 'id' in col]
+        scores = chunk[id_columns].copy()
+        probability = predict_churn_probability(pipeline, chunk)
+        scores['churn_probability'] = np.round(probability, 4)
+        text = scores.to_csv(index=not id_columns, index_label='row', header=i == 0)
+        yield text, len(chunk)
+
+def compile_forest(model):
+    """Flatten a fitted forest into contiguous node arrays.
+
+    Trees are laid end to end and forest_roots holds the first node of each.
+    Node i splits on forest_feature[i] at forest_threshold[i] and continues at
+    forest_left[i] or forest_right[i]; leaves point at themselves, so every
+    tree can be walked in lockstep. forest_value is the churn probability a
+    node predicts.
+    """
+    churn_class = list(model.classes_).index(1)
+    arrays = {name: [] for name in FOREST_ARRAYS}
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+        proba = tree.value[:, 0, :]
+        arrays['forest_roots'].append([offset])
+        arrays['forest_feature'].append(np.where(leaf, 0, tree.feature))
+        arrays['forest_threshold'].append(tree.threshold)
+        arrays['forest_left'].append(
+            np.where(leaf, nodes, tree.children_left) + offset)
+        arrays['forest_right'].append(
+            np.where(leaf, nodes, tree.children_right) + offset)
+        arrays['forest_value'].append(proba[:, churn_class] / proba.sum(axis=1))
+        offset += tree.node_count
+    dtypes = {'forest_threshold': np.float64, 'forest_value': np.float64}
+    return {name: np.concatenate(parts).astype(dtypes.get(name, np.int32))
+            for name, parts in arrays.items()}
+
+def _forest_step(forest, X, rows, nodes):
+    """Move every (row, tree) cursor in nodes one level down its tree."""
+    features = forest['forest_feature'][nodes]
+    left = X[rows, features] <= forest['forest_threshold'][nodes]
+    return np.where(left, forest['forest_left'][nodes],
+                    forest['forest_right'][nodes])
+
+def forest_proba(forest, X):
+    """Churn probability of each row of features X under a compiled forest.
+
+    Matches RandomForestClassifier.predict_proba, which also compares
+    float32 features against the float64 thresholds.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    rows = np.arange(len(X))[:, None]
+    roots = forest['forest_roots']
+    nodes = np.broadcast_to(roots, (len(X), len(roots)))
+    while True:
+        step = _forest_step(forest, X, rows, nodes)
+        if np.array_equal(step, nodes):
+            return forest['forest_value'][nodes].mean(axis=1)
+        nodes = step
+
+def compile_scorer(pipeline, forest=None):
+    """Everything needed to score one customer without pandas.
+
+    Forests are walked from their flattened arrays without sklearn; other
+    engines keep the fitted model and call its predict_proba.
+    """
+    scaler = pipeline.get('scaler')
+    width = len(pipeline['features'])
+    scorer = {
+        'engine': pipeline.get('engine', 'random_forest'),
+        'features': pipeline['features'],
+        'codes': {col: {value: code for code, value in enumerate(categories)}
+                  for col, categories in pipeline['categories'].items()},
+        'fills': pipeline['fills'],
+        'mean': scaler.mean_ if scaler is not None else np.zeros(width),
+        'scale': scaler.scale_ if scaler is not None else np.ones(width)
+    }
+    if forest is None:
+        model = pipeline['model']
+        scorer.update(model=model, churn_class=list(model.classes_).index(1))
+    else:
+        scorer.update({name: np.asarray(values)
+                       for name, values in forest.items()})
+    return scorer
+
+def scorer_proba(scorer, X):
+    """Churn probability of each encoded row of X under a compiled scorer."""
+    if 'model' in scorer:
+        return scorer['model'].predict_proba(X)[:, scorer['churn_class']]
+    return forest_proba(scorer, X)
+
+def encode_customer(scorer, customer):
+    """Model input row for one customer record, as encode_features would give."""
+    record = {str(key).lower(): value for key, value in customer.items()}
+    row = np.empty(len(scorer['features']))
+    for i, col in enumerate(scorer['features']):
+        value = record.get(col)
+        fill = scorer['fills'][col]
+        if col in scorer['codes']:
+            missing = value is None or (isinstance(value, float)
+                                        and math.isnan(value))
+            key = fill if missing else str(value).lower()
+            row[i] = scorer['codes'][col].get(key, -1)
+            continue
+        try:
+            row[i] = float(value)
+        except (TypeError, ValueError):
+            row[i] = fill
+        if math.isnan(row[i]):
+            row[i] = fill
+    return (row - scorer['mean']) / scorer['scale']
+
+class PredictionBatcher:
+    """Coalesce concurrent single-customer predictions into batched scoring calls.
+
+    Callers get a Future; one thread takes whatever requests are queued (up
+    to max_rows, waiting at most max_wait seconds for more) and scores each
+    dataset's rows in one pass, so a busy endpoint pays the numpy overhead
+    once per batch rather than once per customer.
+    """
+
+    def __init__(self, max_rows, max_wait):
+        """Batch up to max_rows rows, waiting at most max_wait seconds for them."""
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, dataset_id, scorer, row):
+        """Queue one encoded row; the future resolves to its churn probability."""
+        future = Future()
+        self._queue.put((dataset_id, scorer, row, future))
+        return future
+
+    def _take_batch(self):
+        """Wait for a request, then gather more for up to max_wait seconds."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_rows:
+            try:
+                wait = max(deadline - time.monotonic(), 0)
+                batch.append(self._queue.get(timeout=wait)
+                             if self.max_wait else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Score queued rows in one call per dataset, forever."""
+        while True:
+            groups = OrderedDict()
+            for dataset_id, scorer, row, future in self._take_batch():
+                groups.setdefault(dataset_id, (scorer, []))[1].append((row, future))
+            for scorer, requests in groups.values():
+                try:
+                    rows = np.vstack([row for row, _ in requests])
+                    probabilities = scorer_proba(scorer, rows)
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                for probability, (_, future) in zip(probabilities, requests):
+                    future.set_result(float(probability))
+
+def get_prediction_batcher():
+    """Return this process's prediction batcher, starting it on first use."""
+    global _prediction_batcher
+    with _prediction_batcher_lock:
+        if _prediction_batcher is None:
+            _prediction_batcher = PredictionBatcher(PREDICT_BATCH_ROWS,
+                                                    PREDICT_BATCH_WAIT)
+        return _prediction_batcher
+
+def scoring_summary(rows, started):
+    """One line on how many rows were scored and how fast."""
+    seconds = max(time.time() - started, 1e-9)
+    return f"Scored {rows} rows in {seconds:.2f}s ({rows / seconds:.0f} rows/s)"
+
+def _permuted_accuracies(model, X, y, permuted):
+    """Accuracy with each (column, shuffled values) pair swapped in, in one call."""
+    stacked = np.tile(X, (len(permuted), 1))
+    for i, (col, values) in enumerate(permuted):
+        stacked[i * len(X):(i + 1) * len(X), col] = values
+    correct = model.predict(stacked).reshape(len(permuted), len(X)) == np.asarray(y)
+    return correct.mean(axis=1)
+
+def _score_permutations(parallel, model, X, y, permuted):
+    """Score permuted columns in parallel groups of IMPORTANCE_STACK_ROWS rows."""
+    group = max(1, IMPORTANCE_STACK_ROWS // len(X))
+    score = joblib.delayed(_permuted_accuracies)
+    scores = parallel(score(model, X, y, permuted[i:i + group])
+                      for i in range(0, len(permuted), group))
+    return np.concatenate(scores)
+
+def _out_of_time(deadline):
+    """Whether a deadline is set and has passed."""
+    return deadline is not None and time.time() >= deadline
+
+def permutation_engine(model, X, y, deadline):
+    """Permutation importance on the whole hold-out split, one repeat at a time.
+
+    Every round shuffles each feature once and scores the shuffled copies in
+    stacked, parallel predict calls, until PERMUTATION_REPEATS rounds are done
+    or the deadline passes. The shuffles are those of sklearn's
+    permutation_importance, so a complete run gives the same numbers.
+    """
+    from sklearn.metrics import accuracy_score
+    from sklearn.utils import check_random_state
+    seed = check_random_state(RANDOM_STATE).randint(np.iinfo(np.int32).max + 1)
+    states = [np.random.RandomState(seed) for _ in range(X.shape[1])]
+    orders = [np.arange(len(X)) for _ in range(X.shape[1])]
+    columns = [X[:, col].copy() for col in range(X.shape[1])]
+    baseline = accuracy_score(y, model.predict(X))
+    rounds = []
+    with joblib.Parallel(n_jobs=job_threads(), prefer='threads') as parallel:
+        while (len(rounds) < PERMUTATION_REPEATS
+               and not (rounds and _out_of_time(deadline))):
+            for col in range(X.shape[1]):
+                states[col].shuffle(orders[col])
+                columns[col] = columns[col][orders[col]]
+            scores = _score_permutations(parallel, model, X, y,
+                                         list(enumerate(columns)))
+            rounds.append(baseline - scores)
+    details = {'rounds': len(rounds),
+               'budget_exhausted': len(rounds) < PERMUTATION_REPEATS}
+    return np.mean(rounds, axis=0), None, details
+
+def sampled_permutation_engine(model, X, y, deadline):
+    """Permutation importance on fresh random subsets of IMPORTANCE_SAMPLE_ROWS rows.
+
+    Rounds are independent, so their spread gives a 95% interval around the
+    mean drop in accuracy; more rounds (up to PERMUTATION_REPEATS) narrow it.
+    """
+    from sklearn.metrics import accuracy_score
+    rng = np.random.RandomState(RANDOM_STATE)
+    size = min(IMPORTANCE_SAMPLE_ROWS, len(X))
+    rounds = []
+    with joblib.Parallel(n_jobs=job_threads(), prefer='threads') as parallel:
+        while (len(rounds) < PERMUTATION_REPEATS
+               and not (rounds and _out_of_time(deadline))):
+            rows = rng.choice(len(X), size, replace=False)
+            X_round, y_round = X[rows], y[rows]
+            baseline = accuracy_score(y_round, model.predict(X_round))
+            permuted = [(col, X_round[rng.permutation(size), col])
+                        for col in range(X.shape[1])]
+            scores = _score_permutations(parallel, model, X_round, y_round, permuted)
+            rounds.append(baseline - scores)
+    rounds = np.array(rounds)
+    mean = rounds.mean(axis=0)
+    if len(rounds) > 1:
+        margin = 1.96 * rounds.std(axis=0, ddof=1) / math.sqrt(len(rounds))
+    else:
+        margin = np.zeros_like(mean)
+    details = {'rounds': len(rounds), 'rows': size,
+               'budget_exhausted': len(rounds) < PERMUTATION_REPEATS}
+    return mean, (mean - margin, mean + margin), details
+
+def impurity_engine(model, X, y, deadline):
+    """The forest's mean decrease in impurity; free, but measured on training data."""
+    return model.feature_importances_, None, {'budget_exhausted': False}
+
+def contribution_engine(model, X, y, deadline):
+    """Mean absolute tree-path contribution of each feature to the churn probability.
+
+    Walking a row down a tree, every split moves the predicted probability
+    from the parent's value to the child's; that change is credited to the
+    split feature and averaged over trees. Rows are taken IMPORTANCE_BLOCK_ROWS
+    at a time until the hold-out split or the deadline runs out.
+    """
+    forest = compile_forest(model)
+    n_trees, n_features = len(forest['forest_roots']), X.shape[1]
+    totals = np.zeros(n_features)
+    done = 0
+    while done < len(X) and not (done and _out_of_time(deadline)):
+        block = np.asarray(X[done:done + IMPORTANCE_BLOCK_ROWS], dtype=np.float32)
+        rows = np.arange(len(block))[:, None]
+        nodes = np.broadcast_to(forest['forest_roots'], (len(block), n_trees))
+        contributions = np.zeros(len(block) * n_features)
+        while True:
+            step = _forest_step(forest, block, rows, nodes)
+            moved = step != nodes
+            if not moved.any():
+                break
+            cells = (rows * n_features + forest['forest_feature'][nodes])[moved]
+            values = forest['forest_value']
+            delta = (values[step] - values[nodes])[moved]
+            contributions += np.bincount(cells, weights=delta,
+                                         minlength=len(contributions))
+            nodes = step
+        per_row = contributions.reshape(len(block), n_features) / n_trees
+        totals += np.abs(per_row).sum(axis=0)
+        done += len(block)
+    return totals / done, None, {'rows': done, 'budget_exhausted': done < len(X)}
+
+# Feature importance methods, selected with IMPORTANCE_METHOD. Each takes
+# (model, X_test, y_test, deadline) and returns (importances, (low, high)
+# interval or None, details for the report).
+IMPORTANCE_ENGINES = OrderedDict([
+    ('permutation', permutation_engine),
+    ('sampled', sampled_permutation_engine),
+    ('impurity', impurity_engine),
+    ('contribution', contribution_engine)
+])
+# Methods that read a forest's trees; other models are ranked by permutation
+FOREST_IMPORTANCE_METHODS = ['impurity', 'contribution']
+
+def compute_feature_importance(model, X_test, y_test, feature_names, method=None,
+                               max_seconds=None):
+    """Rank features with an importance engine on the hold-out split.
+
+    Returns the records sorted by importance (with Low/High bounds when the
+    engine gives an interval) and a report of the method, the work done and
+    whether the time budget (default IMPORTANCE_MAX_SECONDS) cut it short.
+    """
+    method = method or IMPORTANCE_METHOD
+    if method not in IMPORTANCE_ENGINES:
+        raise AnalysisError(f'Unknown importance method: {method}')
+    if method in FOREST_IMPORTANCE_METHODS and not hasattr(model, 'estimators_'):
+        logging.warning(f"Importance method {method} needs a random forest; "
+                        f"using permutation")
+        method = 'permutation'
+    max_seconds = IMPORTANCE_MAX_SECONDS if max_seconds is None else max_seconds
+    started = time.time()
+    deadline = started + max_seconds if max_seconds else None
+    with span(f'importance.{method}'):
+        engine = IMPORTANCE_ENGINES[method]
+        values, interval, details = engine(model, np.asarray(X_test),
+                                           np.asarray(y_test), deadline)
+    importance_df = pd.DataFrame({
+        'Feature': feature_names,
+        'Importance': values
+    })
+    if interval is not None:
+        importance_df['Low'], importance_df['High'] = interval
+    importance_df = importance_df.sort_values(by='Importance', ascending=False)
+    importance = importance_df.to_dict(orient='records')
+    report = {'method': method, **details, 'seconds': round(time.time() - started, 3)}
+    logging.info(f"Feature importance ({method}, {report['seconds']}s): "
+                 f"{importance[:5]}")
+    return importance, report
+
+def proportion_interval(proportion, n, population=None):
+    """95% normal-approximation interval of a proportion seen in n sampled rows.
+
+    With the population size the finite population correction applies.
+    """
+    correction = 1 - n / population if population else 1
+    variance = proportion * (1 - proportion) / max(n, 1) * max(correction, 0)
+    margin = 1.96 * math.sqrt(variance)
+    return [max(proportion - margin, 0.0), min(proportion + margin, 1.0)]
+
+def build_insights(churn_rate, model_accuracy, importance, current_revenue,
+                   engines=None, intervals=None):
+    """Build the insights payload and the zero-revenue message, if any.
+
+    engines is the training report's side-by-side list of model engines.
+    intervals holds 95% intervals of the churn rate and model accuracy of a
+    sampled analysis; the revenue at risk gets matching intervals.
+    """
+    monthly_loss = float(current_revenue * churn_rate) if current_revenue > 0 else 0
+    yearly_loss = float(monthly_loss * 12) if current_revenue > 0 else 0
+    revenue_message = ("Current Revenue is 0, no revenue loss predicted"
+                       if current_revenue == 0 else "")
+
+    insights = {
+        'churn_rate': float(churn_rate),
+        'model_accuracy': float(model_accuracy),
+        'potential_monthly_loss': monthly_loss,
+        'potential_yearly_loss': yearly_loss,
+        'feature_importance': [
+            {'Feature': item['Feature'], 'Importance': float(item['Importance'])}
+            for item in importance[:5]
+        ]
+    }
+    if engines:
+        insights['engines'] = engines
+    if intervals:
+        insights['intervals'] = dict(intervals)
+        if current_revenue > 0 and 'churn_rate' in intervals:
+            low, high = intervals['churn_rate']
+            insights['intervals']['potential_monthly_loss'] = [
+                current_revenue * low, current_revenue * high]
+            insights['intervals']['potential_yearly_loss'] = [
+                current_revenue * low * 12, current_revenue * high * 12]
+    return insights, revenue_message
+
+def projection_customers(pipeline, df):
+    """Churn probability and monthly charges of every customer, least likely first.
+
+    The probability under the pipeline's model is taken as the customer's
+    chance of leaving in any one month, as the flat estimate does with the
+    churn rate. Without a monthlycharges column every customer pays 1.
+    """
+    probability = predict_churn_probability(pipeline, df)
+    charges = (df['monthlycharges'].to_numpy(dtype=float)
+               if 'monthlycharges' in df.columns else np.ones(len(df)))
+    order = np.argsort(probability, kind='stable')
+    return np.column_stack([probability[order], charges[order]]).astype(np.float32)
+
+def projection_groups(customers, months, churn_reduction=0):
+    """Counts, charges, squared charges, hazards and dispersions of each bin.
+
+    There are PROJECTION_BINS bins.
+
+    customers comes from projection_customers, so equal slices are bins of
+    similar churn probability. A bin's hazard in month t is the share of
+    its charges still paid at t - 1 that is lost in t. A simulation that
+    applies it to the bin's customer count and mean charge therefore has
+    exactly the per-customer expected loss in every month, however coarse
+    the bins. The dispersion is the variance of the number of leavers
+    among the customers still active, relative to a binomial with the
+    bin's hazard; it is below 1 when their probabilities differ.
+    """
+    probability = customers[:, 0].astype(float) * (1 - churn_reduction / 100)
+    charges = customers[:, 1].astype(float)
+    edges = np.linspace(0, len(customers), PROJECTION_BINS + 1).astype(int)
+    starts = np.unique(edges[:-1])
+    counts = np.diff(np.append(starts, len(customers))).astype(float)
+    revenue = np.add.reduceat(charges, starts)
+    squares = np.add.reduceat(charges ** 2, starts)
+    # Bins that pay nothing are weighted by customers instead
+    weights = np.where(np.repeat(revenue > 0, counts.astype(int)), charges, 1.0)
+    survival = np.empty((len(starts), months + 1))
+    active = np.ones(len(customers))
+    variance = np.empty((len(starts), months))
+    for month in range(months + 1):
+        survival[:, month] = np.add.reduceat(weights, starts)
+        if month < months:
+            spread = active * probability * (1 - probability)
+            variance[:, month] = (np.add.reduceat(spread, starts)
+                                  / np.add.reduceat(active, starts))
+        weights = weights * (1 - probability)
+        active = active * (1 - probability)
+    shape = (len(starts), months)
+    hazard = 1 - np.divide(survival[:, 1:], survival[:, :-1], out=np.zeros(shape),
+                           where=survival[:, :-1] > 0)
+    binomial = hazard * (1 - hazard)
+    dispersion = np.minimum(np.divide(variance, binomial, out=np.ones(shape),
+                                      where=binomial > 0), 1)
+    return counts, revenue, squares, hazard, dispersion
+
+def parse_projection(data):
+    """Horizon in months, scenarios and churn reduction (%) of a projection request."""
+    try:
+        months = int(data.get('months', PROJECTION_MONTHS))
+        scenarios = int(data.get('scenarios', PROJECTION_SCENARIOS))
+        churn_reduction = float(data.get('churn_reduction', 0))
+    except (ValueError, TypeError):
+        raise AnalysisError('months, scenarios and churn_reduction must be numbers')
+    if not 1 <= months <= PROJECTION_MAX_MONTHS:
+        raise AnalysisError(f'months must be between 1 and {PROJECTION_MAX_MONTHS}')
+    if not 1 <= scenarios <= PROJECTION_MAX_SCENARIOS:
+        raise AnalysisError(
+            f'scenarios must be between 1 and {PROJECTION_MAX_SCENARIOS}')
+    if not 0 <= churn_reduction <= 100:
+        raise AnalysisError('churn_reduction must be a percentage between 0 and 100')
+    return months, scenarios, churn_reduction
+
+def binomial_counts(rng, trials, probability, dispersion=1):
+    """Binomial draws for a matrix of trial counts and per-column probabilities.
+
+    Where the variance is at least PROJECTION_NORMAL_VARIANCE the rounded
+    normal approximation is used, which is many times faster than numpy's
+    binomial sampler and indistinguishable at that size; its variance is
+    scaled by the per-column dispersion.
+    """
+    spread = np.sqrt(trials * (probability * (1 - probability) * dispersion))
+    noise = rng.standard_normal(trials.shape, dtype=np.float32)
+    counts = np.rint(trials * probability + spread * noise)
+    small = spread < math.sqrt(PROJECTION_NORMAL_VARIANCE)
+    if small.any():
+        probabilities = np.broadcast_to(probability, trials.shape)
+        counts[small] = rng.binomial(trials[small].astype(np.int64),
+                                     probabilities[small])
+    return np.clip(counts, 0, trials)
+
+def project_revenue_loss(customers, current_revenue, months=PROJECTION_MONTHS,
+                         scenarios=PROJECTION_SCENARIOS, churn_reduction=0):
+    """Monte Carlo projection of the revenue lost to churn over the next months.
+
+    In every scenario the customers of each probability bin (see
+    projection_groups) who are still active leave month by month, with
+    churn probabilities lowered by churn_reduction percent, and take the
+    charges of as many customers drawn from the bin with them. Losses are
+    scaled so that all customers together pay current_revenue a month.
+    Scenarios are simulated PROJECTION_CHUNK at a time over bins rather
+    than customers, so the memory and time of the simulation do not grow
+    with the dataset. A fixed seed makes the result repeatable.
+    """
+    started = time.time()
+    counts, revenue, squares, hazard, dispersion = projection_groups(
+        customers, months, churn_reduction)
+    mean_charge = revenue / counts
+    charge_variance = np.maximum(squares / counts - mean_charge ** 2, 0)
+    scale = current_revenue / revenue.sum() if revenue.sum() > 0 else 0.0
+    rng = np.random.default_rng(RANDOM_STATE)
+    # Monthly revenue no longer coming in at the end of each month, per scenario
+    lost = np.empty((scenarios, months), dtype=np.float32)
+    for start in range(0, scenarios, PROJECTION_CHUNK):
+        alive = np.tile(counts, (min(PROJECTION_CHUNK, scenarios - start), 1))
+        # How far the charges of a bin's leavers so far are from its mean
+        # charge: leavers are drawn from the bin without replacement
+        deviation = np.zeros_like(alive)
+        for month in range(months):
+            leavers = binomial_counts(rng, alive, hazard[:, month],
+                                      dispersion[:, month])
+            shift = np.divide(-deviation * leavers, alive, out=np.zeros_like(alive),
+                              where=alive > 0)
+            spread = np.sqrt(leavers * (alive - leavers) / np.maximum(alive - 1, 1)
+                             * charge_variance)
+            noise = rng.standard_normal(alive.shape, dtype=np.float32)
+            deviation += shift + spread * noise
+            alive -= leavers
+            total = (counts - alive) @ mean_charge + deviation.sum(axis=1)
+            lost[start:start + len(alive), month] = np.maximum(total, 0)
+    lost *= scale
+    cumulative = np.cumsum(lost, axis=1, dtype=float)
+    bands = np.percentile(cumulative, PROJECTION_PERCENTILES, axis=0)
+    expected = cumulative.mean(axis=0)
+    bands = list(zip(PROJECTION_PERCENTILES, bands))
+    return {
+        'months': months,
+        'scenarios': scenarios,
+        'churn_reduction': churn_reduction,
+        'first_month_loss': round(float(lost[:, 0].mean()), 2),
+        'expected_loss': round(float(expected[-1]), 2),
+        'percentiles': {f'p{q}': round(float(band[-1]), 2) for q, band in bands},
+        'monthly_revenue_at_end': round(float(current_revenue - lost[:, -1].mean()),
+                                        2),
+        'by_month': [
+            {'month': month + 1, 'expected_loss': round(float(expected[month]), 2),
+             **{f'p{q}': round(float(band[month]), 2) for q, band in bands}}
+            for month in range(months)
+        ],
+        'seconds': round(time.time() - started, 3)
+    }
+
+def describe_projection(projection):
+    """One chat sentence for a revenue projection."""
+    low, high = PROJECTION_PERCENTILES[0], PROJECTION_PERCENTILES[-1]
+    percentiles = projection['percentiles']
+    return (f"Over the next {projection['months']} months churn is expected to cost "
+            f"₹{projection['expected_loss']:.2f} "
+            f"(₹{percentiles[f'p{low}']:.2f} to ₹{percentiles[f'p{high}']:.2f} in "
+            f"{high - low}% of {projection['scenarios']} simulated scenarios), "
+            f"₹{projection['first_month_loss']:.2f} of it in the first month. "
+            f"Monthly revenue would fall to "
+            f"₹{projection['monthly_revenue_at_end']:.2f}.")
+
+def training_config():
+    """Settings that change the fitted model; part of the dataset id."""
+    return {
+        'analysis_version': ANALYSIS_VERSION,
+        'param_grid': PARAM_GRID,
+        'cv_folds': CV_FOLDS,
+        'test_size': TEST_SIZE,
+        'random_state': RANDOM_STATE,
+        'permutation_repeats': PERMUTATION_REPEATS,
+        'search_strategy': SEARCH_STRATEGY,
+        'search_budget': ([SEARCH_MAX_FITS, SEARCH_MAX_SECONDS]
+                          if SEARCH_STRATEGY == 'halving' else None),
+        'model_engine': MODEL_ENGINE,
+        'model_compare': MODEL_COMPARE,
+        'importance': [IMPORTANCE_METHOD, IMPORTANCE_MAX_SECONDS]
+    }
+
+def model_record(analysis, pipeline):
+    """Registry entry of a fitted model: what, on what data and how well."""
+    model = pipeline['model']
+    return {
+        'created_at': time.time(),
+        'source': analysis.get('source'),
+        'rows': analysis['data_info']['rows'],
+        'churn_rate': analysis['churn_rate'],
+        'model_accuracy': analysis['model_accuracy'],
+        'engine': pipeline.get('engine', 'random_forest'),
+        'estimator': type(model).__name__,
+        'params': analysis['training'].get('best_params'),
+        'training': {key: analysis['training'][key]
+                     for key in ('strategy', 'fits', 'seconds')
+                     if key in analysis['training']},
+        'features': pipeline['features'],
+        'config': training_config()
+    }
+
+def compute_dataset_id(file_hash):
+    """Hash the upload's sha256 digest together with the training configuration.
+
+    Identical uploads analysed with identical settings share one store entry,
+    so the id doubles as the analysis cache key.
+    """
+    digest = hashlib.sha256(file_hash.encode())
+    digest.update(json.dumps(training_config(), sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def report_key(current_revenue):
+    """The revenue part of a cached report's name."""
+    return f'{float(current_revenue):.2f}'
+
+def derive_dataset_id(dataset_id, *parts):
+    """Id for a dataset derived from another one (e.g. a date filter)."""
+    return hashlib.sha256(':'.join([dataset_id, *map(str, parts)]).encode()).hexdigest()
+
+class AnalysisStore:
+    """Analyses persisted on local disk, one directory per dataset id.
+
+    Every worker process reads the same files: the summary is a small JSON
+    document, cleaned columns are .npy files opened memory-mapped and the
+    fitted scoring pipeline is an uncompressed joblib dump. Entries never change once
+    written, apart from chart images being cached as they are first asked
+    for, so each process keeps a few recently used datasets in memory.
+    Whole entries are evicted least-recently-used beyond max_bytes.
+
+    Every entry is also a version in the model registry: model.json holds
+    its model_record and the promoted file names the model answering
+    requests that do not pick a dataset. The promoted entry is never evicted.
+    """
+
+    def __init__(self, root, max_bytes, memory_slots=4):
+        """Store under root within max_bytes, caching memory_slots items in memory.
+
+        root is made absolute, because send_file resolves relative paths
+        against the app's directory rather than the working directory.
+        """
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.memory_slots = memory_slots
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, dataset_id, *parts):
+        """Path inside a dataset's entry; ids that could leave the store are refused."""
+        if not self.valid_id(dataset_id):
+            raise KeyError(f'Unknown dataset {dataset_id}')
+        return os.path.join(self.root, dataset_id, *parts)
+
+    @staticmethod
+    def valid_id(dataset_id):
+        """Whether dataset_id can name an entry (ids are hex digests)."""
+        return isinstance(dataset_id, str) and dataset_id.isalnum()
+
+    def exists(self, dataset_id):
+        """Whether a complete entry is stored under dataset_id."""
+        return (self.valid_id(dataset_id)
+                and os.path.exists(self.path(dataset_id, 'analysis.json')))
+
+    def save(self, dataset_id, analysis, data, pipeline, arrays=None, record=None):
+        """Write a complete entry; a concurrent writer of the same id wins."""
+        if self.exists(dataset_id):
+            return
+        tmp_dir = os.path.join(self.root, f'{dataset_id}.{os.getpid()}.tmp')
+        os.makedirs(os.path.join(tmp_dir, 'columns'), exist_ok=True)
+        os.makedirs(os.path.join(tmp_dir, 'arrays'), exist_ok=True)
+        for name, values in (arrays or {}).items():
+            np.save(os.path.join(tmp_dir, 'arrays', f'{name}.npy'), values)
+        analysis = {**analysis, 'dataset_id': dataset_id,
+                    'columns': self._write_columns(tmp_dir, data)}
+        joblib.dump(pipeline, os.path.join(tmp_dir, 'pipeline.joblib'))
+        if record is not None:
+            with open(os.path.join(tmp_dir, 'model.json'), 'w') as f:
+                json.dump({'model_id': dataset_id, **record}, f, default=str)
+        with open(os.path.join(tmp_dir, 'analysis.json'), 'w') as f:
+            json.dump(analysis, f)
+        try:
+            os.replace(tmp_dir, self.path(dataset_id))
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.enforce_limit()
+
+    def _write_columns(self, directory, df):
+        """Save each column as a .npy file; returns their specs."""
+        specs = []
+        for i, col in enumerate(df.columns):
+            spec = {'name': col, 'file': f'{i}.npy'}
+            if is_text(df[col]):
+                # Strings are stored as codes into a sorted category list
+                values = df[col].astype('category').cat.remove_unused_categories()
+                values = values.cat.reorder_categories(sorted(values.cat.categories))
+                spec['categories'] = values.cat.categories.tolist()
+                values = values.cat.codes.to_numpy()
+            else:
+                values = df[col].to_numpy()
+            np.save(os.path.join(directory, 'columns', spec['file']), values)
+            specs.append(spec)
+        return specs
+
+    def load_analysis(self, dataset_id):
+        """Return the summary of a dataset and mark it recently used, or None."""
+        if not self.valid_id(dataset_id):
+            return None
+        path = self.path(dataset_id, 'analysis.json')
+        try:
+            with open(path) as f:
+                analysis = json.load(f)
+            os.utime(path)
+            return analysis
+        except (OSError, ValueError):
+            return None
+
+    def load_model_record(self, dataset_id):
+        """Registry entry of a stored model, or None."""
+        if not self.valid_id(dataset_id):
+            return None
+        try:
+            with open(self.path(dataset_id, 'model.json')) as f:
+                record = json.load(f)
+            record['last_used'] = os.path.getmtime(
+                self.path(dataset_id, 'analysis.json'))
+            record['promoted'] = dataset_id == self.promoted_model()
+            return record
+        except (OSError, ValueError):
+            return None
+
+    def list_models(self):
+        """Registry entries of all stored models, newest first."""
+        names = os.listdir(self.root) if os.path.isdir(self.root) else []
+        records = [self.load_model_record(name) for name in names
+                   if os.path.isdir(os.path.join(self.root, name))]
+        return sorted(filter(None, records), key=lambda record: record['created_at'],
+                      reverse=True)
+
+    def promoted_model(self):
+        """Id of the promoted model, if it is still stored."""
+        try:
+            with open(os.path.join(self.root, 'promoted')) as f:
+                dataset_id = f.read().strip()
+        except OSError:
+            return None
+        return dataset_id if self.exists(dataset_id) else None
+
+    def promote(self, dataset_id):
+        """Make a model version the promoted one."""
+        self._write_file(os.path.join(self.root, 'promoted'), dataset_id.encode())
+
+    def delete(self, dataset_id):
+        """Remove an entry from disk and from this process's memory."""
+        if self.promoted_model() == dataset_id:
+            os.remove(os.path.join(self.root, 'promoted'))
+        shutil.rmtree(self.path(dataset_id), ignore_errors=True)
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == dataset_id]:
+                del self._memory[key]
+
+    def chart_path(self, dataset_id, name, view=None):
+        """Path of a cached chart, optionally of a filtered view."""
+        return self.path(dataset_id, 'charts', *([view] if view else []),
+                         f'{name}.png')
+
+    def save_chart(self, dataset_id, name, png, view=None):
+        """Cache a rendered chart inside an existing entry."""
+        self._write_file(self.chart_path(dataset_id, name, view), png)
+
+    def report_path(self, dataset_id, current_revenue):
+        """Path of the cached PDF report for a revenue."""
+        return self.path(dataset_id, 'reports',
+                         f'{report_key(current_revenue)}.pdf')
+
+    def save_report(self, dataset_id, current_revenue, pdf):
+        """Cache a built PDF report inside an existing entry."""
+        self._write_file(self.report_path(dataset_id, current_revenue), pdf)
+
+    def _write_file(self, path, data):
+        """Write data to path atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def load_array(self, dataset_id, name):
+        """Memory-mapped auxiliary array (date index, aggregate cubes)."""
+        path = self.path(dataset_id, 'arrays', f'{name}.npy')
+        return self._remember((dataset_id, name),
+                              lambda: np.load(path, mmap_mode='r'))
+
+    def load_data(self, dataset_id):
+        """Cleaned dataset with numeric columns backed by memory-mapped files."""
+        return self._remember((dataset_id, 'data'),
+                              lambda: self._read_columns(dataset_id))
+
+    def load_pipeline(self, dataset_id):
+        """Fitted encoders and model (see build_pipeline)."""
+        path = self.path(dataset_id, 'pipeline.joblib')
+        return self._remember((dataset_id, 'pipeline'),
+                              lambda: joblib.load(path, mmap_mode='r'))
+
+    def load_scorer(self, dataset_id):
+        """Pipeline and, for forests, flattened trees for single-customer scoring."""
+        return self._remember((dataset_id, 'scorer'),
+                              lambda: self._compile_scorer(dataset_id))
+
+    def _compile_scorer(self, dataset_id):
+        """Build the single-customer scorer of a stored dataset."""
+        pipeline = self.load_pipeline(dataset_id)
+        if not is_forest(pipeline):
+            return compile_scorer(pipeline)
+        forest = {name: self.load_array(dataset_id, name) for name in FOREST_ARRAYS}
+        return compile_scorer(pipeline, forest)
+
+    def _read_columns(self, dataset_id):
+        """Rebuild a dataset's frame from its memory-mapped columns."""
+        analysis = self.load_analysis(dataset_id)
+        if analysis is None:
+            raise KeyError(f'Unknown dataset {dataset_id}')
+        frame = {}
+        for spec in analysis['columns']:
+            values = np.load(self.path(dataset_id, 'columns', spec['file']),
+                             mmap_mode='r')
+            if 'categories' in spec:
+                values = pd.Categorical.from_codes(values, spec['categories'])
+            frame[spec['name']] = values
+        return pd.DataFrame(frame, copy=False)
+
+    def _remember(self, key, loader):
+        """Return the cached value of key, loading and caching it if needed."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        value = loader()
+        with self._lock:
+            self._memory[key] = value
+            while len(self._memory) > self.memory_slots * 8:
+                self._memory.popitem(last=False)
+        return value
+
+    def enforce_limit(self):
+        """Evict least recently used entries until the store fits max_bytes."""
+        entries = []
+        promoted = self.promoted_model()
+        for name in os.listdir(self.root):
+            if name == promoted:
+                continue
+            entry_dir = os.path.join(self.root, name)
+            try:
+                last_used = os.path.getmtime(os.path.join(entry_dir, 'analysis.json'))
+                size = sum(os.path.getsize(os.path.join(root, f))
+                           for root, _, files in os.walk(entry_dir) for f in files)
+                entries.append((last_used, size, entry_dir))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            logging.info(f"Evicted dataset {os.path.basename(entry_dir)} "
+                         f"from the analysis store")
+
+analysis_store = AnalysisStore(STORE_DIR, STORE_MAX_BYTES)
+
+def build_analysis_response(analysis, current_revenue, charts=None):
+    """Turn a revenue-independent analysis summary into a dashboard response.
+
+    charts maps chart names to image URLs and defaults to the stored charts.
+    """
+    insights, revenue_message = build_insights(
+        analysis['churn_rate'], analysis['model_accuracy'],
+        analysis['feature_importance'], current_revenue,
+        (analysis.get('training') or {}).get('engines'), analysis.get('intervals'))
+    response = {
+        'success': True,
+        'dataset_id': analysis['dataset_id'],
+        'data_info': analysis['data_info'],
+        'insights': insights,
+        'training': analysis.get('training'),
+        'importance': analysis.get('importance'),
+        'drift': analysis.get('drift'),
+        'progressive': analysis.get('progressive'),
+        'charts': (charts if charts is not None
+                   else chart_urls(analysis['dataset_id'], analysis['charts']))
+    }
+    if revenue_message:
+        response['revenue_message'] = revenue_message
+    return response
+
+def _load_secret_key():
+    """Use SECRET_KEY, else a key persisted under tmp/ so all workers agree."""
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    path = os.path.join('tmp', 'secret_key')
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    for _ in range(50):
+        with open(path) as f:
+            key = f.read().strip()
+        if key:
+            return key
+        time.sleep(0.01)
+    raise RuntimeError('Secret key file is empty')
+
+app.secret_key = _load_secret_key()
+
+def current_dataset_id():
+    """Dataset id of the request, else the session's, else the promoted model's."""
+    payload = request.get_json(silent=True) if request.is_json else None
+    return ((payload or {}).get('dataset_id') or request.values.get('dataset_id')
+            or session.get('dataset_id') or analysis_store.promoted_model())
+
+def session_revenue():
+    """The current monthly revenue saved in the user's session."""
+    return float(session.get('current_revenue', 0))
+
+def parse_revenue(value):
+    """Current revenue from a form value; invalid or negative values count as 0."""
+    try:
+        return max(float(value), 0)
+    except (ValueError, TypeError):
+        return 0
+
+def save_upload(file):
+    """Stream an uploaded file to UPLOADS_DIR, hashing it on the way.
+
+    Returns the spooled path and the sha256 hex digest of the contents.
+    """
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    path = os.path.join(UPLOADS_DIR, f'{uuid.uuid4().hex}.csv')
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for block in iter(lambda: file.stream.read(UPLOAD_BLOCK_BYTES), b''):
+            digest.update(block)
+            f.write(block)
+    return path, digest.hexdigest()
+
+def _job_path(job_id):
+    """Path of a job's status file."""
+    return os.path.join(JOBS_DIR, f'{job_id}.json')
+
+def _write_job(job):
+    """Atomically persist a job record so any worker process can read it."""
+    job['updated_at'] = time.time()
+    path = _job_path(job['job_id'])
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+def _purge_expired_jobs():
+    """Drop job records and uploads left over from crashed workers."""
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for directory in (JOBS_DIR, UPLOADS_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+            except OSError:
+                pass
+
+def create_job(kind, stages, job_id=None):
+    """Create a queued job record with the given pipeline stages.
+
+    A job_id derived from the job's inputs lets every worker find the job.
+    """
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    _purge_expired_jobs()
+    job = {
+        'job_id': job_id or uuid.uuid4().hex,
+        'kind': kind,
+        'status': 'queued',
+        'stage': None,
+        'progress': 0.0,
+        'stages': [{'name': name, 'status': 'pending', 'seconds': None}
+                   for name in stages],
+        'created_at': time.time()
+    }
+    _write_job(job)
+    return job
+
+def load_job(job_id):
+    """Load a job record, or None if the id is unknown."""
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _close_running_stage(job, status):
+    """Finish the running stage of job with status and record its time."""
+    for stage in job['stages']:
+        if stage['status'] == 'running':
+            stage['status'] = status
+            stage['seconds'] = round(time.time() - stage['started_at'], 3)
+            metrics.observe('churn_job_stage_duration_seconds', stage['seconds'],
+                            kind=job['kind'], stage=stage['name'], status=status)
+
+def start_job_stage(job_id, stage_name):
+    """Mark the running stage done and start the next; stages passed are skipped."""
+    job = load_job(job_id)
+    if job is None:
+        return
+    _close_running_stage(job, 'done')
+    for stage in job['stages']:
+        if stage['name'] == stage_name:
+            stage['status'] = 'running'
+            stage['started_at'] = time.time()
+            break
+        if stage['status'] == 'pending':
+            stage['status'] = 'skipped'
+    done = sum(stage['status'] in ('done', 'skipped') for stage in job['stages'])
+    job.update(status='running', stage=stage_name, progress=done / len(job['stages']))
+    _write_job(job)
+    logging.info(f"Job {job_id}: stage '{stage_name}' started")
+
+def publish_job_result(job_id, result):
+    """Attach a preliminary result to a running job, shown until the final one."""
+    job = load_job(job_id)
+    if job is None:
+        return
+    job['partial'] = result
+    _write_job(job)
+    logging.info(f"Job {job_id}: published {result['progressive']['stage']} result")
+
+def finish_job(job_id, result):
+    """Record the final result; failed analyses keep their error payload."""
+    job = load_job(job_id)
+    if job is None:
+        return
+    succeeded = bool(result.get('success'))
+    _close_running_stage(job, 'done' if succeeded else 'failed')
+    job.update(status='completed' if succeeded else 'failed', stage=None, result=result)
+    if succeeded:
+        job['progress'] = 1.0
+    _write_job(job)
+    logging.info(f"Job {job_id}: {job['status']}")
+
+def preload_analytics():
+    """Import the charting, report and training stack now rather than on first use.
+
+    gunicorn.conf.py calls this in the master so that forked workers start
+    instantly and share the modules copy-on-write.
+    """
+    for name in ANALYTICS_MODULES:
+        importlib.import_module(name)
+
+class Overloaded(Exception):
+    """A compute queue is full; retry_after is the suggested wait in seconds."""
+
+    def __init__(self, priority, retry_after):
+        """Refusal of a priority's job, to be retried after retry_after seconds."""
+        super().__init__(f'Too many {priority} analyses are queued. '
+                         f'Please try again in {retry_after} seconds.')
+        self.priority = priority
+        self.retry_after = retry_after
+
+class ComputeGovernor:
+    """Admission control and a core budget for analysis jobs, shared by all processes.
+
+    Tickets live in directory/state.json and are only changed under an
+    exclusive lock on directory/lock, so every web worker and job process
+    sees the same queue. The web process admit()s a ticket per job or gets
+    Overloaded; the job process enters running(), which waits until the
+    job is first in line among the waiting ones and a core is free, then
+    caps its threads at its share. Tickets of processes that died are
+    dropped, so a crashed worker does not keep its cores.
+    """
+
+    def __init__(self, directory, cores, limits):
+        """Keep tickets in directory and share cores under per-priority queue limits."""
+        self.directory = directory
+        self.cores = cores
+        self.limits = limits
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _alive(ticket):
+        """Whether a ticket is recent and its process still runs."""
+        if time.time() - ticket['created_at'] > JOB_TTL_SECONDS:
+            return False
+        if os.name != 'posix':
+            return True
+        try:
+            os.kill(ticket['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    @staticmethod
+    @contextmanager
+    def _exclusive(lock):
+        """Hold an exclusive lock on the open file lock against other processes."""
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+            return
+        lock.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:  # LK_LOCK gives up after 10 seconds; keep waiting
+                pass
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def _state(self):
+        """The ticket table, locked against threads and processes, saved afterwards."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, 'state.json')
+        lock_path = os.path.join(self.directory, 'lock')
+        with self._lock, open(lock_path, 'a+') as lock, self._exclusive(lock):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {'tickets': {}, 'job_seconds': COMPUTE_DEFAULT_SECONDS}
+            state['tickets'] = {job_id: ticket
+                                for job_id, ticket in state['tickets'].items()
+                                if self._alive(ticket)}
+            yield state
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+
+    def _retry_after(self, state, priority):
+        """About one job's time, plus the time to run the higher-priority jobs ahead."""
+        rank = COMPUTE_PRIORITIES.index(priority)
+        ahead = sum(COMPUTE_PRIORITIES.index(ticket['priority']) < rank
+                    for ticket in state['tickets'].values())
+        side_by_side = max(1, self.cores // JOB_THREADS)
+        return max(1, math.ceil(state['job_seconds'] * (1 + ahead / side_by_side)))
+
+    def admit(self, job_ids, priority):
+        """Queue a ticket per job, or raise Overloaded if the priority lacks room."""
+        with self._state() as state:
+            admitted = sum(ticket['priority'] == priority
+                           for ticket in state['tickets'].values())
+            if admitted + len(job_ids) > self.limits[priority]:
+                raise Overloaded(priority, self._retry_after(state, priority))
+            for job_id in job_ids:
+                state['tickets'][job_id] = {'priority': priority, 'status': 'queued',
+                                            'threads': 0, 'pid': os.getpid(),
+                                            'created_at': time.time()}
+
+    def _start(self, state, job_id):
+        """Threads for job_id if it may start now, else None; marks it waiting."""
+        tickets = state['tickets']
+        ticket = tickets.setdefault(job_id, {'priority': COMPUTE_PRIORITIES[0],
+                                             'threads': 0, 'created_at': time.time()})
+        if ticket.get('status') != 'waiting':
+            # From here on the ticket lives as long as this job process
+            ticket.update(status='waiting', pid=os.getpid())
+        # Only jobs that already have a process compete, so a job queued
+        # behind busy pool processes cannot hold up the others
+        first = min((candidate for candidate in tickets.values()
+                     if candidate['status'] == 'waiting'),
+                    key=lambda other: (COMPUTE_PRIORITIES.index(other['priority']),
+                                       other['created_at']))
+        free = self.cores - sum(other['threads'] for other in tickets.values()
+                                if other['status'] == 'running')
+        if first is not ticket or free < 1:
+            return None
+        ticket.update(status='running', threads=min(JOB_THREADS, free),
+                      started_at=time.time())
+        return ticket['threads']
+
+    @contextmanager
+    def running(self, job_id):
+        """Wait for job_id's turn, then run the block with the job's thread share."""
+        global _job_threads
+        started = None
+        try:
+            while True:
+                with self._state() as state:
+                    threads = self._start(state, job_id)
+                if threads is not None:
+                    break
+                time.sleep(COMPUTE_POLL_SECONDS)
+            started = time.time()
+            logging.info(f"Job {job_id}: running on {threads} of {self.cores} cores")
+            previous, _job_threads = _job_threads, threads
+            try:
+                with threadpool_limits(threads):
+                    yield threads
+            finally:
+                _job_threads = previous
+        finally:
+            self.release(job_id, started)
+
+    def release(self, job_id, started=None):
+        """Drop job_id's ticket; a job that ran updates the typical job time."""
+        with self._state() as state:
+            if state['tickets'].pop(job_id, None) is not None and started is not None:
+                seconds = 0.8 * state['job_seconds'] + 0.2 * (time.time() - started)
+                state['job_seconds'] = round(seconds, 3)
+
+    def status(self):
+        """Core budget and per-priority queue of all processes."""
+        with self._state() as state:
+            tickets = list(state['tickets'].values())
+            job_seconds = state['job_seconds']
+        queues = OrderedDict()
+        for priority in COMPUTE_PRIORITIES:
+            mine = [ticket for ticket in tickets if ticket['priority'] == priority]
+            running = sum(ticket['status'] == 'running' for ticket in mine)
+            queues[priority] = {'limit': self.limits[priority], 'running': running,
+                                'queued': len(mine) - running}
+        busy_cores = sum(ticket['threads'] for ticket in tickets
+                         if ticket['status'] == 'running')
+        return {'cores': self.cores, 'busy_cores': busy_cores,
+                'job_threads': JOB_THREADS, 'job_seconds': job_seconds,
+                'queues': queues}
+
+compute_governor = ComputeGovernor(COMPUTE_DIR, COMPUTE_CORES, COMPUTE_QUEUE_LIMITS)
+
+def _lower_priority():
+    """Let request handling go first on a busy machine (see COMPUTE_NICE)."""
+    if COMPUTE_NICE and hasattr(os, 'nice'):
+        os.nice(COMPUTE_NICE)
+
+def _limit_render_threads():
+    """Chart pool initializer: lower priority and one thread per render."""
+    _lower_priority()
+    threadpool_limits(1)
+
+def submit_job(job_id, fn, *args):
+    """Run fn(job_id, *args) on the job pool; its compute ticket is released after."""
+    try:
+        future = get_job_executor().submit(fn, job_id, *args)
+    except Exception:
+        compute_governor.release(job_id)
+        raise
+    future.add_done_callback(lambda _: compute_governor.release(job_id))
+    return future
+
+def overloaded_response(error):
+    """429 with a Retry-After header for a full compute queue."""
+    response = jsonify({'success': False, 'error': str(error),
+                        'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def job_threads():
+    """n_jobs for parallel work: the governor's share in a running job, else all."""
+    return _job_threads
+
+def get_job_executor():
+    """Return the shared process pool, creating it on first use."""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ProcessPoolExecutor(max_workers=JOB_WORKERS,
+                                                initializer=_lower_priority)
+        return _job_executor
+
+def get_chart_executor():
+    """Return this process's chart rendering pool, creating it on first use."""
+    global _chart_executor
+    with _chart_executor_lock:
+        if _chart_executor is None:
+            _chart_executor = ProcessPoolExecutor(max_workers=CHART_WORKERS,
+                                                  initializer=_limit_render_threads)
+        return _chart_executor
+
+def get_report_executor():
+    """Return this process's report build threads, creating them on first use."""
+    global _report_executor
+    with _report_executor_lock:
+        if _report_executor is None:
+            _report_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS)
+        return _report_executor
+
+def report_url(dataset_id, current_revenue):
+    """URL that downloads the report of a dataset at a revenue."""
+    return (f'/download_report?dataset_id={dataset_id}'
+            f'&current_revenue={report_key(current_revenue)}')
+
+def build_report(job_id, dataset_id, current_revenue):
+    """Render the charts and the PDF report of a stored analysis and cache it.
+
+    Runs on the report threads of the web process, so the charts come from
+    the chart cache or the chart pool as PNG bytes.
+    """
+    try:
+        with profiled(f'report job {job_id}'):
+            analysis = analysis_store.load_analysis(dataset_id)
+            if analysis is None:
+                raise AnalysisError('No data uploaded yet')
+            start_job_stage(job_id, 'charts')
+            charts = OrderedDict()
+            paths = ensure_charts(dataset_id, analysis, analysis['charts'])
+            for name, path in paths.items():
+                with open(path, 'rb') as f:
+                    charts[name] = f.read()
+
+            start_job_stage(job_id, 'pdf')
+            data_info = analysis['data_info']
+            insights, revenue_message = build_insights(
+                analysis['churn_rate'], analysis['model_accuracy'],
+                analysis['feature_importance'], current_revenue,
+                analysis['training'].get('engines'))
+            recommendations = generate_recommendations(analysis['feature_importance'])
+            with span('report.pdf'):
+                pdf_buffer = generate_pdf_report(data_info, insights, charts,
+                                                 recommendations,
+                                                 data_info['data_quality_score'],
+                                                 revenue_message)
+            analysis_store.save_report(dataset_id, current_revenue,
+                                       pdf_buffer.getvalue())
+            return {'success': True, 'url': report_url(dataset_id, current_revenue)}
+    except AnalysisError as e:
+        return {'success': False, 'error': str(e)}
+    except Exception as e:
+        logging.error(f"Error in build_report: {str(e)}")
+        return {'success': False, 'error': f'Error generating report: {str(e)}'}
+
+def queue_report(dataset_id, current_revenue):
+    """Start building the report for a dataset and revenue unless it is cached.
+
+    Returns None when the PDF is ready, else the build job: a running or
+    recently failed one is returned as is rather than started again.
+    """
+    if os.path.exists(analysis_store.report_path(dataset_id, current_revenue)):
+        return None
+    job_id = derive_dataset_id(dataset_id, 'report', report_key(current_revenue))[:32]
+    job = load_job(job_id)
+    if (job is not None and job['status'] != 'completed'
+            and time.time() - job['created_at'] < REPORT_BUILD_TIMEOUT):
+        return job
+    job = create_job('report', REPORT_STAGES, job_id)
+    future = get_report_executor().submit(build_report, job_id, dataset_id,
+                                          current_revenue)
+    future.add_done_callback(functools.partial(_finish_report_job, job_id))
+    logging.info(f"Queued report job {job_id} for {dataset_id}")
+    return job
+
+def analyse_dataset(job_id, df, profile, dataset_id, current_revenue, source=None,
+                    stage=None):
+    """Train, rank features, chart and date-index a cleaned dataset, then store it.
+
+    source describes where the rows came from for the model registry.
+    Returns the dashboard response for the stored analysis. A stage of a
+    progressive analysis ({'name', 'rows', 'population'}) trains on the
+    rows at positions stage['rows'] only, with PROGRESSIVE_ENGINE and sampled
+    importance on a short budget, adds 95% intervals to the KPIs and keeps the
+    entry out of the model registry; the job's stages are left as they are.
+    Such an entry stores only those rows, so a stage never writes a second
+    copy of a large upload; its charts and cubes still cover every row.
+    """
+    date_col = parse_date_column(df, profile)
+    data_info = build_data_info(profile)
+    churn_col = find_churn_column(df)
+    if churn_col is None:
+        return {'success': False, 'data_info': data_info,
+                'warning': 'No Churn column found.'}
+
+    churn_rate = dataset_churn_rate(df, churn_col)
+    training, pipeline, holdout, fit = fit_dataset(job_id, df, churn_col, stage)
+    layout, segments, arrays = dataset_cubes(df, churn_col, date_col)
+    arrays.update(model_arrays(pipeline, training))
+    analysis = {
+        'data_info': data_info,
+        'churn_rate': churn_rate,
+        **fit,
+        'is_churn': churn_col,
+        'date_column': date_col,
+        'chart_layout': layout,
+        'segment_layout': segments,
+        'charts': available_charts(unpack_aggregates(arrays['aggregates'], layout),
+                                   fit['feature_importance']),
+        'profile': profile,
+        'projection': {'customers': len(training)},
+        'source': source
+    }
+    if stage is not None:
+        add_stage_intervals(analysis, stage, len(df), len(training), len(holdout[1]))
+    return store_analysis(dataset_id, analysis, training, pipeline, arrays,
+                          current_revenue, registered=stage is None)
+
+def parse_date_column(df, profile):
+    """Find the date column and parse it in place, updating the profile.
+
+    Returns the column name, or None if the dataset has no date column.
+    """
+    date_col = detect_date_column(df)
+    if date_col and not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        with span('clean.dates'):
+            df[date_col] = parse_dates(df[date_col])
+            update_profile(profile, df, [date_col])
+    return date_col
+
+def dataset_churn_rate(df, churn_col):
+    """Share of churned customers; AnalysisError if no churn value is valid."""
+    churn_values = encode_churn(df[churn_col])
+    if churn_values.isna().all():
+        raise AnalysisError('Churn column contains invalid values')
+    churn_rate = float(churn_values.mean())
+    logging.info(f"Churn rate: {churn_rate*100:.2f}%")
+    return churn_rate
+
+def fit_dataset(job_id, df, churn_col, stage=None):
+    """Train the churn model and rank its features, as analyse_dataset describes.
+
+    Returns the training rows, the pipeline, the holdout and the analysis
+    fields of the fit (accuracy, importance and their reports).
+    """
+    if stage is None:
+        start_job_stage(job_id, 'train')
+        training = df
+        pipeline, model_accuracy, holdout, search_report = train_churn_model(
+            df, churn_col, n_jobs=job_threads())
+        start_job_stage(job_id, 'importance')
+        importance, importance_report = compute_feature_importance(pipeline['model'],
+                                                                   *holdout)
+        start_job_stage(job_id, 'charts')
+    else:
+        training = df.iloc[stage['rows']].reset_index(drop=True)
+        pipeline, model_accuracy, holdout, search_report = train_churn_model(
+            training, churn_col, n_jobs=job_threads(), engine=PROGRESSIVE_ENGINE,
+            compare=False)
+        importance, importance_report = compute_feature_importance(
+            pipeline['model'], *holdout, method='sampled',
+            max_seconds=PROGRESSIVE_IMPORTANCE_SECONDS)
+    fit = {'model_accuracy': model_accuracy, 'feature_importance': importance,
+           'training': search_report, 'importance': importance_report}
+    return training, pipeline, holdout, fit
+
+def dataset_cubes(df, churn_col, date_col):
+    """Chart layout, segment layout and the chart, date and segment cubes.
+
+    Only the chart inputs are computed here; the images are rendered by the
+    web process's chart pool when first requested.
+    """
+    with span('charts.aggregates'):
+        layout = chart_layout(df, churn_col)
+        arrays = build_date_index(df, date_col, layout) if date_col else {}
+        arrays['aggregates'] = compute_aggregates(df, layout)[0]
+    with span('charts.segments'):
+        segments = segment_layout(df, churn_col)
+        arrays['segments'] = compute_segment_cube(df, segments)
+    return layout, segments, arrays
+
+def model_arrays(pipeline, rows):
+    """Flattened trees of a forest and the revenue projection inputs of rows."""
+    arrays = {}
+    if is_forest(pipeline):
+        with span('train.compile_forest'):
+            arrays.update(compile_forest(pipeline['model']))
+    with span('train.projection'):
+        arrays['projection'] = projection_customers(pipeline, rows)
+    return arrays
+
+def add_stage_intervals(analysis, stage, rows, training_rows, holdout_rows):
+    """Describe a progressive stage's rows and add 95% intervals to its KPIs."""
+    analysis['progressive'] = {'stage': stage['name'], 'rows': rows,
+                               'training_rows': training_rows,
+                               'estimated_rows': stage['population'] or rows}
+    analysis['intervals'] = {
+        'model_accuracy': proportion_interval(analysis['model_accuracy'],
+                                              holdout_rows)}
+    if stage['population']:
+        analysis['intervals']['churn_rate'] = proportion_interval(
+            analysis['churn_rate'], rows, stage['population'])
+
+def store_analysis(dataset_id, analysis, data, pipeline, arrays, current_revenue,
+                   registered=True):
+    """Save an analysis with its rows, pipeline and arrays; return the dashboard.
+
+    Registered analyses get a model registry record.
+    """
+    record = model_record(analysis, pipeline) if registered else None
+    with span('store.save'):
+        analysis_store.save(dataset_id, analysis, data, pipeline, arrays, record)
+    analysis['dataset_id'] = dataset_id
+    return build_analysis_response(analysis, current_revenue)
+
+def is_preliminary(analysis):
+    """Whether a stored analysis is a stage of a progressive analysis."""
+    return bool(analysis.get('progressive'))
+
+def progressive_analysis(job_id, upload_path, current_revenue, dataset_id, source=None):
+    """Analyse a large upload in steps, publishing each result on the job.
+
+    preview: see progressive_preview; a failed preview is logged and skipped.
+    sample: once the whole file is cleaned, churn rate, charts and segments
+    are exact and the model is trained on a stratified sample of
+    PROGRESSIVE_SAMPLE_ROWS; skipped for smaller datasets.
+    Then the full analysis runs as for any upload. The preliminary entries,
+    which hold only their training rows, are removed from the store when
+    the job ends, whether or not the full analysis succeeded.
+    """
+    preliminary = [derive_dataset_id(dataset_id, 'preview'),
+                   derive_dataset_id(dataset_id, 'sample')]
+    try:
+        progressive_preview(job_id, upload_path, current_revenue, preliminary[0],
+                            source)
+        start_job_stage(job_id, 'clean')
+        df, profile = StreamingCleaner(f'{upload_path}.spool').clean(upload_path)
+        churn_col = find_churn_column(df)
+        if churn_col is not None and len(df) > PROGRESSIVE_SAMPLE_ROWS:
+            start_job_stage(job_id, 'sample')
+            with span('progressive.sample'):
+                stage = {'name': 'sample', 'population': None,
+                         'rows': stratified_sample(df, churn_col,
+                                                   PROGRESSIVE_SAMPLE_ROWS)}
+                response = analyse_dataset(job_id, df, profile, preliminary[1],
+                                           current_revenue, source, stage)
+            if response.get('success'):
+                publish_job_result(job_id, response)
+        return analyse_dataset(job_id, df, profile, dataset_id, current_revenue,
+                               source)
+    finally:
+        for preliminary_id in preliminary:
+            analysis_store.delete(preliminary_id)
+
+def progressive_preview(job_id, upload_path, current_revenue, preview_id, source):
+    """Publish a first result from rows sampled across the file (see sample_csv).
+
+    The pool is cleaned and a model is trained on a stratified half of it;
+    churn rate and accuracy come with 95% intervals, the churn rate's from
+    the estimated row count. Failures are logged, not raised.
+    """
+    preview_dir = f'{upload_path}.preview'
+    start_job_stage(job_id, 'preview')
+    try:
+        with span('progressive.preview'):
+            # KPIs and charts use the whole pool, the model a stratified half of it
+            pool, population = sample_csv(upload_path, 2 * PROGRESSIVE_PREVIEW_ROWS)
+            cleaner = StreamingCleaner(preview_dir)
+            cleaner.add(pool)
+            pool, profile = cleaner.finish()
+            churn_col = find_churn_column(pool)
+            if churn_col is None:
+                return
+            stage = {'name': 'preview', 'population': population,
+                     'rows': stratified_sample(pool, churn_col,
+                                               PROGRESSIVE_PREVIEW_ROWS)}
+            response = analyse_dataset(job_id, pool, profile, preview_id,
+                                       current_revenue, source, stage)
+        if response.get('success'):
+            publish_job_result(job_id, response)
+    except Exception as e:
+        logging.warning(f"Skipped the preview of job {job_id}: {str(e)}")
+    finally:
+        shutil.rmtree(preview_dir, ignore_errors=True)
+
+def append_dataset(job_id, df, profile, parent_id, dataset_id, current_revenue,
+                   source=None):
+    """Add a cleaned slice of customers to a stored dataset and store the result.
+
+    Churn rate, chart and segment cubes, the date index and the cleaning
+    counts of the profile are updated from the slice alone. The forest gets
+    warm-started trees fit on the slice, unless check_drift asks for a full
+    retrain on the combined rows. Returns the dashboard response.
+    """
+    parent = analysis_store.load_analysis(parent_id)
+    if parent is None:
+        raise AnalysisError('The dataset to append to is no longer available')
+    if is_preliminary(parent):
+        raise AnalysisError(PRELIMINARY_ERROR)
+    df, stored, data = merge_appended_rows(parent_id, parent, df)
+
+    start_job_stage(job_id, 'drift')
+    pipeline, incoming, drift = append_drift_check(parent_id, parent, df)
+    start_job_stage(job_id, 'train')
+    pipeline, fit = append_fit(job_id, parent, pipeline, data, incoming, drift,
+                               len(stored))
+    start_job_stage(job_id, 'charts')
+    arrays = append_cubes(parent_id, parent, df, len(stored))
+    arrays.update(model_arrays(pipeline, data))
+
+    churned = (parent['churn_rate'] * len(stored)
+               + float(encode_churn(df[parent['is_churn']]).sum()))
+    analysis = {**parent, 'churn_rate': churned / len(data), **fit, 'drift': drift,
+                'appended_to': parent_id,
+                'source': {**(source or {}), 'appended_to': parent_id}}
+    return store_appended(dataset_id, analysis, profile, data, pipeline, arrays,
+                          current_revenue)
+
+def merge_appended_rows(parent_id, parent, df):
+    """Check a slice against its parent's columns and append it to the stored rows.
+
+    Returns the slice in the parent's column order with its dates parsed,
+    the stored rows and the combined rows.
+    """
+    columns = [spec['name'] for spec in parent['columns']]
+    missing = [col for col in columns if col not in df.columns]
+    unexpected = [col for col in df.columns if col not in columns]
+    if missing or unexpected:
+        differences = (('missing', missing), ('unexpected', unexpected))
+        raise AnalysisError('Columns differ from the current dataset: ' + '; '.join(
+            f"{label} {', '.join(cols)}" for label, cols in differences if cols))
+    df = df[columns]
+    date_col = parent['date_column']
+    if date_col and not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        with span('clean.dates'):
+            df[date_col] = parse_dates(df[date_col])
+    stored = analysis_store.load_data(parent_id)
+    data = pd.concat([stored, df], ignore_index=True)
+    for col in columns:
+        if (isinstance(stored[col].dtype, pd.CategoricalDtype)
+                and isinstance(df[col].dtype, pd.CategoricalDtype)):
+            data[col] = union_categoricals([stored[col], df[col]],
+                                           sort_categories=True)
+    return df, stored, data
+
+def append_drift_check(parent_id, parent, df):
+    """Run check_drift on a slice against a private copy of the parent pipeline.
+
+    Returns the pipeline, the slice's (X, y, counts) of encoded features,
+    labels and feature histograms, and the drift report.
+    """
+    # A private copy: the store's cached pipeline is shared and read-only
+    pipeline = joblib.load(analysis_store.path(parent_id, 'pipeline.joblib'))
+    with span('append.drift'):
+        X, y, counts, drift = check_drift(pipeline, parent['model_accuracy'], df)
+    logging.info(f"Drift check: max PSI {drift['max_psi']}, accuracy on new customers "
+                 f"{drift['incoming_accuracy']*100:.2f}%, "
+                 f"retrain: {drift['reasons'] or 'no'}")
+    return pipeline, (X, y, counts), drift
+
+def append_fit(job_id, parent, pipeline, data, incoming, drift, stored_rows):
+    """Retrain on the combined rows if drift says so, else warm-start the forest.
+
+    incoming is the slice's (X, y, counts) from the drift check. Returns the
+    pipeline and the analysis fields of the fit, as fit_dataset does.
+    """
+    X, y, counts = incoming
+    if drift['retrain']:
+        pipeline, model_accuracy, holdout, search_report = train_churn_model(
+            data, parent['is_churn'], n_jobs=job_threads())
+    else:
+        with span('train.warm_start'):
+            model_accuracy, holdout, search_report = grow_forest(pipeline, X, y,
+                                                                 stored_rows)
+        search_report['best_params'] = parent['training']['best_params']
+        for col, histogram in counts.items():
+            reference = pipeline['reference'][col]
+            reference['counts'] = np.add(reference['counts'],
+                                         histogram['counts']).tolist()
+    start_job_stage(job_id, 'importance')
+    importance, importance_report = compute_feature_importance(pipeline['model'],
+                                                               *holdout)
+    return pipeline, {'model_accuracy': model_accuracy,
+                      'feature_importance': importance,
+                      'training': search_report, 'importance': importance_report}
+
+def append_cubes(parent_id, parent, df, stored_rows):
+    """Add a slice's rows to the parent's date index, chart and segment cubes."""
+    layout, date_col = parent['chart_layout'], parent['date_column']
+    with span('charts.aggregates'):
+        arrays = (append_date_index(parent_id, df, date_col, layout, stored_rows)
+                  if date_col else {})
+        arrays['aggregates'] = (analysis_store.load_array(parent_id, 'aggregates')
+                                + compute_aggregates(df, layout)[0])
+    with span('charts.segments'):
+        arrays['segments'] = (analysis_store.load_array(parent_id, 'segments')
+                              + compute_segment_cube(df, parent['segment_layout']))
+    return arrays
+
+def store_appended(dataset_id, analysis, profile, data, pipeline, arrays,
+                   current_revenue):
+    """Merge the slice's cleaning counts into the parent's profile and store.
+
+    analysis is the parent's with the appended fields filled in.
+    """
+    imputed = Counter({column['name']: column.get('imputed', 0)
+                       for column in analysis['profile']['columns']})
+    imputed.update({column['name']: column.get('imputed', 0)
+                    for column in profile['columns']})
+    source_rows = analysis['profile']['source_rows'] + profile['source_rows']
+    profile = build_profile(data, source_rows, imputed)
+    analysis.update(
+        data_info=build_data_info(profile), profile=profile,
+        projection={'customers': len(data)},
+        charts=available_charts(unpack_aggregates(arrays['aggregates'],
+                                                  analysis['chart_layout']),
+                                analysis['feature_importance']))
+    return store_analysis(dataset_id, analysis, data, pipeline, arrays,
+                          current_revenue)
+
+def run_analysis_pipeline(job_id, upload_path, current_revenue, dataset_id,
+                          parent_id=None, source=None, progressive=False):
+    """Run clean -> train -> importance -> charts for an uploaded CSV.
+
+    Executed in the job process pool once the compute governor lets the
+    job start. The CSV spooled at upload_path is cleaned in chunks, the
+    analysis is written to the store under dataset_id and the dashboard
+    response is returned. With parent_id the rows are appended to that
+    stored dataset instead (see append_dataset); with progressive,
+    preliminary results are published first (see progressive_analysis).
+    The upload is removed afterwards.
+    """
+    spool_dir = f'{upload_path}.spool'
+    try:
+        with compute_governor.running(job_id), profiled(f'analysis job {job_id}'):
+            if progressive:
+                return progressive_analysis(job_id, upload_path, current_revenue,
+                                            dataset_id, source)
+            start_job_stage(job_id, 'clean')
+            df, profile = StreamingCleaner(spool_dir).clean(upload_path)
+            if parent_id:
+                return append_dataset(job_id, df, profile, parent_id, dataset_id,
+                                      current_revenue, source)
+            return analyse_dataset(job_id, df, profile, dataset_id, current_revenue,
+                                   source)
+    except AnalysisError as e:
+        logging.error(f"Error in upload: {str(e)}")
+        return {'success': False, 'error': str(e)}
+    except Exception as e:
+        logging.error(f"Error in upload: {str(e)}")
+        return {'success': False, 'error': f'Analysis failed: {str(e)}'}
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        try:
+            os.remove(upload_path)
+        except OSError:
+            pass
+        metrics.flush()
+
+def run_period_analysis(job_id, dataset_id, start, end, current_revenue, period_id):
+    """Retrain on the customers dated within [start, end) of a stored dataset."""
+    try:
+        label = f'period analysis job {job_id}'
+        with compute_governor.running(job_id), profiled(label):
+            parent = analysis_store.load_analysis(dataset_id)
+            rows = period_rows(dataset_id, start, end)
+            df = analysis_store.load_data(dataset_id).iloc[rows].reset_index(drop=True)
+            if df.empty:
+                raise AnalysisError('No data for selected date range')
+            profile = filter_profile(parent['profile'], df, dataset_id)
+            source = {'dataset_id': dataset_id, 'start': str(start),
+                      'end': str(end - 1)}
+            return analyse_dataset(job_id, df, profile, period_id, current_revenue,
+                                   source)
+    except AnalysisError as e:
+        logging.error(f"Error in filter_by_date: {str(e)}")
+        return {'success': False, 'error': str(e)}
+    except Exception as e:
+        logging.error(f"Error in filter_by_date: {str(e)}")
+        return {'success': False, 'error': f'Filter failed: {str(e)}'}
+    finally:
+        metrics.flush()
+
+def _finish_analysis_job(job_id, current_revenue, future):
+    """Record the outcome of an analysis job, including crashed workers.
+
+    A successful analysis starts the build of its PDF report right away.
+    """
+    try:
+        response = future.result()
+    except Exception as e:
+        logging.error(f"Error in analysis job {job_id}: {str(e)}")
+        response = {'success': False, 'error': f'Analysis failed: {str(e)}'}
+    finish_job(job_id, response)
+    if response.get('success') and response.get('dataset_id'):
+        try:
+            queue_report(response['dataset_id'], current_revenue)
+        except Exception as e:
+            logging.error(f"Error queueing report for {response['dataset_id']}: "
+                          f"{str(e)}")
+    return response
+
+def compare_analyses(items):
+    """Side-by-side summary of the datasets of a batch upload.
+
+    items are (file name, current revenue, dashboard response) in upload
+    order; datasets that failed keep their place with the error.
+    """
+    datasets = []
+    for name, current_revenue, response in items:
+        entry = {'name': name, 'success': bool(response.get('success')),
+                 'dataset_id': response.get('dataset_id')}
+        if not entry['success']:
+            entry['error'] = (response.get('error') or response.get('warning')
+                              or 'Analysis failed')
+        else:
+            insights = response['insights']
+            entry.update(
+                rows=response['data_info']['rows'],
+                churn_rate=insights['churn_rate'],
+                model_accuracy=insights['model_accuracy'],
+                top_features=[item['Feature']
+                              for item in insights['feature_importance'][:3]],
+                current_revenue=current_revenue,
+                monthly_revenue_at_risk=insights['potential_monthly_loss'],
+                yearly_revenue_at_risk=insights['potential_yearly_loss'])
+        datasets.append(entry)
+
+    analysed = [entry for entry in datasets if entry['success']]
+    summary = {'analysed': len(analysed), 'failed': len(datasets) - len(analysed)}
+    if analysed:
+        summary.update(
+            highest_churn_rate=max(analysed,
+                                   key=lambda entry: entry['churn_rate'])['name'],
+            lowest_model_accuracy=min(
+                analysed, key=lambda entry: entry['model_accuracy'])['name'],
+            most_revenue_at_risk=max(
+                analysed, key=lambda entry: entry['monthly_revenue_at_risk'])['name'],
+            total_monthly_revenue_at_risk=sum(entry['monthly_revenue_at_risk']
+                                              for entry in analysed),
+            shared_top_features=[
+                feature for feature in analysed[0]['top_features']
+                if all(feature in entry['top_features'] for entry in analysed)])
+    result = {'success': bool(analysed), 'datasets': datasets, 'summary': summary}
+    if not analysed:
+        result['error'] = 'None of the files could be analysed'
+    return result
+
+def _finish_batch_item(batch, index, future):
+    """Record one dataset of a batch upload; the last one completes the batch."""
+    child_id = batch['jobs'][index]
+    if child_id:
+        response = _finish_analysis_job(child_id, batch['revenues'][index], future)
+    else:
+        response = future.result()
+    with _batch_lock:
+        batch['responses'][index] = response
+        job = load_job(batch['job_id'])
+        if job is None:
+            return
+        job['stages'][index].update(
+            status='done' if response.get('success') else 'failed',
+            seconds=round(time.time() - batch['started'], 3))
+        done = sum(response is not None for response in batch['responses'])
+        job.update(status='running', progress=done / len(batch['responses']))
+        _write_job(job)
+        if done < len(batch['responses']):
+            return
+    result = compare_analyses(zip(batch['names'], batch['revenues'],
+                                  batch['responses']))
+    result['seconds'] = round(time.time() - batch['started'], 3)
+    finish_job(batch['job_id'], result)
+
+def _finish_report_job(job_id, future):
+    """Record the outcome of a report build on its job."""
+    try:
+        result = future.result()
+    except Exception as e:
+        logging.error(f"Error in report job {job_id}: {str(e)}")
+        result = {'success': False, 'error': f'Error generating report: {str(e)}'}
+    finish_job(job_id, result)
+
+@app.before_request
+def start_request_trace():
+    """Time the request and sample its stacks if profiling is on."""
+    g.request_started = time.perf_counter()
+    if PROFILE_SLOW_SECONDS:
+        profiler.start()
+
+@app.after_request
+def finish_request_trace(response):
+    """Record the request duration and report its spans in Server-Timing."""
+    seconds = time.perf_counter() - g.request_started
+    metrics.observe('churn_request_duration_seconds', seconds,
+                    endpoint=request.endpoint or 'unknown', method=request.method,
+                    status=str(response.status_code))
+    timings = [f'{name};dur={duration * 1000:.1f}'
+               for name, duration in g.get('spans', [])]
+    response.headers['Server-Timing'] = ', '.join(
+        [*timings, f'total;dur={seconds * 1000:.1f}'])
+    if PROFILE_SLOW_SECONDS:
+        profiler.stop(f'{request.method} {request.path}', seconds)
+    metrics.flush(force=False)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_view():
+    """Duration histograms of all app processes in the Prometheus text format."""
+    return Response(metrics.render(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/')
+def index():
+    """Render the main dashboard page."""
+    return render_template("index.html")
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    """Validate a CSV upload and queue its analysis as a background job.
+
+    With mode=append the file is added to the current dataset (see
+    append_dataset) rather than analysed on its own. Files of
+    PROGRESSIVE_MIN_BYTES or more are analysed progressively; progressive=1
+    or 0 overrides the size rule.
+    """
+    try:
+        logging.info("Processing file upload")
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file part'})
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'No selected file'})
+        
+        if not file.filename.endswith('.csv'):
+            return jsonify({'success': False, 'error': 'Invalid file format'})
+        
+        # Get current_revenue from FormData
+        current_revenue = parse_revenue(request.form.get('current_revenue', 0))
+
+        parent_id = None
+        if request.form.get('mode') == 'append':
+            parent_id = current_dataset_id()
+            parent = analysis_store.load_analysis(parent_id)
+            if parent is None:
+                return jsonify({'success': False, 'error': 'No dataset to append to'})
+            if is_preliminary(parent):
+                return jsonify({'success': False, 'error': PRELIMINARY_ERROR})
+
+        with span('upload.save'):
+            upload_path, file_hash = save_upload(file)
+        if parent_id:
+            dataset_id = derive_dataset_id(parent_id, 'append', file_hash,
+                                           DRIFT_PSI_THRESHOLD, DRIFT_ACCURACY_DROP)
+        else:
+            dataset_id = compute_dataset_id(file_hash)
+
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is not None:
+            logging.info(f"Analysis store hit for {file.filename}")
+            os.remove(upload_path)
+            session['dataset_id'] = dataset_id
+            session['current_revenue'] = current_revenue
+            queue_report(dataset_id, current_revenue)
+            return jsonify({**build_analysis_response(analysis, current_revenue),
+                            'cached': True})
+
+        progressive = request.form.get('progressive')
+        if progressive is None:
+            progressive = os.path.getsize(upload_path) >= PROGRESSIVE_MIN_BYTES
+        else:
+            progressive = progressive == '1'
+        progressive = progressive and not parent_id
+        job_id = uuid.uuid4().hex
+        try:
+            compute_governor.admit([job_id], 'interactive')
+        except Overloaded:
+            os.remove(upload_path)
+            raise
+        session['dataset_id'] = dataset_id
+        session['current_revenue'] = current_revenue
+        if parent_id:
+            job = create_job('append', APPEND_STAGES, job_id)
+        else:
+            stages = PROGRESSIVE_STAGES if progressive else PIPELINE_STAGES
+            job = create_job('analysis', stages, job_id)
+        future = submit_job(job_id, run_analysis_pipeline, upload_path, current_revenue,
+                            dataset_id, parent_id,
+                            {'file': file.filename, 'sha256': file_hash}, progressive)
+        future.add_done_callback(functools.partial(_finish_analysis_job, job['job_id'],
+                                                   current_revenue))
+        logging.info(f"Queued analysis job {job['job_id']} for {file.filename}")
+
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'dataset_id': dataset_id,
+            'status_url': url_for('job_status', job_id=job['job_id'])
+        }), 202
+    except Overloaded as e:
+        logging.info(f"Upload refused: {str(e)}")
+        return overloaded_response(e)
+    except Exception as e:
+        logging.error(f"Error in upload: {str(e)}")
+        return jsonify({'success': False, 'error': f'Analysis failed: {str(e)}'})
+
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """Analyse several CSV exports side by side and compare them.
+
+    Each file of the files field runs the upload pipeline as its own job
+    on the job pool, so up to JOB_WORKERS datasets are analysed at once.
+    current_revenue is given once for all files or once per file. The batch
+    job's result compares churn rate, accuracy, top features and revenue at
+    risk; the per-file jobs and dataset ids are returned right away. The
+    files that need analysing are admitted together at batch priority, or
+    none are (429).
+    """
+    try:
+        files = request.files.getlist('files')
+        if not files or any(file.filename == '' for file in files):
+            return jsonify({'success': False, 'error': 'No selected file'})
+        invalid = [file.filename for file in files
+                   if not file.filename.endswith('.csv')]
+        if invalid:
+            return jsonify({'success': False,
+                            'error': f"Invalid file format: {', '.join(invalid)}"})
+        revenues = [parse_revenue(value)
+                    for value in request.form.getlist('current_revenue')] or [0]
+        if len(revenues) not in (1, len(files)):
+            return jsonify({'success': False, 'error': 'Give one current_revenue '
+                                                       'for all files or one per file'})
+        if len(revenues) == 1:
+            revenues = revenues * len(files)
+        if len(files) > COMPUTE_QUEUE_LIMITS['batch']:
+            return jsonify({'success': False, 'error': f"At most "
+                            f"{COMPUTE_QUEUE_LIMITS['batch']} files per batch"})
+
+        uploads = []
+        for file in files:
+            with span('upload.save'):
+                uploads.append(save_upload(file))
+        dataset_ids = [compute_dataset_id(file_hash) for _, file_hash in uploads]
+        analyses = [analysis_store.load_analysis(dataset_id)
+                    for dataset_id in dataset_ids]
+        child_ids = [None if analysis is not None else uuid.uuid4().hex
+                     for analysis in analyses]
+        try:
+            compute_governor.admit([child_id for child_id in child_ids if child_id],
+                                   'batch')
+        except Overloaded:
+            for upload_path, _ in uploads:
+                os.remove(upload_path)
+            raise
+
+        names = [file.filename for file in files]
+        job = create_job('batch', names)
+        batch = {'job_id': job['job_id'], 'names': names, 'revenues': revenues,
+                 'jobs': child_ids, 'responses': [None] * len(files),
+                 'started': time.time()}
+        datasets = []
+        for index, (file, current_revenue) in enumerate(zip(files, revenues)):
+            upload_path, file_hash = uploads[index]
+            dataset_id, analysis = dataset_ids[index], analyses[index]
+            if analysis is not None:
+                os.remove(upload_path)
+                queue_report(dataset_id, current_revenue)
+                future = Future()
+                future.set_result({**build_analysis_response(analysis, current_revenue),
+                                   'cached': True})
+            else:
+                create_job('analysis', PIPELINE_STAGES, child_ids[index])
+                future = submit_job(child_ids[index], run_analysis_pipeline,
+                                    upload_path, current_revenue, dataset_id, None,
+                                    {'file': file.filename, 'sha256': file_hash})
+            datasets.append({'name': file.filename, 'dataset_id': dataset_id,
+                             'job_id': child_ids[index]})
+            future.add_done_callback(functools.partial(_finish_batch_item, batch,
+                                                       index))
+        logging.info(f"Queued batch job {job['job_id']} for {len(files)} files")
+
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'status_url': url_for('job_status', job_id=job['job_id']),
+            'datasets': datasets
+        }), 202
+    except Overloaded as e:
+        logging.info(f"Batch upload refused: {str(e)}")
+        return overloaded_response(e)
+    except Exception as e:
+        logging.error(f"Error in upload_batch: {str(e)}")
+        return jsonify({'success': False, 'error': f'Batch analysis failed: {str(e)}'})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the status, per-stage progress and result of a background job."""
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, **job})
+
+@app.route('/compute', methods=['GET'])
+def compute_status():
+    """Core budget of analysis jobs and each priority's queue, across all workers."""
+    return jsonify({'success': True, **compute_governor.status()})
+
+@app.route('/filter_by_date', methods=['POST'])
+def filter_by_date():
+    """Show KPIs and charts for a month or date range from the date cube.
+
+    With "retrain": true the model is also retrained on that period in the
+    background and the job id is returned instead.
+    """
+    try:
+        logging.info("Processing date filter")
+        data = request.json
+        start, end = parse_period(data)
+
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        if not analysis.get('date_column'):
+            return jsonify({'success': False,
+                            'error': 'No date column found in the dataset'})
+
+        view = {'start': str(start), 'end': str(end - 1)}
+        if data.get('retrain'):
+            if is_preliminary(analysis):
+                return jsonify({'success': False, 'error': PRELIMINARY_ERROR})
+            period_id = derive_dataset_id(dataset_id, 'period', start, end)
+            job_id = uuid.uuid4().hex
+            compute_governor.admit([job_id], 'interactive')
+            job = create_job('period_analysis', PIPELINE_STAGES[1:], job_id)
+            future = submit_job(job_id, run_period_analysis, dataset_id, start, end,
+                                session_revenue(), period_id)
+            future.add_done_callback(functools.partial(
+                _finish_analysis_job, job['job_id'], session_revenue()))
+            return jsonify({
+                'success': True,
+                'job_id': job['job_id'],
+                'view': view,
+                'status_url': url_for('job_status', job_id=job['job_id'])
+            }), 202
+
+        with span('filter.aggregate'):
+            aggregates = unpack_aggregates(aggregate_period(dataset_id, start, end),
+                                           analysis['chart_layout'])
+        if aggregates['customers'] == 0:
+            return jsonify({'success': False,
+                            'error': 'No data for selected date range'})
+
+        # KPIs come from the cube; the model, its accuracy and importance stay those
+        # of the full dataset. View charts are rendered when the browser asks for them.
+        charts = chart_urls(dataset_id, available_charts(aggregates), view)
+        if 'feature_importance' in analysis['charts']:
+            charts.update(chart_urls(dataset_id, ['feature_importance']))
+        period = {
+            **analysis,
+            'data_info': period_data_info(analysis['profile'], aggregates),
+            'churn_rate': aggregates['churned'] / aggregates['customers']
+        }
+        return jsonify({**build_analysis_response(period, session_revenue(), charts),
+                        'view': view})
+    except Overloaded as e:
+        logging.info(f"Period retrain refused: {str(e)}")
+        return overloaded_response(e)
+    except AnalysisError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logging.error(f"Error in filter_by_date: {str(e)}")
+        return jsonify({'success': False, 'error': f'Filter failed: {str(e)}'})
+
+@app.route('/charts/<dataset_id>/<chart>.png', methods=['GET'])
+def chart_image(dataset_id, chart):
+    """Serve a chart image, rendering and caching it on first request.
+
+    The dataset id covers both the data and the analysis settings, so the
+    image behind a URL never changes and browsers may cache it for good.
+    """
+    try:
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None or chart not in CHART_RENDERERS:
+            return jsonify({'success': False, 'error': 'Chart not found'}), 404
+        view = None
+        if request.args.get('start') and request.args.get('end'):
+            if not analysis.get('date_column'):
+                return jsonify({'success': False,
+                                'error': 'No date column found in the dataset'}), 404
+            start, end = parse_period(request.args)
+            view = f'{start}_{end - 1}'
+        if view is None:
+            if chart not in analysis['charts']:
+                return jsonify({'success': False, 'error': 'Chart not found'}), 404
+            path = ensure_charts(dataset_id, analysis, [chart])[chart]
+        else:
+            aggregates = unpack_aggregates(aggregate_period(dataset_id, start, end),
+                                           analysis['chart_layout'])
+            if (aggregates['customers'] == 0
+                    or chart not in available_charts(aggregates)):
+                return jsonify({'success': False, 'error': 'Chart not found'}), 404
+            path = ensure_charts(dataset_id, analysis, [chart], (start, end))[chart]
+        response = send_file(path, mimetype='image/png',
+                             etag=f"{dataset_id}-{view or 'all'}-{chart}",
+                             max_age=CHART_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    except AnalysisError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in chart_image: {str(e)}")
+        return jsonify({'success': False, 'error': f'Chart failed: {str(e)}'}), 500
+
+@app.route('/chart_data', methods=['GET'])
+def chart_data_view():
+    """Return the chart aggregates of the current dataset or of a date view.
+
+    Accepts the same month/year or start/end parameters as /filter_by_date.
+    """
+    try:
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        view = None
+        if ((request.args.get('start') and request.args.get('end'))
+                or request.args.get('month')):
+            if not analysis.get('date_column'):
+                return jsonify({'success': False,
+                                'error': 'No date column found in the dataset'})
+            start, end = parse_period(request.args)
+            view = {'start': str(start), 'end': str(end - 1)}
+            vector = aggregate_period(dataset_id, start, end)
+        else:
+            vector = analysis_store.load_array(dataset_id, 'aggregates')
+        with span('chart_data.aggregate'):
+            aggregates = unpack_aggregates(vector, analysis['chart_layout'])
+        if aggregates['customers'] == 0:
+            return jsonify({'success': False,
+                            'error': 'No data for selected date range'})
+        response = jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'view': view,
+            'charts': chart_data(aggregates, analysis['feature_importance'])
+        })
+        if request.args.get('dataset_id'):
+            response.cache_control.max_age = CHART_MAX_AGE
+        return response
+    except AnalysisError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logging.error(f"Error in chart_data: {str(e)}")
+        return jsonify({'success': False, 'error': f'Chart data failed: {str(e)}'})
+
+@app.route('/segments', methods=['GET'])
+def segments():
+    """Churn by customer segment, read from the dataset's segment cube.
+
+    ?by=contract lists a dimension, ?by=contract,internetservice a crossing,
+    and any other dimension=value argument drills down into that value
+    (?by=internetservice&contract=month-to-month). sort (churn_rate,
+    customers, churned, charges, churned_charges), order, top and
+    min_customers shape the list. Without by, the top riskiest segments of
+    all dimensions and crossings are returned with the available dimensions.
+    """
+    try:
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        layout = analysis['segment_layout']
+        cube = analysis_store.load_array(dataset_id, 'segments')
+        top = request.args.get('top', type=int)
+        min_customers = request.args.get('min_customers', type=int)
+        by = request.args.get('by')
+        if not by:
+            return jsonify({
+                'success': True,
+                'dataset_id': dataset_id,
+                'dimensions': layout['dimensions'],
+                'crossings': [key for key in layout['cells'] if ',' in key],
+                'segments': riskiest_segments(
+                    layout, cube, top or 10,
+                    SEGMENT_MIN_CUSTOMERS if min_customers is None else min_customers)
+            })
+
+        reserved = {'dataset_id', 'by', 'sort', 'order', 'top', 'min_customers'}
+        where = {name: value.lower() for name, value in request.args.items()
+                 if name not in reserved}
+        records = [record for record in query_segments(layout, cube, by.lower(), where)
+                   if record['customers'] >= (min_customers or 1)]
+        sort = request.args.get('sort', 'churn_rate')
+        if sort not in ('churn_rate', *SEGMENT_METRICS):
+            return jsonify({'success': False, 'error': f'Cannot sort by {sort}'})
+        records.sort(key=lambda record: record[sort],
+                     reverse=request.args.get('order', 'desc') != 'asc')
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'by': by.lower().split(','),
+            'where': where,
+            'segments': records[:top] if top else records
+        })
+    except AnalysisError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logging.error(f"Error in segments: {str(e)}")
+        return jsonify({'success': False, 'error': f'Segments failed: {str(e)}'})
+
+@app.route('/score', methods=['POST'])
+def score():
+    """Stream churn probabilities for an uploaded CSV of customers.
+
+    The file is scored with the stored pipeline of the current dataset and
+    the result is streamed back as CSV while the upload is read in chunks.
+    """
+    try:
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        if is_preliminary(analysis):
+            return jsonify({'success': False, 'error': PRELIMINARY_ERROR})
+        file = request.files.get('file')
+        if file is None or not file.filename.endswith('.csv'):
+            return jsonify({'success': False, 'error': 'Invalid file format'})
+
+        pipeline = analysis_store.load_pipeline(dataset_id)
+        with span('upload.save'):
+            upload_path, _ = save_upload(file)
+        header = pd.read_csv(upload_path, nrows=0).columns.str.lower()
+        missing = [col for col in pipeline['features'] if col not in header]
+        if missing:
+            os.remove(upload_path)
+            return jsonify({'success': False,
+                            'error': f"Missing columns: {', '.join(missing)}"})
+
+        def generate():
+            """Stream the scored CSV, then remove the upload."""
+            started, rows = time.time(), 0
+            try:
+                with span('score.stream'):
+                    for text, chunk_rows in score_csv(pipeline, upload_path):
+                        rows += chunk_rows
+                        yield text
+                logging.info(scoring_summary(rows, started))
+            finally:
+                os.remove(upload_path)
+
+        return Response(stream_with_context(generate()), mimetype='text/csv',
+                        headers={'Content-Disposition':
+                                 'attachment; filename=churn_scores.csv'})
+    except Exception as e:
+        logging.error(f"Error in score: {str(e)}")
+        return jsonify({'success': False, 'error': f'Scoring failed: {str(e)}'})
+
+@app.route('/predict_customer', methods=['POST'])
+def predict_customer():
+    """Churn probability for one customer, e.g. {"customer": {"tenure": 3, ...}}.
+
+    Scored through the prediction batcher, from the flattened trees for
+    random forests and with the fitted model for other engines; columns
+    missing from the record get the training fill values.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        if is_preliminary(analysis):
+            return jsonify({'success': False, 'error': PRELIMINARY_ERROR})
+        customer = data.get('customer')
+        if not isinstance(customer, dict):
+            return jsonify({'success': False, 'error': 'Expected a customer object'})
+
+        scorer = analysis_store.load_scorer(dataset_id)
+        with span('predict.encode'):
+            row = encode_customer(scorer, customer)
+        with span(f"predict.{scorer['engine']}"):
+            future = get_prediction_batcher().submit(dataset_id, scorer, row)
+            probability = future.result()
+        return jsonify({'success': True, 'dataset_id': dataset_id,
+                        'churn_probability': round(probability, 4)})
+    except Exception as e:
+        logging.error(f"Error in predict_customer: {str(e)}")
+        return jsonify({'success': False, 'error': f'Prediction failed: {str(e)}'})
+
+@app.route('/profile', methods=['GET'])
+def dataset_profile():
+    """Return the column profile stored with the current dataset."""
+    try:
+        analysis = analysis_store.load_analysis(current_dataset_id())
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        return jsonify({'success': True, 'dataset_id': analysis['dataset_id'],
+                        'profile': analysis['profile']})
+    except Exception as e:
+        logging.error(f"Error in profile: {str(e)}")
+        return jsonify({'success': False, 'error': f'Profile failed: {str(e)}'})
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Model registry: every stored model version with its metrics and setup."""
+    return jsonify({'success': True, 'models': analysis_store.list_models(),
+                    'promoted': analysis_store.promoted_model()})
+
+@app.route('/models/<model_id>', methods=['GET'])
+def model_info(model_id):
+    """The registry record of one model version."""
+    record = analysis_store.load_model_record(model_id)
+    if record is None:
+        return jsonify({'success': False, 'error': 'Model not found'}), 404
+    return jsonify({'success': True, 'model': record})
+
+@app.route('/models/<model_id>/load', methods=['POST'])
+def load_model(model_id):
+    """Make a stored model the session's current dataset and return its dashboard.
+
+    The scorer is memory-mapped into this worker on the way, so the first
+    prediction does not pay for it.
+    """
+    try:
+        record = analysis_store.load_model_record(model_id)
+        analysis = analysis_store.load_analysis(model_id)
+        if record is None or analysis is None or is_preliminary(analysis):
+            return jsonify({'success': False, 'error': 'Model not found'}), 404
+        started = time.perf_counter()
+        with span('models.load'):
+            analysis_store.load_scorer(model_id)
+        session['dataset_id'] = model_id
+        return jsonify({**build_analysis_response(analysis, session_revenue()),
+                        'model': record,
+                        'load_seconds': round(time.perf_counter() - started, 4)})
+    except Exception as e:
+        logging.error(f"Error in load_model: {str(e)}")
+        return jsonify({'success': False,
+                        'error': f'Loading the model failed: {str(e)}'})
+
+@app.route('/models/<model_id>/promote', methods=['POST'])
+def promote_model(model_id):
+    """Serve requests that name no dataset (and new sessions) from this model."""
+    if analysis_store.load_model_record(model_id) is None:
+        return jsonify({'success': False, 'error': 'Model not found'}), 404
+    analysis_store.promote(model_id)
+    logging.info(f"Promoted model {model_id}")
+    return jsonify({'success': True, 'promoted': model_id})
+
+@app.route('/models/<model_id>', methods=['DELETE'])
+def delete_model(model_id):
+    """Remove a model version with its analysis, charts and reports."""
+    if analysis_store.load_model_record(model_id) is None:
+        return jsonify({'success': False, 'error': 'Model not found'}), 404
+    analysis_store.delete(model_id)
+    if session.get('dataset_id') == model_id:
+        session.pop('dataset_id')
+    logging.info(f"Deleted model {model_id}")
+    return jsonify({'success': True, 'deleted': model_id})
+
+@app.route('/predict_revenue', methods=['POST'])
+def predict_revenue():
+    """Predict future revenue based on current revenue and churn rate.
+
+    For analyses with per-customer churn probabilities the response also
+    carries a Monte Carlo projection (see project_revenue_loss) over the
+    request's optional months, scenarios and churn_reduction.
+    """
+    try:
+        logging.info("Predicting revenue")
+        data = request.json
+        current_revenue = data.get('current_revenue', 0)
+        try:
+            current_revenue = float(current_revenue)
+            if current_revenue < 0:
+                current_revenue = 0
+        except (ValueError, TypeError):
+            current_revenue = 0
+        session['current_revenue'] = current_revenue
+        
+        if current_revenue == 0:
+            return jsonify({
+                'success': True,
                 'monthly_loss': 0.0,
                 'yearly_loss': 0.0,
                 'future_revenue': 0.0,
                 'message': 'Current Revenue is 0, no loss predicted'
             })
+
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
         
-        monthly_loss = float(current_revenue * churn_rate)
+        monthly_loss = float(current_revenue * analysis['churn_rate'])
         yearly_loss = float(monthly_loss * 12)
         future_revenue = float(current_revenue - yearly_loss)
-        
-        logging.info(f"Revenue prediction: Monthly loss ₹{monthly_loss:.2f}, Yearly loss ₹{yearly_loss:.2f}")
-        return jsonify({
+        response = {
             'success': True,
             'monthly_loss': monthly_loss,
             'yearly_loss': yearly_loss,
             'future_revenue': future_revenue
-        })
+        }
+        if analysis.get('projection'):
+            months, scenarios, churn_reduction = parse_projection(data)
+            with span('revenue.projection'):
+                customers = analysis_store.load_array(dataset_id, 'projection')
+                response['projection'] = project_revenue_loss(
+                    customers, current_revenue, months, scenarios, churn_reduction)
+        
+        logging.info(f"Revenue prediction: Monthly loss ₹{monthly_loss:.2f}, Yearly loss ₹{yearly_loss:.2f}")
+        return jsonify(response)
+    except AnalysisError as e:
+        return jsonify({'success': False, 'error': str(e)})
     except Exception as e:
         logging.error(f"Error in predict_revenue: {str(e)}")
         return jsonify({'success': False, 'error': f'Revenue prediction failed: {str(e)}'})
@@ -588,8 +4671,13 @@ def chat():
     """Handle chatbot queries."""
     try:
         logging.info("Processing chat request")
-        if global_data is None:
+        dataset_id = current_dataset_id()
+        analysis = analysis_store.load_analysis(dataset_id)
+        if analysis is None:
             return jsonify({'response': 'Please upload a dataset first.'})
+        churn_rate = analysis['churn_rate']
+        model_accuracy = analysis['model_accuracy']
+        feature_importance = analysis['feature_importance']
 
         data = request.json
         query = data.get('query', '').lower()
@@ -609,31 +4697,42 @@ def chat():
         elif 'revenue' in query or 'loss' in query:
             if current_revenue == 0:
                 response = "Current Revenue is 0, no revenue loss predicted."
+            elif analysis.get('projection'):
+                customers = analysis_store.load_array(dataset_id, 'projection')
+                response = describe_projection(project_revenue_loss(customers,
+                                                                    current_revenue))
             else:
                 monthly_loss = float(current_revenue * churn_rate)
                 yearly_loss = float(monthly_loss * 12)
-                response = f"Churn impacts revenue by ₹{monthly_loss:.2f} monthly and ₹{yearly_loss:.2f} annually."
+                response = (f"Churn impacts revenue by ₹{monthly_loss:.2f} monthly "
+                            f"and ₹{yearly_loss:.2f} annually.")
         elif 'reasons' in query or 'factors' in query:
             response = "Top 3 factors for churn:\n" + "\n".join(
-                f"{i+1}. {f['Feature']} (Importance: {f['Importance']:.4f})" for i, f in enumerate(feature_importance[:3])
+                f"{i+1}. {f['Feature']} (Importance: {f['Importance']:.4f})"
+                for i, f in enumerate(feature_importance[:3])
             )
         elif 'reduce churn' in query or 'recommendations' in query:
             recommendations = generate_recommendations(feature_importance)
-            response = "Recommendations to reduce churn:\n" + "\n".join(f"{i+1}. {rec}" for i, rec in enumerate(recommendations))
+            response = "Recommendations to reduce churn:\n" + "\n".join(
+                f"{i+1}. {rec}" for i, rec in enumerate(recommendations))
         elif 'model accuracy' in query or 'accuracy' in query or 'accurate' in query:
-            response = f"The churn prediction model accuracy is {model_accuracy*100:.2f}%."
+            response = (f"The churn prediction model accuracy is "
+                        f"{model_accuracy*100:.2f}%.")
         elif 'trend' in query:
-            response = f"Churn rate trend: {churn_rate*100:.2f}% currently, analyze over time in the Insights section."
-        elif 'segment' in query:
-            if 'contract' in global_data.columns:
-                segment_churn = global_data.groupby('contract')[is_churn].mean().to_dict()
-                response = "Churn by contract type:\n" + "\n".join(
-                    f"{k}: {v*100:.2f}%" for k, v in segment_churn.items()
-                )
+            response = (f"Churn rate trend: {churn_rate*100:.2f}% currently, "
+                        f"analyze over time in the Insights section.")
+        elif 'segment' in query or ' by ' in f' {query} ':
+            layout = analysis['segment_layout']
+            if layout['cells']:
+                cube = analysis_store.load_array(dataset_id, 'segments')
+                response = segment_answer(layout, cube, query)
             else:
-                response = "Segment analysis unavailable due to missing contract data."
+                response = ("Segment analysis unavailable: the dataset has no "
+                            "categorical columns.")
         else:
-            response = "Try asking about churn rate, revenue impact, churn reasons, recommendations, model accuracy, churn trend, or customer segments."
+            response = ("Try asking about churn rate, revenue impact, churn reasons, "
+                        "recommendations, model accuracy, churn trend, or customer "
+                        "segments.")
 
         return jsonify({'response': response})
     except Exception as e:
@@ -642,42 +4741,71 @@ def chat():
 
 @app.route('/download_report', methods=['GET'])
 def download_report():
-    """Download a PDF report."""
+    """Download the PDF report, or start its build and answer 202 until it is cached.
+
+    Reports are built in the background (see queue_report) and served from
+    the store once built; /report_status tells when that is.
+    """
     try:
-        logging.info("Generating PDF report")
-        if global_data is None:
+        dataset_id = current_dataset_id()
+        if analysis_store.load_analysis(dataset_id) is None:
             return jsonify({'error': 'No data uploaded yet'})
-        
-        current_revenue = float(request.form.get('current_revenue', 0)) if request.form.get('current_revenue') else 0
-        data_info = {
-            'rows': int(len(global_data)),
-            'columns': int(len(global_data.columns)),
-            'missing_values': int(global_data.isnull().sum().sum()),
-            'data_quality_score': float(clean_data(global_data.copy())[1])
-        }
-        monthly_loss = float(current_revenue * churn_rate) if current_revenue > 0 else 0
-        yearly_loss = float(monthly_loss * 12) if current_revenue > 0 else 0
-        revenue_message = "Current Revenue is 0, no revenue loss predicted" if current_revenue == 0 else ""
-        insights = {
-            'churn_rate': float(churn_rate),
-            'model_accuracy': float(model_accuracy),
-            'potential_monthly_loss': monthly_loss,
-            'potential_yearly_loss': yearly_loss
-        }
-        charts = generate_charts(global_data)
-        recommendations = generate_recommendations(feature_importance)
-        
-        pdf_buffer = generate_pdf_report(data_info, insights, charts, recommendations, data_info['data_quality_score'], revenue_message)
+        current_revenue = float(request.args.get('current_revenue')
+                                or session_revenue())
+        path = analysis_store.report_path(dataset_id, current_revenue)
+        # queue_report returns None when the build finished since the check above
+        job = (None if os.path.exists(path)
+               else queue_report(dataset_id, current_revenue))
+        if job is not None and job['status'] == 'failed':
+            return jsonify({'success': False, 'status': 'failed',
+                            'error': job['result']['error']}), 500
+        if job is not None:
+            return jsonify({
+                'success': False,
+                'status': job['status'],
+                'job_id': job['job_id'],
+                'status_url': url_for('report_status', dataset_id=dataset_id,
+                                      current_revenue=report_key(current_revenue))
+            }), 202
+        built = datetime.fromtimestamp(os.path.getmtime(path))
         return send_file(
-            pdf_buffer,
+            path,
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=f'churn_analysis_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+            download_name=f'churn_analysis_report_{built.strftime("%Y%m%d_%H%M%S")}.pdf'
         )
     except Exception as e:
         logging.error(f"Error in download_report: {str(e)}")
         return jsonify({'error': f'Error generating report: {str(e)}'})
 
+@app.route('/report_status', methods=['GET'])
+def report_status():
+    """Whether the PDF report of a dataset and revenue is ready; builds it if not."""
+    try:
+        dataset_id = current_dataset_id()
+        if analysis_store.load_analysis(dataset_id) is None:
+            return jsonify({'success': False, 'error': 'No data uploaded yet'})
+        current_revenue = float(request.args.get('current_revenue')
+                                or session_revenue())
+        job = queue_report(dataset_id, current_revenue)
+        if job is None:
+            return jsonify({'success': True, 'status': 'ready',
+                            'url': report_url(dataset_id, current_revenue)})
+        if job['status'] == 'failed':
+            return jsonify({'success': False, 'status': 'failed',
+                            'error': job['result']['error']})
+        return jsonify({
+            'success': True,
+            'status': job['status'],
+            'stage': job['stage'],
+            'job_id': job['job_id'],
+            'status_url': url_for('job_status', job_id=job['job_id'])
+        })
+    except Exception as e:
+        logging.error(f"Error in report_status: {str(e)}")
+        return jsonify({'success': False,
+                        'error': f'Error generating report: {str(e)}'})
+
 def open_browser():
     time.sleep(1)
     webbrowser.open_new("http://localhost:5000")
@@ -691,6 +4819,25 @@ def open_browser():
     os.system("echo # '%CD%\\tmp\\app.log' for detailed logs.")
     os.system("echo(")
 
+@app.cli.command('score')
+@click.argument('dataset_id')
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Output CSV file (default: stdout).')
+def score_command(dataset_id, input_path, output):
+    """Score a CSV of customers with the pipeline stored for DATASET_ID."""
+    analysis = analysis_store.load_analysis(dataset_id)
+    if analysis is None:
+        raise click.ClickException(f'Unknown dataset {dataset_id}')
+    if is_preliminary(analysis):
+        raise click.ClickException(PRELIMINARY_ERROR)
+    pipeline = analysis_store.load_pipeline(dataset_id)
+    started, rows = time.time(), 0
+    for text, chunk_rows in score_csv(pipeline, input_path):
+        output.write(text)
+        rows += chunk_rows
+    click.echo(scoring_summary(rows, started), err=True)
+
 if __name__ == '__main__':
     threading.Thread(target=open_browser).start()
     app.run(debug=False)
@@ -0,0 +1,372 @@
+"""Stage-by-stage benchmark of the upload pipeline across dataset sizes.
+
+Runs the work behind /upload, /charts and /download_report on the sample
+datasets and on synthetic files of the same schema, timing each stage and
+recording its peak RSS:
+
+    read_csv    parse the file in INGEST_CHUNK_ROWS chunks
+    clean       StreamingCleaner plus date parsing (the job's clean stage)
+    encode      build_pipeline, encode_features and StandardScaler
+    train       train_churn_model (hyperparameter search and refit)
+    importance  compute_feature_importance with IMPORTANCE_METHOD
+    charts      chart aggregates plus rendering every chart to PNG
+    report      generate_pdf_report
+
+Each dataset runs in a fresh process. Results can be saved as a JSON
+baseline and later runs compared against it; a stage that got slower or
+hungrier than the thresholds allow makes the run exit with status 1.
+
+Run from the repository root:
+
+    python benchmarks/pipeline.py --save benchmarks/baselines/pipeline.json
+    python benchmarks/pipeline.py --baseline benchmarks/baselines/pipeline.json
+    python benchmarks/pipeline.py --no-samples --sizes 1m,10m --until clean
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.preprocessing import StandardScaler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+
+STAGES = ['read_csv', 'clean', 'encode', 'train', 'importance', 'charts', 'report']
+SAMPLES = [f'Sample_dataset{i}.csv' for i in range(1, 6)]
+DATA_DIR = os.path.join('tmp', 'bench')
+GRIDS = {
+    'small': {'n_estimators': [100], 'max_depth': [10]},
+    'app': app.PARAM_GRID
+}
+SYNTHETIC_CHUNK_ROWS = 500000
+SERVICES = ['onlineSecurity', 'onlineBackup', 'deviceProtection', 'techSupport',
+            'streamingTV', 'streamingMovies']
+PAYMENT_METHODS = ['Electronic check', 'Mailed check', 'Bank transfer (automatic)',
+                   'Credit card (automatic)']
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000."""
+    text = text.strip().lower()
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def synthetic_chunk(rng, start, rows):
+    """Customers with the sample schema; churn follows contract, tenure, services."""
+    tenure = rng.integers(0, 73, rows)
+    contract = rng.choice(['Month-to-month', 'One year', 'Two year'], rows,
+                          p=[0.55, 0.21, 0.24])
+    internet = rng.choice(['DSL', 'Fiber optic', 'No'], rows, p=[0.34, 0.44, 0.22])
+    phone = rng.random(rows) < 0.9
+    frame = OrderedDict([
+        ('id', np.arange(start + 1, start + rows + 1)),
+        ('gender', rng.choice(['Female', 'Male'], rows)),
+        ('seniorCitizen', rng.random(rows) < 0.16),
+        ('partner', rng.random(rows) < 0.48),
+        ('dependents', rng.random(rows) < 0.3),
+        ('tenure', tenure),
+        ('phoneService', phone),
+        ('multipleLines', np.where(phone, rng.choice(['No', 'Yes'], rows),
+                                   'No phone service')),
+        ('internetService', internet)
+    ])
+    for service in SERVICES:
+        frame[service] = np.where(internet == 'No', 'No internet service',
+                                  rng.choice(['No', 'Yes'], rows))
+    monthly = np.round(18.25 + 25 * (internet == 'DSL')
+                       + 50 * (internet == 'Fiber optic')
+                       + 10 * (frame['streamingTV'] == 'Yes')
+                       + rng.normal(0, 8, rows).clip(-15, 15), 2)
+    total = np.round(monthly * np.maximum(tenure, 1) * rng.uniform(0.95, 1.05, rows), 2)
+    total[rng.random(rows) < 0.002] = np.nan
+    score = (-1.2 + 1.4 * (contract == 'Month-to-month')
+             - 0.9 * (contract == 'Two year')
+             - 0.035 * tenure + 0.7 * (internet == 'Fiber optic')
+             - 0.5 * (frame['techSupport'] == 'Yes') + 0.3 * frame['seniorCitizen'])
+    frame.update([
+        ('contract', contract),
+        ('paperlessBilling', rng.random(rows) < 0.59),
+        ('paymentMethod', rng.choice(PAYMENT_METHODS, rows,
+                                     p=[0.34, 0.23, 0.22, 0.21])),
+        ('monthlyCharges', monthly),
+        ('totalCharges', total),
+        ('churn', rng.random(rows) < 1 / (1 + np.exp(-score))),
+        ('date', (np.datetime64('2024-05-01')
+                  + rng.integers(0, 365, rows)).astype(str))
+    ])
+    df = pd.DataFrame(frame)
+    # A few exact duplicates, as exports tend to have
+    repeats = df.sample(frac=0.005, random_state=int(rng.integers(2 ** 31)))
+    return pd.concat([df, repeats]).iloc[:rows]
+
+
+def synthetic_file(rows, seed):
+    """Path of a reproducible synthetic CSV of `rows` rows, written on first use."""
+    path = os.path.join(DATA_DIR, f'synthetic_{rows}_{seed}.csv')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        for start in range(0, rows, SYNTHETIC_CHUNK_ROWS):
+            rng = np.random.default_rng([seed, start])
+            chunk = synthetic_chunk(rng, start,
+                                    min(SYNTHETIC_CHUNK_ROWS, rows - start))
+            chunk.to_csv(tmp_path, mode='a', header=start == 0, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _reset_peak_rss():
+    """Restart the VmHWM peak RSS counter, where Linux allows it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    """Peak RSS since the last reset (VmHWM), else since the process started."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageTimer:
+    """Seconds and peak RSS of each named stage, in the order they ran."""
+
+    def __init__(self):
+        """Start with no stages timed."""
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name, **details):
+        """Time the block as stage name; the yielded details are recorded with it."""
+        _reset_peak_rss()
+        started = time.perf_counter()
+        yield details
+        self.stages[name] = {'seconds': round(time.perf_counter() - started, 4),
+                             'peak_rss_mb': round(_peak_rss_mb(), 1), **details}
+
+
+def run_dataset(path, grid, n_jobs, until):
+    """Run the pipeline stages on one file and return their timings."""
+    stages = STAGES[:STAGES.index(until) + 1]
+    timer = StageTimer()
+    spool = tempfile.mkdtemp(dir=DATA_DIR)
+    try:
+        with timer.stage('read_csv') as details:
+            chunks = pd.read_csv(path, chunksize=app.INGEST_CHUNK_ROWS)
+            details['rows'] = sum(len(chunk) for chunk in chunks)
+
+        if 'clean' in stages:
+            with timer.stage('clean'):
+                cleaner = app.StreamingCleaner(spool, app.INGEST_CHUNK_ROWS)
+                df, profile = cleaner.clean(path)
+                date_col = app.detect_date_column(df)
+                if date_col and not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+                    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+                    app.update_profile(profile, df, [date_col])
+            churn_col = app.find_churn_column(df)
+
+        if 'encode' in stages:
+            with timer.stage('encode'):
+                pipeline = app.build_pipeline(df, churn_col)
+                StandardScaler().fit_transform(app.encode_features(pipeline, df))
+
+        if 'train' in stages:
+            with timer.stage('train') as details:
+                pipeline, accuracy, holdout, search_report = app.train_churn_model(
+                    df, churn_col, param_grid=grid, n_jobs=n_jobs)
+                details.update(accuracy=round(accuracy, 4), fits=search_report['fits'])
+
+        if 'importance' in stages:
+            with timer.stage('importance') as details:
+                importance, importance_report = app.compute_feature_importance(
+                    pipeline['model'], *holdout)
+                details.update(method=importance_report['method'],
+                               budget_exhausted=importance_report['budget_exhausted'])
+
+        if 'charts' in stages:
+            with timer.stage('charts'):
+                layout = app.chart_layout(df, churn_col)
+                vector = app.compute_aggregates(df, layout)[0]
+                aggregates = app.unpack_aggregates(vector, layout)
+                charts = OrderedDict(
+                    (name, app.render_chart(name, aggregates, importance))
+                    for name in app.available_charts(aggregates, importance))
+
+        if 'report' in stages:
+            with timer.stage('report'):
+                churn_rate = float(app.encode_churn(df[churn_col]).mean())
+                insights, revenue_message = app.build_insights(churn_rate, accuracy,
+                                                               importance, 1000)
+                data_info = app.build_data_info(profile)
+                app.generate_pdf_report(data_info, insights, charts,
+                                        app.generate_recommendations(importance),
+                                        data_info['data_quality_score'],
+                                        revenue_message)
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+    total = sum(stage['seconds'] for stage in timer.stages.values())
+    return {'file': os.path.basename(path), 'rows': timer.stages['read_csv']['rows'],
+            'stages': timer.stages, 'total_seconds': round(total, 4)}
+
+
+def environment(args):
+    """Commit, library versions, machine and settings the results were taken on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, cwd=ROOT).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'grid': args.grid,
+        'jobs': args.jobs,
+        'ingest_chunk_rows': app.INGEST_CHUNK_ROWS,
+        'search_strategy': app.SEARCH_STRATEGY,
+        'importance': [app.IMPORTANCE_METHOD, app.IMPORTANCE_MAX_SECONDS]
+    }
+
+
+def compare(baseline, results, args):
+    """Regressions of results against a baseline, as printable lines."""
+    failures = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for stage, now in result['stages'].items():
+            before = previous['stages'].get(stage)
+            if before is None:
+                continue
+            if (now['seconds'] - before['seconds'] > args.min_seconds
+                    and now['seconds'] > before['seconds'] * args.max_slowdown):
+                failures.append(f"{name} {stage}: {before['seconds']:.3f}s -> "
+                                f"{now['seconds']:.3f}s "
+                                f"(x{now['seconds'] / before['seconds']:.2f} "
+                                f"> x{args.max_slowdown})")
+            if (now['peak_rss_mb'] - before['peak_rss_mb'] > args.min_rss_mb
+                    and now['peak_rss_mb']
+                    > before['peak_rss_mb'] * args.max_rss_growth):
+                growth = now['peak_rss_mb'] / before['peak_rss_mb']
+                failures.append(f"{name} {stage}: peak RSS "
+                                f"{before['peak_rss_mb']:.0f} MB -> "
+                                f"{now['peak_rss_mb']:.0f} MB (x{growth:.2f} "
+                                f"> x{args.max_rss_growth})")
+    return failures
+
+
+def print_result(name, result, previous=None):
+    """Print one dataset's stage table, next to its baseline when there is one."""
+    print(f"\n{name} ({result['rows']} rows, {result['total_seconds']:.2f}s)")
+    for stage, timing in result['stages'].items():
+        line = (f"  {stage:<11} {timing['seconds']:9.3f}s "
+                f"{timing['peak_rss_mb']:8.0f} MB")
+        before = (previous or {}).get('stages', {}).get(stage)
+        if before:
+            line += (f"   baseline {before['seconds']:9.3f}s "
+                     f"{before['peak_rss_mb']:8.0f} MB"
+                     f"   x{timing['seconds'] / max(before['seconds'], 1e-9):.2f}")
+        print(line)
+
+
+def main():
+    """Benchmark the chosen datasets, then save and compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10k,100k',
+                        help='Synthetic dataset sizes, e.g. 10k,100k,1m,10m '
+                             '(empty for none)')
+    parser.add_argument('--no-samples', action='store_true',
+                        help='Skip Sample_dataset1-5.csv')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--until', choices=STAGES, default=STAGES[-1],
+                        help='Last stage to run')
+    parser.add_argument('--grid', choices=sorted(GRIDS), default='small',
+                        help="Parameter grid for train: 'small' (one candidate) "
+                             "or the app's PARAM_GRID")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help='n_jobs for the hyperparameter search')
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--baseline',
+                        help='Compare against this JSON file and fail on regressions')
+    parser.add_argument('--max-slowdown', type=float, default=1.5)
+    parser.add_argument('--max-rss-growth', type=float, default=1.3)
+    parser.add_argument('--min-seconds', type=float, default=0.1,
+                        help='Ignore slowdowns smaller than this many seconds')
+    parser.add_argument('--min-rss-mb', type=float, default=25,
+                        help='Ignore peak RSS growth smaller than this many MB')
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    datasets = OrderedDict()
+    if not args.no_samples:
+        datasets.update((os.path.splitext(name)[0], os.path.join(ROOT, name))
+                        for name in SAMPLES)
+    for size in filter(None, args.sizes.split(',')):
+        rows = parse_size(size)
+        datasets[f'synthetic_{rows}'] = synthetic_file(rows, args.seed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = OrderedDict()
+    for name, path in datasets.items():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(run_dataset, path, GRIDS[args.grid], args.jobs,
+                                     args.until)
+            results[name] = future.result()
+        print_result(name, results[name],
+                     (baseline or {}).get('results', {}).get(name))
+
+    run = {'environment': environment(args), 'results': results}
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'\nSaved {args.save}')
+
+    if baseline is not None:
+        if baseline['environment'].get('cpus') != run['environment']['cpus']:
+            print(f"\nNote: baseline was recorded on "
+                  f"{baseline['environment'].get('cpus')} CPUs, "
+                  f"this machine has {run['environment']['cpus']}")
+        failures = compare(baseline, results, args)
+        if failures:
+            print('\nREGRESSIONS:')
+            for failure in failures:
+                print(f'  {failure}')
+            sys.exit(1)
+        print('\nNo regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
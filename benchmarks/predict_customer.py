@@ -0,0 +1,120 @@
+"""Latency of single-customer churn scoring: flattened forest vs predict_proba.
+
+Fits the same kind of forest the dashboard can pick (200 trees, unbounded
+depth) on a sample dataset, then scores customers one at a time through
+
+* stock:    encode_features + StandardScaler + RandomForestClassifier.predict_proba
+* compiled: encode_customer + forest_proba, the /predict_customer path
+* batched:  many threads submitting to the PredictionBatcher at once
+
+Run from the repository root:
+
+    python benchmarks/predict_customer.py [Sample_dataset1.csv] [--customers 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+
+def fit_pipeline(path, n_estimators):
+    """Clean the CSV at path and fit a forest of n_estimators trees on it."""
+    with tempfile.TemporaryDirectory() as spool:
+        df, _ = app.StreamingCleaner(spool, app.INGEST_CHUNK_ROWS).clean(path)
+    churn_col = app.find_churn_column(df)
+    pipeline = app.build_pipeline(df, churn_col)
+    X = app.encode_features(pipeline, df)
+    churn = df[churn_col]
+    if churn.dtype == object:
+        churn = pd.Series(pd.Categorical(churn).codes, index=churn.index)
+    scaler = StandardScaler()
+    model = RandomForestClassifier(n_estimators=n_estimators,
+                                   random_state=app.RANDOM_STATE, n_jobs=-1)
+    model.fit(scaler.fit_transform(X), app.encode_churn(churn))
+    model.set_params(n_jobs=None)
+    pipeline.update(scaler=scaler, model=model)
+    return pipeline
+
+
+def timed(fn, items):
+    """fn of each item, and the milliseconds each call took."""
+    results, latencies = [], []
+    for item in items:
+        started = time.perf_counter()
+        results.append(fn(item))
+        latencies.append(time.perf_counter() - started)
+    return np.array(results), np.array(latencies) * 1000
+
+
+def report(name, latencies_ms):
+    """Print the median, 99th percentile and worst latency of a scoring path."""
+    p50, p99 = np.percentile(latencies_ms, [50, 99])
+    print(f'{name:<10} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   '
+          f'max {latencies_ms.max():8.3f} ms')
+
+
+def batched(scorer, rows, threads):
+    """Latencies and rows per second of threads scoring rows through a batcher."""
+    batcher = app.PredictionBatcher(app.PREDICT_BATCH_ROWS, app.PREDICT_BATCH_WAIT)
+    chunks = np.array_split(np.arange(len(rows)), threads)
+    latencies = [None] * threads
+
+    def worker(t):
+        """Score chunk t one row at a time."""
+        _, latencies[t] = timed(
+            lambda i: batcher.submit('bench', scorer, rows[i]).result(), chunks[t])
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return np.concatenate(latencies), len(rows) / (time.perf_counter() - started)
+
+
+def main():
+    """Time the stock, compiled and batched paths on the same customers."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv', nargs='?', default='Sample_dataset1.csv')
+    parser.add_argument('--customers', type=int, default=500)
+    parser.add_argument('--trees', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    pipeline = fit_pipeline(args.csv, args.trees)
+    scorer = app.compile_scorer(pipeline, app.compile_forest(pipeline['model']))
+    records = pd.read_csv(args.csv, nrows=args.customers).to_dict('records')
+    nodes = len(scorer['forest_value'])
+    print(f'{args.trees} trees, {nodes} nodes, '
+          f'{len(records)} customers scored one at a time\n')
+
+    frame = lambda r: pd.DataFrame([r]).rename(columns=str.lower)  # noqa: E731
+    stock, stock_ms = timed(
+        lambda r: app.predict_churn_probability(pipeline, frame(r))[0], records)
+    compiled, compiled_ms = timed(
+        lambda r: app.forest_proba(scorer, app.encode_customer(scorer, r)[None])[0],
+        records)
+    rows = [app.encode_customer(scorer, r) for r in records]
+    batch_ms, throughput = batched(scorer, rows, args.threads)
+
+    report('stock', stock_ms)
+    report('compiled', compiled_ms)
+    report('batched', batch_ms)
+    print(f'\nbatched throughput with {args.threads} threads: '
+          f'{throughput:.0f} customers/s')
+    print(f'max |compiled - stock| = {np.abs(compiled - stock).max():.2e}')
+
+
+if __name__ == '__main__':
+    main()
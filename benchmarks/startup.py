@@ -0,0 +1,191 @@
+"""Worker cold start: import time, first-request latency and memory per mode.
+
+Each mode runs in a fresh interpreter:
+
+* eager:   import app and the whole analytics stack before serving (the old
+           behaviour)
+* lazy:    import app only; charting, the PDF report and training load on
+           first use
+* preload: the master imports app and the analytics stack, then forks a worker,
+           as gunicorn.conf.py does
+
+For each mode the worker's boot time, its first /, /predict_revenue and /chat
+requests and its RSS, USS and PSS (from /proc/self/smaps_rollup, Linux only)
+are reported, plus the per-package import cost from python -X importtime.
+
+Run from the repository root:
+
+    python benchmarks/startup.py [--runs 3] [--json tmp/bench/startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter, OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ['eager', 'lazy', 'preload']
+REQUESTS = [('GET', '/', None),
+            ('POST', '/predict_revenue', {'current_revenue': 1000}),
+            ('POST', '/chat', {'query': 'what is the churn rate?'})]
+
+
+def memory_mb():
+    """RSS, USS and PSS of this process in MB (USS/PSS None without smaps_rollup)."""
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {'rss_mb': round(rss, 1), 'uss_mb': None, 'pss_mb': None}
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {'rss_mb': round(fields.get('Rss', 0), 1), 'uss_mb': round(uss, 1),
+            'pss_mb': round(fields.get('Pss', 0), 1)}
+
+
+def serve_first_requests(app):
+    """Milliseconds taken by each of the worker's first REQUESTS."""
+    client = app.app.test_client()
+    timings = OrderedDict()
+    for method, path, body in REQUESTS:
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        timings[path] = round((time.perf_counter() - started) * 1000, 1)
+        assert response.status_code == 200, (path, response.status_code)
+    return timings
+
+
+def worker(app, boot_started):
+    """Boot time, first-request latencies and memory of a worker."""
+    result = {'boot_seconds': round(time.perf_counter() - boot_started, 3)}
+    result['first_request_ms'] = serve_first_requests(app)
+    result.update(memory_mb())
+    return result
+
+
+def child(mode):
+    """Body of one measurement process; prints its result as JSON."""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import app
+    if mode != 'lazy':
+        app.preload_analytics()
+    if mode != 'preload':
+        result = worker(app, started)
+        if mode == 'lazy':
+            deferred = time.perf_counter()
+            app.preload_analytics()
+            result['deferred_seconds'] = round(time.perf_counter() - deferred, 3)
+        print(json.dumps(result))
+        return
+
+    result = {'master_seconds': round(time.perf_counter() - started, 3)}
+    read_fd, write_fd = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        with os.fdopen(write_fd, 'w') as f:
+            json.dump(worker(app, forked), f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        result.update(json.load(f))
+    os.waitpid(pid, 0)
+    print(json.dumps(result))
+
+
+def measure(mode):
+    """Result of one fresh measurement process for mode."""
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_costs():
+    """Cumulative import seconds per top-level package of app and its analytics."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                          'import app; app.preload_analytics()'],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    costs = Counter()
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only count packages imported directly by the script or by app, so
+        # nested imports are not double counted
+        indent = len(name) - len(name.lstrip())
+        if indent <= 3:
+            costs[name.strip().split('.')[0]] += int(cumulative) / 1e6
+    costs.pop('app', None)
+    return OrderedDict((name, round(seconds, 3))
+                       for name, seconds in costs.most_common())
+
+
+def summarise(runs):
+    """Median of every numeric field over the runs."""
+    first = runs[0]
+    summary = OrderedDict()
+    for key, value in first.items():
+        if isinstance(value, dict):
+            summary[key] = summarise([run[key] for run in runs])
+        elif value is None:
+            summary[key] = None
+        else:
+            summary[key] = round(statistics.median(run[key] for run in runs), 3)
+    return summary
+
+
+def main():
+    """Measure every mode, or run one measurement when started with --child."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Fresh processes per mode (the median is reported)')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    results = OrderedDict()
+    for mode in MODES:
+        results[mode] = summarise([measure(mode) for _ in range(args.runs)])
+
+    print(f'{"mode":<8} {"boot s":>7} '
+          + ' '.join(f'{path:>17}' for _, path, _ in REQUESTS)
+          + f' {"RSS MB":>7} {"USS MB":>7} {"PSS MB":>7}')
+    for mode, result in results.items():
+        requests = ' '.join(f'{result["first_request_ms"][path]:>14} ms'
+                            for _, path, _ in REQUESTS)
+        memory = ' '.join(f'{result[key]:>7}' if result[key] is not None
+                          else f'{"-":>7}' for key in ('rss_mb', 'uss_mb', 'pss_mb'))
+        print(f'{mode:<8} {result["boot_seconds"]:>7} {requests} {memory}')
+    print(f'\nlazy: analytics stack loaded on first use in '
+          f'{results["lazy"]["deferred_seconds"]} s')
+    print(f'preload: master import {results["preload"]["master_seconds"]} s, '
+          f'paid once for all workers')
+
+    costs = import_costs()
+    print('\nimport cost by package (cumulative, first import):')
+    for name, seconds in costs.items():
+        if seconds >= 0.005:
+            print(f'  {name:<24} {seconds:>7.3f} s')
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs,
+                       'modes': results, 'import_seconds': costs}, f, indent=2)
+        print(f'\nSaved {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+# gunicorn settings: gunicorn -c gunicorn.conf.py -w 4 app:app
+#
+# app.py imports matplotlib, reportlab and scikit-learn on first use so that a
+# worker boots in well under a second. With preload_app the master imports the
+# app once and, unless PRELOAD_ANALYTICS=0, the heavy stack as well; forked
+# workers then share those pages copy-on-write instead of each paying the
+# import time and memory on their first upload.
+import os
+
+preload_app = True
+
+
+def when_ready(server):
+    """Import the analytics stack in the master before the workers fork."""
+    if os.environ.get('PRELOAD_ANALYTICS', '1') == '0':
+        return
+    import app
+    app.preload_analytics()
+    server.log.info('Preloaded analytics modules: %s', ', '.join(app.ANALYTICS_MODULES))
@@ -1,4 +1,29 @@
 $(document).ready(function() {
+    // Dataset analysed in this tab; sent with every request so tabs stay independent
+    let currentDatasetId = null;
+
+    // Charts currently shown (image URLs and date view) and their Chart.js instances
+    let currentCharts = null;
+    let currentView = null;
+    const chartInstances = {};
+    const chartKeys = {
+        'churn-distribution': 'churn_distribution',
+        'tenure-chart': 'tenure_vs_churn',
+        'charges-chart': 'charges_vs_churn',
+        'contract-chart': 'contract_vs_churn',
+        'feature-importance-chart': 'feature_importance',
+        'churn-over-time': 'churn_over_time'
+    };
+
+    // Draw charts in the browser from /chart_data unless server images were chosen
+    $('#client-charts').prop('checked', typeof Chart !== 'undefined' && localStorage.getItem('chartMode') !== 'images');
+    $('#client-charts').change(function() {
+        localStorage.setItem('chartMode', this.checked ? 'client' : 'images');
+        if (currentCharts) {
+            updateCharts(currentCharts, currentView);
+        }
+    });
+
     // Initialize datepickers for month and year selection
     $('#filter-month').datepicker({
         format: 'mm',
@@ -79,7 +104,7 @@ $(document).ready(function() {
         `);
 
         // Log payload for debugging
-        const payload = { query: message, current_revenue: currentRevenue };
+        const payload = { query: message, current_revenue: currentRevenue, dataset_id: currentDatasetId };
         console.log('Chat AJAX Payload:', payload);
 
         $.ajax({
@@ -161,9 +186,18 @@ $(document).ready(function() {
             currentRevenue = parseFloat(currentRevenue);
         }
 
+        if (fileInput.files.length > 1) {
+            uploadBatch(fileInput.files, currentRevenue);
+            return;
+        }
+
         const formData = new FormData();
         formData.append('file', file);
         formData.append('current_revenue', currentRevenue);
+        if ($('#appendUpload').is(':checked') && currentDatasetId) {
+            formData.append('mode', 'append');
+            formData.append('dataset_id', currentDatasetId);
+        }
 
         $('#upload-status').html(`
             <div class="alert alert-info fade-in">
@@ -182,129 +216,504 @@ $(document).ready(function() {
             data: formData,
             processData: false,
             contentType: false,
+            success: function(response) {
+                if (response.success && response.job_id) {
+                    pollJob(response.job_id, function(result) {
+                        showAnalysis(result, currentRevenue);
+                    }, showPartialAnalysis);
+                } else {
+                    showAnalysis(response, currentRevenue);
+                }
+            },
+            error: function(xhr) {
+                $('#upload-status').html(`
+                    <div class="alert alert-${xhr.status === 429 ? 'warning' : 'danger'} fade-in">
+                        ${busyMessage(xhr) || 'Server error. Please ensure the server is running and try again.'}
+                    </div>
+                `);
+                console.error('File upload error:', xhr.responseText);
+            }
+        });
+    });
+
+    // Analyse several files in parallel and show them side by side
+    function uploadBatch(files, currentRevenue) {
+        const formData = new FormData();
+        for (const file of files) {
+            formData.append('files', file);
+        }
+        formData.append('current_revenue', currentRevenue);
+
+        $('#upload-status').html(`
+            <div class="alert alert-info fade-in">
+                <div class="loading">
+                    <span></span>
+                    <span></span>
+                    <span></span>
+                </div>
+                <div class="mt-2">Analyzing ${files.length} files...</div>
+            </div>
+        `);
+
+        $.ajax({
+            url: '/upload_batch',
+            type: 'POST',
+            data: formData,
+            processData: false,
+            contentType: false,
             success: function(response) {
                 if (response.success) {
+                    pollBatch(response.job_id);
+                } else {
                     $('#upload-status').html(`
-                        <div class="alert alert-success fade-in">
-                            Analysis complete! View insights below.
+                        <div class="alert alert-danger fade-in">
+                            ${response.error}
                         </div>
                     `);
-                    // Show all sections
-                    $('#data-summary-section').fadeIn();
-                    $('#date-filter-section').fadeIn();
-                    $('#chatbot-section').fadeIn();
-                    $('#download-report-section').fadeIn();
-                    $('#segmentation-section').fadeIn();
-                    $('#retention-simulator-section').fadeIn();
-                    $('#insights').fadeIn();
-
-                    // Update summary metrics
-                    $('#total-customers').text(response.data_info.rows);
-                    $('#total-columns').text(response.data_info.columns);
-                    $('#total-missing').text(response.data_info.missing_values);
-                    $('#data-quality').text(response.data_info.data_quality_score.toFixed(2) + '%');
-
-                    // Update insights
-                    if (response.insights) {
-                        $('#churn-rate').text((response.insights.churn_rate * 100).toFixed(2) + '%');
-                        $('#model-accuracy').text((response.insights.model_accuracy * 100).toFixed(2) + '%');
-                        if (response.insights.potential_monthly_loss !== null) {
-                            $('#monthly-loss').text('₹' + response.insights.potential_monthly_loss.toFixed(2));
-                            $('#yearly-loss').text('₹' + response.insights.potential_yearly_loss.toFixed(2));
+                }
+            },
+            error: function(xhr) {
+                $('#upload-status').html(`
+                    <div class="alert alert-${xhr.status === 429 ? 'warning' : 'danger'} fade-in">
+                        ${busyMessage(xhr) || 'Server error. Please ensure the server is running and try again.'}
+                    </div>
+                `);
+                console.error('Batch upload error:', xhr.responseText);
+            }
+        });
+    }
+
+    function pollBatch(jobId) {
+        $.ajax({
+            url: `/jobs/${jobId}`,
+            type: 'GET',
+            success: function(job) {
+                if (job.status === 'completed' || job.status === 'failed') {
+                    showComparison(job.result);
+                    return;
+                }
+                const done = job.stages.filter(stage => stage.status !== 'pending').length;
+                $('#upload-status .mt-2').text(`Analyzed ${done} of ${job.stages.length} files...`);
+                setTimeout(function() { pollBatch(jobId); }, 1000);
+            },
+            error: function(xhr) {
+                $('#upload-status').html(`
+                    <div class="alert alert-danger fade-in">
+                        Lost track of the batch analysis. Please upload the files again.
+                    </div>
+                `);
+                console.error('Job status error:', xhr.responseText);
+            }
+        });
+    }
+
+    function showComparison(result) {
+        const rows = result.datasets.map(dataset => dataset.success ? `
+            <tr>
+                <td>${dataset.name}</td>
+                <td>${dataset.rows}</td>
+                <td>${(dataset.churn_rate * 100).toFixed(2)}%</td>
+                <td>${(dataset.model_accuracy * 100).toFixed(2)}%</td>
+                <td>${dataset.top_features.join(', ')}</td>
+                <td>₹${dataset.monthly_revenue_at_risk.toFixed(2)}</td>
+            </tr>` : `
+            <tr>
+                <td>${dataset.name}</td>
+                <td colspan="5" class="text-danger">${dataset.error}</td>
+            </tr>`).join('');
+        $('#upload-status').html(`
+            <div class="alert ${result.success ? 'alert-success' : 'alert-danger'} fade-in">
+                Compared ${result.summary.analysed} datasets in ${result.seconds.toFixed(1)}s.
+            </div>
+            <div class="table-responsive fade-in">
+                <table class="table table-sm">
+                    <thead>
+                        <tr>
+                            <th>File</th><th>Customers</th><th>Churn Rate</th><th>Accuracy</th>
+                            <th>Top Factors</th><th>Monthly Revenue at Risk</th>
+                        </tr>
+                    </thead>
+                    <tbody>${rows}</tbody>
+                </table>
+            </div>
+        `);
+    }
+
+    // The server's message when it is too busy to start another analysis (429)
+    function busyMessage(xhr) {
+        if (xhr.status !== 429) {
+            return null;
+        }
+        const retryAfter = xhr.getResponseHeader('Retry-After');
+        return (xhr.responseJSON && xhr.responseJSON.error)
+            || `The server is busy with other analyses. Please try again in ${retryAfter} seconds.`;
+    }
+
+    // Expected loss and 5th-95th percentile band of a revenue projection
+    function projectionSummary(projection) {
+        if (!projection) {
+            return '';
+        }
+        return `<br>Projected loss over ${projection.months} months: ₹${projection.expected_loss.toFixed(2)}
+                (₹${projection.percentiles.p5.toFixed(2)} to ₹${projection.percentiles.p95.toFixed(2)}
+                in 90% of ${projection.scenarios} scenarios)<br>
+                Monthly Revenue after ${projection.months} months: ₹${projection.monthly_revenue_at_end.toFixed(2)}`;
+    }
+
+    // Accuracy and training time of each model engine, side by side
+    function engineSummary(engines) {
+        if (!engines || engines.length < 2) {
+            return '';
+        }
+        return engines.map(engine =>
+            `${engine.engine.replace(/_/g, ' ')}: ${(engine.accuracy * 100).toFixed(2)}% in ${engine.seconds.toFixed(1)}s` +
+            (engine.selected ? ' (in use)' : '')
+        ).join('<br>');
+    }
+
+    // Poll a background analysis job until it finishes, showing stage progress
+    // and handing each preliminary result of a progressive analysis to onPartial
+    function pollJob(jobId, onDone, onPartial, shownPartial) {
+        const stageLabels = {
+            preview: 'Sampling the file',
+            clean: 'Cleaning data',
+            sample: 'Training on a sample',
+            drift: 'Checking for drift',
+            train: 'Training model',
+            importance: 'Ranking churn factors',
+            charts: 'Rendering charts'
+        };
+        $.ajax({
+            url: `/jobs/${jobId}`,
+            type: 'GET',
+            success: function(job) {
+                if (job.status === 'completed' || job.status === 'failed') {
+                    onDone(job.result);
+                    return;
+                }
+                if (onPartial && job.partial && job.partial.dataset_id !== shownPartial) {
+                    shownPartial = job.partial.dataset_id;
+                    onPartial(job.partial);
+                }
+                if (job.stage) {
+                    const stageNumber = job.stages.findIndex(stage => stage.name === job.stage) + 1;
+                    $('#upload-status .mt-2').text(
+                        `${stageLabels[job.stage] || job.stage}... (step ${stageNumber} of ${job.stages.length})`
+                    );
+                }
+                setTimeout(function() { pollJob(jobId, onDone, onPartial, shownPartial); }, 1000);
+            },
+            error: function(xhr) {
+                $('#upload-status').html(`
+                    <div class="alert alert-danger fade-in">
+                        Lost track of the analysis job. Please upload the file again.
+                    </div>
+                `);
+                console.error('Job status error:', xhr.responseText);
+            }
+        });
+    }
+
+    // What a preliminary result of a progressive analysis is based on
+    function progressiveNote(progressive) {
+        if (progressive.stage === 'preview') {
+            return `Preliminary results from ${progressive.rows} of about ${progressive.estimated_rows} customers.`;
+        }
+        return `Churn rate and charts cover all ${progressive.rows} customers; ` +
+            `the model was trained on ${progressive.training_rows} of them.`;
+    }
+
+    // A KPI with its 95% interval when it was estimated from a sample
+    function withInterval(insights, key, format) {
+        const interval = insights.intervals && insights.intervals[key];
+        const value = format(insights[key]);
+        return interval ? `${value}<div class="small text-muted">${format(interval[0])} to ${format(interval[1])}</div>` : value;
+    }
+
+    // Sections that query the current dataset; hidden while results are preliminary
+    const interactiveSections = [
+        '#date-filter-section', '#chatbot-section', '#download-report-section',
+        '#segmentation-section', '#retention-simulator-section'
+    ];
+
+    // Render a preliminary result read-only: summary, KPIs and chart images.
+    // It never becomes the current dataset, so nothing can be asked of it.
+    function showPartialAnalysis(response) {
+        $('#upload-status').html(`
+            <div class="alert alert-info fade-in">
+                ${progressiveNote(response.progressive)} Refining in the background...
+                <div class="mt-2"></div>
+            </div>
+        `);
+        $(interactiveSections.join(', ')).hide();
+        $('#data-summary-section').fadeIn();
+        showSummary(response);
+        drawChartImages(response.charts);
+        $('#insights').fadeIn();
+    }
+
+    // Fill the summary metrics and KPIs of the dashboard
+    function showSummary(response) {
+        $('#total-customers').text(response.data_info.rows);
+        $('#total-columns').text(response.data_info.columns);
+        $('#total-missing').text(response.data_info.missing_values);
+        $('#data-quality').text(response.data_info.data_quality_score.toFixed(2) + '%');
+
+        if (response.insights) {
+            const insights = response.insights;
+            $('#churn-rate').html(withInterval(insights, 'churn_rate', value => (value * 100).toFixed(2) + '%'));
+            $('#model-accuracy').html(withInterval(insights, 'model_accuracy', value => (value * 100).toFixed(2) + '%'));
+            $('#model-engines').html(engineSummary(insights.engines));
+            if (insights.potential_monthly_loss !== null) {
+                $('#monthly-loss').html(withInterval(insights, 'potential_monthly_loss', value => '₹' + value.toFixed(2)));
+                $('#yearly-loss').html(withInterval(insights, 'potential_yearly_loss', value => '₹' + value.toFixed(2)));
+            } else {
+                $('#monthly-loss').text('₹0.00');
+                $('#yearly-loss').text('₹0.00');
+            }
+        }
+    }
+
+    // Render a finished analysis into the dashboard
+    function showAnalysis(response, currentRevenue) {
+        if (response.success) {
+            setCurrentDataset(response.dataset_id);
+            $('#upload-status').html(`
+                <div class="alert alert-success fade-in">
+                    Analysis complete! View insights below.
+                </div>
+            `);
+            // Show all sections
+            $('#data-summary-section').fadeIn();
+            $('#date-filter-section').fadeIn();
+            $('#chatbot-section').fadeIn();
+            $('#download-report-section').fadeIn();
+            $('#segmentation-section').fadeIn();
+            $('#retention-simulator-section').fadeIn();
+            $('#insights').fadeIn();
+
+            showSummary(response);
+            if (response.insights) {
+                updateCharts(response.charts, null);
+            }
+
+            // Predict revenue if provided
+            if (currentRevenue > 0) {
+                $.ajax({
+                    url: '/predict_revenue',
+                    type: 'POST',
+                    contentType: 'application/json',
+                    data: JSON.stringify({ current_revenue: currentRevenue, dataset_id: currentDatasetId }),
+                    success: function(revResponse) {
+                        if (revResponse.success) {
+                            $('#revenue-prediction').html(`
+                                <div class="alert alert-info fade-in">
+                                    Predicted Revenue Impact:<br>
+                                    Monthly Loss: ₹${revResponse.monthly_loss.toFixed(2)}<br>
+                                    Annual Loss: ₹${revResponse.yearly_loss.toFixed(2)}<br>
+                                    Future Revenue: ₹${revResponse.future_revenue.toFixed(2)}
+                                    ${projectionSummary(revResponse.projection)}
+                                </div>
+                            `);
                         } else {
-                            $('#monthly-loss').text('₹0.00');
-                            $('#yearly-loss').text('₹0.00');
+                            $('#revenue-prediction').html(`
+                                <div class="alert alert-danger fade-in">
+                                    ${revResponse.error}
+                                </div>
+                            `);
                         }
-                        updateCharts(response.charts);
-                    }
-
-                    // Predict revenue if provided
-                    if (currentRevenue > 0) {
-                        $.ajax({
-                            url: '/predict_revenue',
-                            type: 'POST',
-                            contentType: 'application/json',
-                            data: JSON.stringify({ current_revenue: currentRevenue }),
-                            success: function(revResponse) {
-                                if (revResponse.success) {
-                                    $('#revenue-prediction').html(`
-                                        <div class="alert alert-info fade-in">
-                                            Predicted Revenue Impact:<br>
-                                            Monthly Loss: ₹${revResponse.monthly_loss.toFixed(2)}<br>
-                                            Annual Loss: ₹${revResponse.yearly_loss.toFixed(2)}<br>
-                                            Future Revenue: ₹${revResponse.future_revenue.toFixed(2)}
-                                        </div>
-                                    `);
-                                } else {
-                                    $('#revenue-prediction').html(`
-                                        <div class="alert alert-danger fade-in">
-                                            ${revResponse.error}
-                                        </div>
-                                    `);
-                                }
-                            },
-                            error: function(xhr) {
-                                $('#revenue-prediction').html(`
-                                    <div class="alert alert-danger fade-in">
-                                        Error predicting revenue. Please try again.
-                                    </div>
-                                `);
-                                console.error('Revenue prediction error:', xhr.responseText);
-                            }
-                        });
+                    },
+                    error: function(xhr) {
+                        $('#revenue-prediction').html(`
+                            <div class="alert alert-danger fade-in">
+                                Error predicting revenue. Please try again.
+                            </div>
+                        `);
+                        console.error('Revenue prediction error:', xhr.responseText);
                     }
+                });
+            }
 
-                    // Populate segmentation
-                    if (response.data_info.column_names.includes('contract')) {
-                        $.ajax({
-                            url: '/chat',
-                            type: 'POST',
-                            contentType: 'application/json',
-                            data: JSON.stringify({ query: 'Which customer segment has the highest churn?' }),
-                            success: function(segResponse) {
-                                $('#segmentation-content').html(`
-                                    <div class="alert alert-info fade-in">
-                                        ${segResponse.response.replace(/\n/g, '<br>')}
-                                    </div>
-                                `);
-                            },
-                            error: function(xhr) {
-                                $('#segmentation-content').html(`
-                                    <div class="alert alert-danger fade-in">
-                                        Error fetching segmentation data.
-                                    </div>
-                                `);
-                                console.error('Segmentation error:', xhr.responseText);
-                            }
-                        });
-                    }
-                } else {
-                    $('#upload-status').html(`
-                        <div class="alert alert-danger fade-in">
-                            ${response.error || 'Analysis failed. Please check your data.'}
-                        </div>
-                    `);
-                    if (response.warning) {
-                        $('#insights-warnings').append(`
-                            <div class="alert alert-warning fade-in">
-                                ${response.warning}
+            // Populate segmentation
+            if (response.data_info.column_names.includes('contract')) {
+                $.ajax({
+                    url: '/chat',
+                    type: 'POST',
+                    contentType: 'application/json',
+                    data: JSON.stringify({
+                        query: 'Which customer segment has the highest churn?',
+                        dataset_id: currentDatasetId
+                    }),
+                    success: function(segResponse) {
+                        $('#segmentation-content').html(`
+                            <div class="alert alert-info fade-in">
+                                ${segResponse.response.replace(/\n/g, '<br>')}
+                            </div>
+                        `);
+                    },
+                    error: function(xhr) {
+                        $('#segmentation-content').html(`
+                            <div class="alert alert-danger fade-in">
+                                Error fetching segmentation data.
                             </div>
                         `);
-                        $('#insights').fadeIn();
+                        console.error('Segmentation error:', xhr.responseText);
                     }
+                });
+            }
+        } else {
+            $('#upload-status').html(`
+                <div class="alert alert-danger fade-in">
+                    ${response.error || 'Analysis failed. Please check your data.'}
+                </div>
+            `);
+            if (response.warning) {
+                $('#insights-warnings').append(`
+                    <div class="alert alert-warning fade-in">
+                        ${response.warning}
+                    </div>
+                `);
+                $('#insights').fadeIn();
+            }
+        }
+    }
+
+    // Remember the active dataset and point the report link at it
+    function setCurrentDataset(datasetId) {
+        const changed = datasetId !== currentDatasetId;
+        currentDatasetId = datasetId;
+        $('#download-report-btn').attr('href', `/download_report?dataset_id=${datasetId}`);
+        if (changed) {
+            loadProfile();
+            loadSavedModels();
+        }
+    }
+
+    // Download the PDF report once its background build has finished
+    $('#download-report-btn').on('click', function(e) {
+        e.preventDefault();
+        const button = $(this);
+        if (button.hasClass('disabled')) {
+            return;
+        }
+        const label = button.html();
+        button.addClass('disabled').html('<i class="fas fa-spinner fa-spin me-2"></i>Preparing report...');
+        $('#download-report-status').empty();
+        function done(error) {
+            button.removeClass('disabled').html(label);
+            if (error) {
+                $('#download-report-status').html(`
+                    <div class="alert alert-danger fade-in">
+                        ${error}
+                    </div>
+                `);
+            }
+        }
+        (function checkReport() {
+            $.ajax({
+                url: '/report_status',
+                type: 'GET',
+                data: { dataset_id: currentDatasetId || '' },
+                success: function(response) {
+                    if (!response.success) {
+                        done(response.error || 'Error generating report. Please try again.');
+                    } else if (response.status === 'ready') {
+                        done();
+                        window.location = response.url;
+                    } else {
+                        setTimeout(checkReport, 1000);
+                    }
+                },
+                error: function(xhr) {
+                    done('Error generating report. Please try again.');
+                    console.error('Report status error:', xhr.responseText);
+                }
+            });
+        })();
+    });
+
+    // Fill the column profile table of the dataset summary
+    // List the analyses kept in the model registry, newest first
+    function loadSavedModels() {
+        $.ajax({
+            url: '/models',
+            type: 'GET',
+            success: function(response) {
+                if (!response.success || !response.models.length) {
+                    $('#saved-models').hide();
+                    return;
                 }
+                const options = response.models.map(model => {
+                    const name = (model.source && model.source.file) || model.model_id.slice(0, 12);
+                    const created = new Date(model.created_at * 1000).toLocaleString();
+                    const engine = (model.engine || 'random_forest').replace(/_/g, ' ');
+                    const label = `${name} (${created}, ${engine}, ${(model.model_accuracy * 100).toFixed(1)}% accuracy)` +
+                        (model.promoted ? ' - default' : '');
+                    return `<option value="${model.model_id}">${label}</option>`;
+                });
+                $('#savedModelSelect').html(options.join(''));
+                $('#saved-models').fadeIn();
+            },
+            error: function(xhr) {
+                console.error('Model list error:', xhr.responseText);
+            }
+        });
+    }
+
+    $('#loadModelBtn').click(function() {
+        const modelId = $('#savedModelSelect').val();
+        const currentRevenue = parseFloat($('#currentRevenue').val()) || 0;
+        $.ajax({
+            url: `/models/${modelId}/load`,
+            type: 'POST',
+            success: function(response) {
+                showAnalysis(response, currentRevenue);
             },
             error: function(xhr) {
                 $('#upload-status').html(`
                     <div class="alert alert-danger fade-in">
-                        Server error. Please ensure the server is running and try again.
+                        Could not open the saved analysis.
                     </div>
                 `);
-                console.error('File upload error:', xhr.responseText);
+                console.error('Model load error:', xhr.responseText);
             }
         });
     });
 
+    loadSavedModels();
+
+    function loadProfile() {
+        $.ajax({
+            url: '/profile',
+            type: 'GET',
+            data: { dataset_id: currentDatasetId },
+            success: function(response) {
+                if (!response.success) {
+                    $('#profile-table').hide();
+                    return;
+                }
+                const format = value => value === undefined ? '-' :
+                    (typeof value === 'number' ? Number(value.toFixed(2)).toLocaleString() : value);
+                const rows = response.profile.columns.map(column => `
+                    <tr>
+                        <td>${column.name}</td>
+                        <td>${column.dtype}</td>
+                        <td>${column.distinct}</td>
+                        <td>${format(column.imputed)}</td>
+                        <td>${format(column.min)}</td>
+                        <td>${format(column.median)}</td>
+                        <td>${format(column.max)}</td>
+                    </tr>
+                `);
+                $('#profile-table tbody').html(rows.join(''));
+                $('#profile-table').fadeIn();
+            },
+            error: function(xhr) {
+                console.error('Profile error:', xhr.responseText);
+            }
+        });
+    }
+
     // Handle date filter submission
     $('#dateFilterForm').submit(function(e) {
         e.preventDefault();
@@ -332,48 +741,23 @@ $(document).ready(function() {
             </div>
         `);
 
+        const retrain = $('#filter-retrain').is(':checked');
         $.ajax({
             url: '/filter_by_date',
             type: 'POST',
             contentType: 'application/json',
-            data: JSON.stringify({ month: month, year: year }),
+            data: JSON.stringify({ month: month, year: year, retrain: retrain, dataset_id: currentDatasetId }),
             success: function(response) {
-                if (response.success) {
-                    $('#upload-status').html(`
-                        <div class="alert alert-success fade-in">
-                            Date filter applied successfully!
-                        </div>
-                    `);
-                    $('#total-customers').text(response.data_info.rows);
-                    $('#total-columns').text(response.data_info.columns);
-                    $('#total-missing').text(response.data_info.missing_values);
-                    $('#data-quality').text(response.data_info.data_quality_score.toFixed(2) + '%');
-
-                    if (response.insights) {
-                        $('#churn-rate').text((response.insights.churn_rate * 100).toFixed(2) + '%');
-                        $('#model-accuracy').text((response.insights.model_accuracy * 100).toFixed(2) + '%');
-                        if (response.insights.potential_monthly_loss !== null) {
-                            $('#monthly-loss').text('₹' + response.insights.potential_monthly_loss.toFixed(2));
-                            $('#yearly-loss').text('₹' + response.insights.potential_yearly_loss.toFixed(2));
-                        } else {
-                            $('#monthly-loss').text('₹0.00');
-                            $('#yearly-loss').text('₹0.00');
-                        }
-                        updateCharts(response.charts);
-                    }
-                    $('#insights').fadeIn();
+                if (response.success && response.job_id) {
+                    pollJob(response.job_id, showFilterResult);
                 } else {
-                    $('#upload-status').html(`
-                        <div class="alert alert-danger fade-in">
-                            ${response.error || 'Failed to apply date filter.'}
-                        </div>
-                    `);
+                    showFilterResult(response);
                 }
             },
             error: function(xhr) {
                 $('#upload-status').html(`
-                    <div class="alert alert-danger fade-in">
-                        Error applying date filter. Please try again.
+                    <div class="alert alert-${xhr.status === 429 ? 'warning' : 'danger'} fade-in">
+                        ${busyMessage(xhr) || 'Error applying date filter. Please try again.'}
                     </div>
                 `);
                 console.error('Date filter error:', xhr.responseText);
@@ -381,6 +765,43 @@ $(document).ready(function() {
         });
     });
 
+    // Render a date-filtered view (from the date cube or a retrained model)
+    function showFilterResult(response) {
+        if (response.success) {
+            setCurrentDataset(response.dataset_id);
+            $('#upload-status').html(`
+                <div class="alert alert-success fade-in">
+                    Date filter applied successfully!
+                </div>
+            `);
+            $('#total-customers').text(response.data_info.rows);
+            $('#total-columns').text(response.data_info.columns);
+            $('#total-missing').text(response.data_info.missing_values);
+            $('#data-quality').text(response.data_info.data_quality_score.toFixed(2) + '%');
+
+            if (response.insights) {
+                $('#churn-rate').text((response.insights.churn_rate * 100).toFixed(2) + '%');
+                $('#model-accuracy').text((response.insights.model_accuracy * 100).toFixed(2) + '%');
+                $('#model-engines').html(engineSummary(response.insights.engines));
+                if (response.insights.potential_monthly_loss !== null) {
+                    $('#monthly-loss').text('₹' + response.insights.potential_monthly_loss.toFixed(2));
+                    $('#yearly-loss').text('₹' + response.insights.potential_yearly_loss.toFixed(2));
+                } else {
+                    $('#monthly-loss').text('₹0.00');
+                    $('#yearly-loss').text('₹0.00');
+                }
+                updateCharts(response.charts, response.view);
+            }
+            $('#insights').fadeIn();
+        } else {
+            $('#upload-status').html(`
+                <div class="alert alert-danger fade-in">
+                    ${response.error || 'Failed to apply date filter.'}
+                </div>
+            `);
+        }
+    }
+
     // Handle retention strategy simulator
     $('#retentionSimulatorForm').submit(function(e) {
         e.preventDefault();
@@ -426,7 +847,8 @@ $(document).ready(function() {
             url: '/predict_revenue',
             type: 'POST',
             contentType: 'application/json',
-            data: JSON.stringify({ current_revenue: currentRevenue }),
+            data: JSON.stringify({ current_revenue: currentRevenue, dataset_id: currentDatasetId,
+                                   churn_reduction: parseFloat(churnReduction) }),
             success: function(response) {
                 if (response.success) {
                     const reducedChurnRate = response.monthly_loss * (1 - churnReduction / 100);
@@ -436,6 +858,7 @@ $(document).ready(function() {
                             With ${churnReduction}% churn reduction:<br>
                             Monthly Loss: ₹${reducedChurnRate.toFixed(2)}<br>
                             Annual Loss: ₹${reducedYearlyLoss.toFixed(2)}
+                            ${projectionSummary(response.projection)}
                         </div>
                     `);
                 } else {
@@ -458,24 +881,25 @@ $(document).ready(function() {
     });
 
     // Update charts and verify visibility
-    function updateCharts(charts) {
-        const chartIds = [
-            'churn-distribution', 'tenure-chart', 'charges-chart',
-            'contract-chart', 'feature-importance-chart', 'churn-over-time'
-        ];
-        chartIds.forEach(id => {
+    function updateCharts(charts, view) {
+        currentCharts = charts;
+        currentView = view || null;
+        if ($('#client-charts').is(':checked')) {
+            loadChartData(currentView);
+            return;
+        }
+        drawChartImages(charts);
+        $('#insights').fadeIn();
+    }
+
+    // Show the server-rendered chart images
+    function drawChartImages(charts) {
+        destroyChartInstances();
+        Object.entries(chartKeys).forEach(([id, chartKey]) => {
             const container = $(`#${id}`);
-            const chartKey = id === 'churn-distribution' ? 'churn_distribution' :
-                            id === 'tenure-chart' ? 'tenure_vs_churn' :
-                            id === 'charges-chart' ? 'charges_vs_churn' :
-                            id === 'contract-chart' ? 'contract_vs_churn' :
-                            id === 'feature-importance-chart' ? 'feature_importance' :
-                            'churn_over_time';
-            
             if (charts && charts[chartKey]) {
-                const imgSrc = `data:image/png;base64,${charts[chartKey]}`;
                 container.html(`
-                    <img src="${imgSrc}" class="img-fluid fade-in" alt="${id.replace('-', ' ')}">
+                    <img src="${charts[chartKey]}" class="img-fluid fade-in" alt="${id.replace('-', ' ')}">
                 `);
                 // Verify image load
                 container.find('img').on('error', function() {
@@ -495,9 +919,135 @@ $(document).ready(function() {
                 `);
             }
         });
+    }
+
+    function destroyChartInstances() {
+        Object.keys(chartInstances).forEach(id => {
+            chartInstances[id].destroy();
+            delete chartInstances[id];
+        });
+    }
+
+    // Fetch the chart aggregates and draw them with Chart.js, falling back to images
+    function loadChartData(view) {
+        const params = { dataset_id: currentDatasetId };
+        if (view) {
+            params.start = view.start;
+            params.end = view.end;
+        }
+        $.ajax({
+            url: '/chart_data',
+            type: 'GET',
+            data: params,
+            success: function(response) {
+                if (response.success) {
+                    drawChartData(response.charts);
+                } else {
+                    console.warn('Chart data unavailable:', response.error);
+                    $('#client-charts').prop('checked', false);
+                    updateCharts(currentCharts, currentView);
+                }
+            },
+            error: function(xhr) {
+                console.error('Chart data error:', xhr.responseText);
+                $('#client-charts').prop('checked', false);
+                updateCharts(currentCharts, currentView);
+            }
+        });
+    }
+
+    function drawChartData(data) {
+        destroyChartInstances();
+        Object.entries(chartKeys).forEach(([id, chartKey]) => {
+            const container = $(`#${id}`);
+            if (!data[chartKey]) {
+                container.html(`
+                    <div class="alert alert-warning fade-in">
+                        Chart data unavailable for ${id.replace('-', ' ')}.
+                    </div>
+                `);
+                return;
+            }
+            container.html('<canvas class="fade-in"></canvas>');
+            chartInstances[id] = new Chart(container.find('canvas')[0], chartConfig(chartKey, data[chartKey]));
+        });
         $('#insights').fadeIn();
     }
 
+    // Chart.js configuration matching the server-rendered charts
+    function chartConfig(chartKey, d) {
+        const retained = '#4CAF50';
+        const churned = '#F44336';
+        const axis = text => ({ title: { display: true, text: text, font: { weight: 'bold' } } });
+        switch (chartKey) {
+            case 'churn_distribution':
+                return {
+                    type: 'pie',
+                    data: { labels: d.labels, datasets: [{ data: d.values, backgroundColor: [retained, churned] }] }
+                };
+            case 'tenure_vs_churn':
+                return {
+                    type: 'bar',
+                    data: {
+                        labels: d.edges.slice(0, -1).map((edge, i) => `${Math.round(edge)}-${Math.round(d.edges[i + 1])}`),
+                        datasets: [
+                            { label: 'Retained', data: d.retained, backgroundColor: retained },
+                            { label: 'Churned', data: d.churned, backgroundColor: churned }
+                        ]
+                    },
+                    options: { scales: { x: { stacked: true, ...axis('Tenure (Months)') }, y: { stacked: true, ...axis('Count') } } }
+                };
+            case 'charges_vs_churn':
+                return {
+                    type: 'line',
+                    data: {
+                        labels: d.grid.map(value => value.toFixed(0)),
+                        datasets: [
+                            { label: 'Retained', data: d.retained, borderColor: retained, backgroundColor: 'rgba(76, 175, 80, 0.4)', fill: 'origin', pointRadius: 0 },
+                            { label: 'Churned', data: d.churned, borderColor: churned, backgroundColor: 'rgba(244, 67, 54, 0.4)', fill: 'origin', pointRadius: 0 }
+                        ]
+                    },
+                    options: { scales: { x: { ticks: { maxTicksLimit: 10 }, ...axis('Monthly Charges') }, y: axis('Density') } }
+                };
+            case 'contract_vs_churn':
+                return {
+                    type: 'bar',
+                    data: {
+                        labels: d.labels,
+                        datasets: [
+                            { label: 'Retained', data: d.retained, backgroundColor: retained },
+                            { label: 'Churned', data: d.churned, backgroundColor: churned }
+                        ]
+                    },
+                    options: { scales: { x: axis('Contract Type'), y: axis('Count') } }
+                };
+            case 'feature_importance':
+                return {
+                    type: 'bar',
+                    data: { labels: d.features, datasets: [{ label: 'Importance', data: d.importance, backgroundColor: '#4B5EAA' }] },
+                    options: { indexAxis: 'y', plugins: { legend: { display: false } }, scales: { x: axis('Feature Importance') } }
+                };
+            default:
+                return {
+                    type: 'line',
+                    data: {
+                        labels: d.labels,
+                        datasets: [
+                            { label: 'Churn Rate (%)', data: d.churn_rate, borderColor: '#D32F2F', yAxisID: 'y' },
+                            { label: 'Revenue Loss (₹)', data: d.revenue_loss, borderColor: '#1976D2', pointStyle: 'rect', yAxisID: 'y1' }
+                        ]
+                    },
+                    options: {
+                        scales: {
+                            x: axis('Tenure Range'),
+                            y: { position: 'left', ...axis('Churn Rate (%)') },
+                            y1: { position: 'right', grid: { drawOnChartArea: false }, ...axis('Revenue Loss (₹)') }
+                        }
+                    }
+                };
+        }
+    }
+
     // Back to top button visibility
     $(window).scroll(function() {
         if ($(this).scrollTop() > 300) {
@@ -0,0 +1,87 @@
+"""Shared test setup: app state in a scratch directory and small sample data.
+
+app.py keeps its store, jobs and logs under ./tmp, so the tests run from
+a temporary directory of their own. Training is kept short with the
+gradient-boosting engine alone and a small importance budget.
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='churn-tests-')
+os.makedirs(os.path.join(WORKDIR, 'tmp'))
+os.chdir(WORKDIR)
+for name, value in {'MODEL_ENGINE': 'hist_gradient_boosting', 'MODEL_COMPARE': '0',
+                    'JOB_WORKERS': '2', 'JOB_THREADS': '1', 'COMPUTE_CORES': '2',
+                    'CHART_WORKERS': '1', 'IMPORTANCE_MAX_SECONDS': '2',
+                    'PROJECTION_SCENARIOS': '500'}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+import pytest
+
+SAMPLE_ROWS = 1500
+JOB_TIMEOUT = 120
+
+
+def sample_path(number):
+    """Path of one of the Sample_dataset CSVs shipped with the repo."""
+    return os.path.join(ROOT, f'Sample_dataset{number}.csv')
+
+
+@pytest.fixture(scope='session')
+def small_csv(tmp_path_factory):
+    """The first SAMPLE_ROWS customers of Sample_dataset1.csv."""
+    path = tmp_path_factory.mktemp('data') / 'small.csv'
+    pd.read_csv(sample_path(1), nrows=SAMPLE_ROWS).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def background_work():
+    """Wait for jobs, report builds and renders before pytest restores the cwd."""
+    yield
+    import app
+    for executor in (app._job_executor, app._report_executor, app._chart_executor):
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def client():
+    """A Flask test client with a session of its own."""
+    from app import app
+    return app.test_client()
+
+
+def wait_for_job(client, job_id, timeout=JOB_TIMEOUT):
+    """Poll /jobs/<job_id> until the job has finished; return its record."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f'Job {job_id} did not finish in {timeout}s')
+
+
+def upload(client, path, **form):
+    """POST a CSV to /upload with extra form fields."""
+    with open(path, 'rb') as f:
+        return client.post('/upload', data={'file': (f, os.path.basename(path)),
+                                            **form})
+
+
+
+@pytest.fixture(scope='session')
+def analysed(small_csv):
+    """Dataset id of small_csv, uploaded and analysed once for the session."""
+    from app import app
+    client = app.test_client()
+    response = upload(client, small_csv, current_revenue='10000')
+    job = wait_for_job(client, response.get_json()['job_id'])
+    assert job['status'] == 'completed', job
+    return job['result']['dataset_id']
@@ -0,0 +1,102 @@
+"""Appending customers to a stored dataset: merged summaries, warm start, drift."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as dashboard
+from app import (PIPELINE_STAGES, AnalysisError, StreamingCleaner, analysis_store,
+                 append_dataset, analyse_dataset, compute_aggregates,
+                 compute_segment_cube, create_job, encode_churn, population_stability)
+from conftest import sample_path, upload, wait_for_job
+
+PARENT_ROWS = 1200
+
+
+def cleaned(tmp_path, name, frame):
+    path = tmp_path / f'{name}.csv'
+    frame.to_csv(path, index=False)
+    return StreamingCleaner(str(tmp_path / f'{name}.spool')).clean(str(path))
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return pd.read_csv(sample_path(3), nrows=1500)
+
+
+@pytest.fixture(scope='module')
+def parent(rows, tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(dashboard, 'MODEL_ENGINE', 'random_forest')
+        patch.setattr(dashboard, 'PARAM_GRID', {'n_estimators': [30], 'max_depth': [8]})
+        tmp_path = tmp_path_factory.mktemp('parent')
+        df, profile = cleaned(tmp_path, 'parent', rows.iloc[:PARENT_ROWS])
+        job = create_job('analysis', PIPELINE_STAGES)
+        analyse_dataset(job['job_id'], df, profile, 'a' * 64, 0)
+    return 'a' * 64
+
+
+def append(tmp_path, parent, frame, dataset_id):
+    df, profile = cleaned(tmp_path, 'slice', frame)
+    job = create_job('append', dashboard.APPEND_STAGES)
+    append_dataset(job['job_id'], df, profile, parent, dataset_id, 0)
+    return analysis_store.load_analysis(dataset_id)
+
+
+def test_summaries_match_the_combined_rows(rows, parent, tmp_path):
+    child = append(tmp_path, parent, rows.iloc[PARENT_ROWS:], 'b' * 64)
+    data = analysis_store.load_data('b' * 64)
+    assert child['appended_to'] == parent
+    assert child['churn_rate'] == pytest.approx(
+        encode_churn(data[child['is_churn']]).mean())
+    np.testing.assert_allclose(
+        analysis_store.load_array('b' * 64, 'aggregates'),
+        compute_aggregates(data, child['chart_layout'])[0])
+    np.testing.assert_allclose(
+        analysis_store.load_array('b' * 64, 'segments'),
+        compute_segment_cube(data, child['segment_layout']))
+    assert child['profile']['source_rows'] == 1500
+
+
+def test_similar_customers_grow_the_forest(rows, parent, tmp_path):
+    child = append(tmp_path, parent, rows.iloc[PARENT_ROWS:], 'c' * 64)
+    assert not child['drift']['retrain']
+    assert child['training']['strategy'] == 'warm_start'
+    assert child['training']['n_estimators'] == 30 + child['training']['trees_added']
+    model = analysis_store.load_pipeline('c' * 64)['model']
+    assert len(model.estimators_) == child['training']['n_estimators']
+    assert len(analysis_store.load_pipeline(parent)['model'].estimators_) == 30
+
+
+def test_drifted_customers_retrain(rows, parent, tmp_path):
+    shifted = rows.iloc[PARENT_ROWS:].assign(
+        monthlyCharges=lambda df: df['monthlyCharges'] * 3)
+    child = append(tmp_path, parent, shifted, 'd' * 64)
+    drift = child['drift']
+    assert drift['retrain']
+    assert drift['psi']['monthlycharges'] > dashboard.DRIFT_PSI_THRESHOLD
+    assert drift['reasons'][0].startswith('Feature drift')
+    assert child['training']['strategy'] != 'warm_start'
+
+
+def test_columns_must_match(rows, parent, tmp_path):
+    frame = rows.iloc[PARENT_ROWS:].drop(columns=['gender']).assign(region='north')
+    with pytest.raises(AnalysisError, match='Columns differ from the current dataset: '
+                                            'missing gender; unexpected region'):
+        append(tmp_path, parent, frame, 'e' * 64)
+
+
+def test_population_stability():
+    assert population_stability([10, 20, 30], [1, 2, 3]) == 0
+    assert population_stability([50, 50], [90, 10]) == pytest.approx(
+        0.4 * np.log(0.9 / 0.5) - 0.4 * np.log(0.1 / 0.5))
+
+
+def test_append_upload_retrains_other_engines(client, analysed, tmp_path):
+    path = tmp_path / 'more.csv'
+    pd.read_csv(sample_path(1), skiprows=range(1, 3001), nrows=400).to_csv(
+        path, index=False)
+    job = upload(client, str(path), dataset_id=analysed, mode='append').get_json()
+    result = wait_for_job(client, job['job_id'])['result']
+    assert result['success'], result
+    assert 'Only random forests can be grown' in result['drift']['reasons'][-1]
+    assert result['dataset_id'] != analysed
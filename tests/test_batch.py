@@ -0,0 +1,99 @@
+"""Batch uploads analysed in parallel and compared side by side."""
+import pandas as pd
+import pytest
+
+from app import compare_analyses
+from conftest import sample_path, upload, wait_for_job
+
+
+def dashboard_response(dataset_id, churn_rate, accuracy, features, revenue):
+    return {'success': True, 'dataset_id': dataset_id, 'data_info': {'rows': 100},
+            'insights': {'churn_rate': churn_rate, 'model_accuracy': accuracy,
+                         'feature_importance': [{'Feature': f} for f in features],
+                         'potential_monthly_loss': revenue * churn_rate,
+                         'potential_yearly_loss': revenue * churn_rate * 12}}
+
+
+def post_batch(client, paths, revenues):
+    files = [(open(path, 'rb'), path.name) for path in paths]
+    try:
+        return client.post('/upload_batch', data={'files': files,
+                                                  'current_revenue': revenues})
+    finally:
+        for f, _ in files:
+            f.close()
+
+
+@pytest.fixture
+def batch_files(small_csv, tmp_path):
+    cached = tmp_path / 'january.csv'
+    cached.write_bytes(open(small_csv, 'rb').read())
+    fresh = tmp_path / 'february.csv'
+    pd.read_csv(sample_path(4), nrows=800).to_csv(fresh, index=False)
+    broken = tmp_path / 'march.csv'
+    pd.read_csv(sample_path(4), nrows=800).drop(columns=['churn']).to_csv(
+        broken, index=False)
+    return [cached, fresh, broken]
+
+
+def test_compare_analyses_ranks_the_datasets():
+    result = compare_analyses([
+        ('a.csv', 1000, dashboard_response('a', 0.2, 0.8, ['tenure', 'contract',
+                                                            'gender'], 1000)),
+        ('b.csv', 5000, {'success': False, 'error': 'Dataset too small'}),
+        ('c.csv', 5000, dashboard_response('c', 0.3, 0.7, ['contract', 'tenure',
+                                                            'partner'], 5000))
+    ])
+    assert result['success']
+    assert [entry['name'] for entry in result['datasets']] == ['a.csv', 'b.csv',
+                                                               'c.csv']
+    assert result['datasets'][1] == {'name': 'b.csv', 'success': False,
+                                     'dataset_id': None, 'error': 'Dataset too small'}
+    assert result['summary'] == {
+        'analysed': 2, 'failed': 1, 'highest_churn_rate': 'c.csv',
+        'lowest_model_accuracy': 'c.csv', 'most_revenue_at_risk': 'c.csv',
+        'total_monthly_revenue_at_risk': pytest.approx(1700),
+        'shared_top_features': ['tenure', 'contract']}
+
+
+def test_nothing_analysed_is_a_failure():
+    result = compare_analyses([('a.csv', 0, {'success': False})])
+    assert not result['success']
+    assert result['error'] == 'None of the files could be analysed'
+    assert result['datasets'][0]['error'] == 'Analysis failed'
+
+
+def test_batch_compares_every_file(client, analysed, batch_files):
+    response = post_batch(client, batch_files, ['100', '200', '300'])
+    assert response.status_code == 202
+    body = response.get_json()
+    assert [d['name'] for d in body['datasets']] == ['january.csv', 'february.csv',
+                                                     'march.csv']
+    assert body['datasets'][0] == {'name': 'january.csv', 'dataset_id': analysed,
+                                   'job_id': None}
+
+    job = wait_for_job(client, body['job_id'])
+    assert [stage['status'] for stage in job['stages']] == ['done', 'done', 'failed']
+    datasets = job['result']['datasets']
+    assert [d['current_revenue'] for d in datasets[:2]] == [100, 200]
+    assert datasets[2] == {'name': 'march.csv', 'success': False, 'dataset_id': None,
+                           'error': 'No Churn column found.'}
+    assert job['result']['summary']['analysed'] == 2
+
+    single = upload(client, str(batch_files[1]), current_revenue='200').get_json()
+    assert single['cached'] and single['dataset_id'] == datasets[1]['dataset_id']
+    assert single['insights']['churn_rate'] == datasets[1]['churn_rate']
+    assert single['insights']['model_accuracy'] == datasets[1]['model_accuracy']
+
+
+def test_revenues_must_match_the_files(client, batch_files):
+    body = post_batch(client, batch_files, ['1', '2']).get_json()
+    assert body == {'success': False, 'error': 'Give one current_revenue for all '
+                                               'files or one per file'}
+
+
+def test_only_csv_files(client, tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('hello')
+    body = post_batch(client, [path], ['1']).get_json()
+    assert body == {'success': False, 'error': 'Invalid file format: notes.txt'}
@@ -0,0 +1,95 @@
+"""The stage-by-stage pipeline benchmark and its regression check."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.pipeline import (STAGES, compare, parse_size, run_dataset,
+                                 synthetic_chunk, synthetic_file)
+from conftest import ROOT, sample_path
+
+SCRIPT = os.path.join(ROOT, 'benchmarks', 'pipeline.py')
+
+
+def thresholds(**overrides):
+    defaults = {'max_slowdown': 1.5, 'max_rss_growth': 1.3, 'min_seconds': 0.1,
+                'min_rss_mb': 25}
+    return argparse.Namespace(**{**defaults, **overrides})
+
+
+def timings(seconds, rss):
+    return {'results': {'data': {'stages': {'train': {'seconds': seconds,
+                                                      'peak_rss_mb': rss}}}}}
+
+
+@pytest.mark.parametrize('text, rows', [('10k', 10000), ('1m', 1000000),
+                                        ('2.5k', 2500), ('300', 300)])
+def test_parse_size(text, rows):
+    assert parse_size(text) == rows
+
+
+def test_synthetic_rows_have_the_sample_schema():
+    chunk = synthetic_chunk(np.random.default_rng(0), 0, 2000)
+    sample = pd.read_csv(sample_path(1), nrows=5)
+    assert list(chunk.columns) == list(sample.columns)
+    assert len(chunk) == 2000
+    assert 0.1 < chunk['churn'].mean() < 0.6
+
+
+def test_synthetic_files_are_reproducible():
+    first = pd.read_csv(synthetic_file(1200, seed=7))
+    os.remove(synthetic_file(1200, seed=7))
+    pd.testing.assert_frame_equal(first, pd.read_csv(synthetic_file(1200, seed=7)))
+
+
+def test_every_stage_is_timed():
+    result = run_dataset(synthetic_file(1500, seed=1), {'n_estimators': [20]},
+                         n_jobs=1, until=STAGES[-1])
+    assert list(result['stages']) == STAGES
+    assert result['rows'] == 1500
+    assert 0.5 < result['stages']['train']['accuracy'] <= 1
+    for timing in result['stages'].values():
+        assert timing['seconds'] >= 0 and timing['peak_rss_mb'] > 0
+
+
+@pytest.mark.parametrize('now, failing', [
+    (timings(1.0, 100), False),
+    (timings(1.6, 100), True),
+    (timings(0.14, 100), False),
+    (timings(1.0, 140), True),
+    (timings(1.0, 120), False)
+])
+def test_regressions_need_both_ratio_and_margin(now, failing):
+    baseline = timings(1.0, 100)
+    baseline['results']['data']['stages']['encode'] = {'seconds': 0.05,
+                                                       'peak_rss_mb': 10}
+    now['results']['other'] = now['results']['data']
+    if failing:
+        assert compare(baseline, now['results'], thresholds())
+    else:
+        assert compare(baseline, now['results'], thresholds()) == []
+
+
+def test_cli_saves_and_checks_a_baseline(tmp_path):
+    (tmp_path / 'tmp').mkdir()
+    saved = tmp_path / 'baseline.json'
+    command = [sys.executable, SCRIPT, '--no-samples', '--sizes', '1k',
+               '--until', 'encode', '--jobs', '1']
+    run = subprocess.run(command + ['--save', str(saved)], cwd=tmp_path,
+                         capture_output=True, text=True)
+    assert run.returncode == 0, run.stderr
+    baseline = json.loads(saved.read_text())
+    assert list(baseline['results']['synthetic_1000']['stages']) == STAGES[:3]
+
+    for stage in baseline['results']['synthetic_1000']['stages'].values():
+        stage['seconds'] = stage['seconds'] / 100 - 1
+    saved.write_text(json.dumps(baseline))
+    run = subprocess.run(command + ['--baseline', str(saved), '--min-seconds', '0'],
+                         cwd=tmp_path, capture_output=True, text=True)
+    assert run.returncode == 1
+    assert 'REGRESSIONS' in run.stdout
@@ -0,0 +1,28 @@
+"""Content-addressed analysis cache: identical uploads reuse the stored analysis."""
+import app as dashboard
+from conftest import upload
+
+
+def test_reupload_is_served_from_the_store(client, small_csv, analysed):
+    response = upload(client, small_csv, current_revenue='10000')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and body['cached']
+    assert body['dataset_id'] == analysed
+    assert 'job_id' not in body
+
+
+def test_cached_upload_becomes_the_session_dataset(client, small_csv, analysed):
+    upload(client, small_csv)
+    response = client.get('/profile')
+    assert response.get_json()['dataset_id'] == analysed
+
+
+def test_dataset_id_depends_on_content_and_training_settings(monkeypatch):
+    first = dashboard.compute_dataset_id('a' * 64)
+    assert dashboard.compute_dataset_id('a' * 64) == first
+    assert dashboard.compute_dataset_id('b' * 64) != first
+
+    monkeypatch.setattr(dashboard, 'TEST_SIZE', 0.3)
+    assert dashboard.compute_dataset_id('a' * 64) != first
@@ -0,0 +1,52 @@
+"""JSON chart-data API for rendering the charts in the browser."""
+import numpy as np
+import pytest
+
+from app import CHART_MAX_AGE, analysis_store, encode_churn
+
+
+@pytest.fixture(scope='module')
+def stored(analysed):
+    analysis = analysis_store.load_analysis(analysed)
+    df = analysis_store.load_data(analysed).copy()
+    df['churned'] = encode_churn(df[analysis['is_churn']]).astype(bool)
+    return analysed, analysis, df
+
+
+def test_chart_numbers_match_the_rows(client, stored):
+    dataset_id, analysis, df = stored
+    response = client.get('/chart_data', query_string={'dataset_id': dataset_id})
+    charts = response.get_json()['charts']
+
+    assert set(charts) == set(analysis['charts'])
+    churned = int(df['churned'].sum())
+    assert charts['churn_distribution']['values'] == [len(df) - churned, churned]
+
+    contract = charts['contract_vs_churn']
+    counts = df.groupby(['contract', 'churned'], observed=True).size()
+    for i, label in enumerate(contract['labels']):
+        assert contract['retained'][i] == counts.get((label, False), 0)
+        assert contract['churned'][i] == counts.get((label, True), 0)
+
+    tenure = charts['tenure_vs_churn']
+    assert sum(tenure['retained']) + sum(tenure['churned']) == len(df)
+    features = [item['Feature'] for item in analysis['feature_importance']]
+    assert charts['feature_importance']['features'] == features
+    assert response.cache_control.max_age == CHART_MAX_AGE
+
+
+def test_date_view_counts_only_its_period(client, stored):
+    dataset_id, analysis, df = stored
+    body = client.get('/chart_data', query_string={
+        'dataset_id': dataset_id, 'start': '2025-01-01',
+        'end': '2025-02-28'}).get_json()
+
+    dates = df[analysis['date_column']]
+    period = df[(dates >= np.datetime64('2025-01-01'))
+                & (dates < np.datetime64('2025-03-01'))]
+    churned = int(period['churned'].sum())
+    assert body['view'] == {'start': '2025-01-01', 'end': '2025-02-28'}
+    assert body['charts']['churn_distribution']['values'] == [len(period) - churned,
+                                                              churned]
+    assert 'feature_importance' in body['charts']
+
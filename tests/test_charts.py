@@ -0,0 +1,57 @@
+"""Chart images rendered in parallel, cached on disk and served as resources."""
+import os
+
+import pytest
+
+from app import CHART_MAX_AGE, analysis_store, chart_urls
+from conftest import upload
+
+
+@pytest.fixture(scope='module')
+def charts(analysed):
+    analysis = analysis_store.load_analysis(analysed)
+    return chart_urls(analysed, analysis['charts'])
+
+
+def test_analysis_lists_a_url_per_chart(client, small_csv, charts):
+    body = upload(client, small_csv).get_json()
+    assert body['charts'] == charts
+    assert set(charts) == {'churn_distribution', 'tenure_vs_churn', 'charges_vs_churn',
+                           'contract_vs_churn', 'feature_importance',
+                           'churn_over_time'}
+
+
+def test_chart_is_rendered_once_and_cached_for_good(client, analysed, charts):
+    response = client.get(charts['contract_vs_churn'])
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data.startswith(b'\x89PNG')
+    assert response.cache_control.max_age == CHART_MAX_AGE
+    assert response.cache_control.immutable and response.cache_control.public
+    path = analysis_store.chart_path(analysed, 'contract_vs_churn')
+    assert os.path.exists(path)
+
+    mtime = os.path.getmtime(path)
+    again = client.get(charts['contract_vs_churn'],
+                       headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+    assert os.path.getmtime(path) == mtime
+
+
+def test_date_view_charts_are_cached_apart(client, analysed):
+    url = chart_urls(analysed, ['churn_distribution'],
+                     {'start': '2025-03-01', 'end': '2025-03-31'})['churn_distribution']
+    response = client.get(url)
+
+    assert response.status_code == 200 and response.data.startswith(b'\x89PNG')
+    assert os.path.exists(analysis_store.chart_path(
+        analysed, 'churn_distribution', '2025-03-01_2025-03-31'))
+    assert response.data != client.get(
+        chart_urls(analysed, ['churn_distribution'])['churn_distribution']).data
+
+
+@pytest.mark.parametrize('chart', ['no_such_chart', '..'])
+def test_unknown_charts_are_404(client, analysed, chart):
+    assert client.get(f'/charts/{analysed}/{chart}.png').status_code == 404
+    assert client.get(f'/charts/not-a-dataset/{chart}.png').status_code == 404
@@ -0,0 +1,46 @@
+"""Date index and aggregate cube answering /filter_by_date without retraining."""
+import numpy as np
+import pytest
+
+from app import (aggregate_period, analysis_store, compute_aggregates, encode_churn,
+                 parse_period)
+
+
+@pytest.fixture(scope='module')
+def stored(analysed):
+    analysis = analysis_store.load_analysis(analysed)
+    df = analysis_store.load_data(analysed)
+    return analysed, analysis, df, df[analysis['date_column']]
+
+
+@pytest.mark.parametrize('period', [{'month': 3, 'year': 2025},
+                                    {'start': '2024-11-10', 'end': '2025-01-20'}])
+def test_cube_sums_match_the_rows_of_the_period(stored, period):
+    dataset_id, analysis, df, dates = stored
+    start, end = parse_period(period)
+    rows = df[(dates >= start) & (dates < end)]
+    assert len(rows)
+
+    expected = compute_aggregates(rows, analysis['chart_layout'])[0]
+    np.testing.assert_allclose(aggregate_period(dataset_id, start, end), expected)
+
+
+def test_filter_answers_from_the_cube(client, stored):
+    dataset_id, analysis, df, dates = stored
+    response = client.post('/filter_by_date', json={'dataset_id': dataset_id,
+                                                    'month': 3, 'year': 2025})
+    body = response.get_json()
+
+    rows = df[(dates.dt.year == 2025) & (dates.dt.month == 3)]
+    assert body['success'] and 'job_id' not in body
+    assert body['view'] == {'start': '2025-03-01', 'end': '2025-03-31'}
+    assert body['data_info']['rows'] == len(rows)
+    churn = encode_churn(rows[analysis['is_churn']]).mean()
+    assert body['insights']['churn_rate'] == pytest.approx(churn)
+    assert body['insights']['model_accuracy'] == analysis['model_accuracy']
+
+
+def test_empty_period_is_reported(client, analysed):
+    body = client.post('/filter_by_date', json={'dataset_id': analysed,
+                                                'month': 1, 'year': 1990}).get_json()
+    assert body == {'success': False, 'error': 'No data for selected date range'}
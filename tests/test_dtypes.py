@@ -0,0 +1,65 @@
+"""Cleaned datasets held in categorical and downcast dtypes."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import analysis_store, clean_data, compact_frame, compact_numbers
+from conftest import sample_path
+
+
+@pytest.mark.parametrize('values, dtype', [
+    (np.array([0, 1, 72], dtype=np.int64), np.int8),
+    (np.array([-5, 1000], dtype=np.int64), np.int16),
+    (np.array([29.5, np.nan, 0.25]), np.float32),
+    (np.array([29.85, 1889.5]), np.float64),
+    (np.array([1e40]), np.float64)
+])
+def test_compact_numbers_only_narrows_exactly(values, dtype):
+    compacted = compact_numbers(values)
+    assert compacted.dtype == dtype
+    np.testing.assert_array_equal(compacted.astype(values.dtype), values)
+
+
+def test_compact_frame_keeps_every_value():
+    df = pd.DataFrame({'contract': ['month-to-month', 'one year', None] * 100,
+                       'tenure': [1, 24, 72] * 100,
+                       'monthlycharges': [20.5, 70.25, np.nan] * 100,
+                       'churn': ['yes', 'no', 'no'] * 100})
+    original = df.copy()
+    compacted = compact_frame(df)
+
+    assert compacted['contract'].dtype == 'category'
+    assert compacted['churn'].dtype == bool
+    assert compacted['tenure'].dtype == np.int8
+    assert compacted['monthlycharges'].dtype == np.float32
+    pd.testing.assert_series_equal(compacted['contract'].astype(object),
+                                   original['contract'])
+    assert (compacted['churn'] == (original['churn'] == 'yes')).all()
+    pd.testing.assert_frame_equal(
+        compacted[['tenure', 'monthlycharges']].astype(np.float64),
+        original[['tenure', 'monthlycharges']].astype(np.float64))
+    assert (compacted.memory_usage(deep=True).sum()
+            < original.memory_usage(deep=True).sum() / 5)
+
+
+@pytest.mark.parametrize('number', range(1, 6))
+def test_cleaned_samples_are_compact(number):
+    raw = pd.read_csv(sample_path(number))
+    df, _ = clean_data(raw.copy())
+    text = [col for col in df.columns if df[col].dtype == object]
+    assert text == []
+    assert df.memory_usage(deep=True).sum() < raw.memory_usage(deep=True).sum() / 5
+
+
+def test_store_reloads_the_compact_frame(analysed, small_csv):
+    expected, _ = clean_data(pd.read_csv(small_csv))
+    stored = analysis_store.load_data(analysed)
+    for col in ['gender', 'contract', 'paymentmethod']:
+        assert stored[col].dtype == 'category'
+        assert stored[col].astype(str).tolist() == expected[col].astype(str).tolist()
+    assert stored['tenure'].dtype == expected['tenure'].dtype
+    np.testing.assert_array_equal(stored['monthlycharges'], expected['monthlycharges'])
+
+    profile = analysis_store.load_analysis(analysed)['profile']
+    assert profile['memory_bytes'] == sum(column['memory_bytes']
+                                          for column in profile['columns'])
@@ -0,0 +1,93 @@
+"""Selectable model engines: random forest and histogram gradient boosting."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+from app import (AnalysisError, clean_data, model_features,
+                 predict_churn_probability, train_churn_model)
+
+GRID = {'n_estimators': [20], 'max_depth': [6]}
+
+
+@pytest.fixture(scope='module')
+def customers(small_csv):
+    df, _ = clean_data(pd.read_csv(small_csv))
+    return df.drop(columns=['date'])
+
+
+@pytest.fixture(scope='module')
+def boosted(customers):
+    return train_churn_model(customers, 'churn', param_grid=GRID, n_jobs=1,
+                             engine='hist_gradient_boosting', compare=True)
+
+
+def test_boosting_splits_text_features_natively(boosted):
+    pipeline, accuracy, _, report = boosted
+    model = pipeline['model']
+    assert isinstance(model, HistGradientBoostingClassifier)
+    assert pipeline['engine'] == 'hist_gradient_boosting'
+    text = [col in pipeline['categories'] for col in pipeline['features']]
+    assert model.is_categorical_.tolist() == text
+    assert report['categorical_features'] == sum(text)
+    assert report['strategy'] == 'early_stopping'
+    assert report['iterations'] == report['best_params']['max_iter'] == model.n_iter_
+    assert 'scaler' not in pipeline
+    assert accuracy > 0.7
+
+
+def test_text_with_too_many_values_is_split_by_order(customers):
+    labels = [f'account {i:04d}' for i in range(len(customers))]
+    pipeline, *_ = train_churn_model(customers.assign(account=labels), 'churn',
+                                     engine='hist_gradient_boosting', compare=False)
+    account = pipeline['features'].index('account')
+    assert not pipeline['model'].is_categorical_[account]
+
+
+def test_engines_are_compared_on_the_same_split(boosted):
+    _, accuracy, _, report = boosted
+    engines = {entry['engine']: entry for entry in report['engines']}
+    assert list(engines) == ['hist_gradient_boosting', 'random_forest']
+    assert engines['hist_gradient_boosting']['selected']
+    assert not engines['random_forest']['selected']
+    assert engines['hist_gradient_boosting']['accuracy'] == accuracy
+
+
+def test_unseen_categories_count_as_missing(boosted, customers):
+    pipeline, *_ = boosted
+    model = pipeline['model']
+    X = model_features(pipeline, pd.DataFrame(
+        [{col: 0 for col in pipeline['features']}]))
+    contract = pipeline['features'].index('contract')
+    unseen, missing = X.copy(), X.astype(float)
+    unseen[0, contract], missing[0, contract] = -1, np.nan
+    np.testing.assert_array_equal(model.predict_proba(unseen),
+                                  model.predict_proba(missing))
+
+    rows = customers.head(50).assign(contract='ten years')
+    probability = predict_churn_probability(pipeline, rows)
+    assert ((probability >= 0) & (probability <= 1)).all()
+
+
+def test_small_datasets_boost_a_fixed_number_of_rounds(customers):
+    pipeline, _, _, report = train_churn_model(customers.head(300), 'churn',
+                                               engine='hist_gradient_boosting',
+                                               compare=False)
+    assert report['strategy'] == 'fixed'
+    assert [entry['engine'] for entry in report['engines']] == [
+        'hist_gradient_boosting']
+
+
+def test_unknown_engines_are_rejected(customers):
+    with pytest.raises(AnalysisError, match='Unknown model engine: xgboost'):
+        train_churn_model(customers, 'churn', engine='xgboost')
+
+
+def test_pipelines_stored_with_a_scaler_still_score(boosted):
+    pipeline, *_ = boosted
+    X = np.arange(12, dtype=float).reshape(4, 3)
+    scaler = StandardScaler().fit(X)
+    np.testing.assert_allclose(model_features({'scaler': scaler}, X),
+                               scaler.transform(X))
+    np.testing.assert_array_equal(model_features(pipeline, X), X)
@@ -0,0 +1,147 @@
+"""Admission control and the shared core budget of analysis jobs."""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import app as dashboard
+from app import ComputeGovernor, Overloaded
+from conftest import sample_path, upload
+
+LIMITS = {'interactive': 2, 'batch': 3}
+
+
+@pytest.fixture
+def governor(tmp_path):
+    return ComputeGovernor(str(tmp_path / 'compute'), cores=1, limits=LIMITS)
+
+
+@pytest.fixture
+def full(monkeypatch, tmp_path):
+    governor = ComputeGovernor(str(tmp_path / 'full'), cores=1,
+                               limits={'interactive': 0, 'batch': 0})
+    monkeypatch.setattr(dashboard, 'compute_governor', governor)
+    return governor
+
+
+@pytest.fixture
+def fresh_csv(tmp_path):
+    path = tmp_path / 'fresh.csv'
+    pd.read_csv(sample_path(2), skiprows=range(1, 2001), nrows=600).to_csv(
+        path, index=False)
+    return path
+
+
+def run_in_thread(governor, job_id, log, hold):
+    def job():
+        with governor.running(job_id) as threads:
+            log.append((job_id, threads))
+            hold.wait(10)
+    thread = threading.Thread(target=job)
+    thread.start()
+    return thread
+
+
+def done_event():
+    event = threading.Event()
+    event.set()
+    return event
+
+
+def test_admission_stops_at_the_queue_limit(governor):
+    governor.admit(['a', 'b'], 'interactive')
+    with pytest.raises(Overloaded) as refused:
+        governor.admit(['c'], 'interactive')
+    assert refused.value.priority == 'interactive'
+    assert refused.value.retry_after == dashboard.COMPUTE_DEFAULT_SECONDS
+    governor.admit(['d', 'e', 'f'], 'batch')
+    with pytest.raises(Overloaded) as refused:
+        governor.admit(['g'], 'batch')
+    assert refused.value.retry_after == dashboard.COMPUTE_DEFAULT_SECONDS * 3
+
+
+def test_jobs_wait_for_a_free_core(governor):
+    governor.admit(['first', 'second'], 'interactive')
+    log, hold = [], threading.Event()
+    first = run_in_thread(governor, 'first', log, hold)
+    while not log:
+        time.sleep(0.01)
+    second = run_in_thread(governor, 'second', log, done_event())
+    time.sleep(3 * dashboard.COMPUTE_POLL_SECONDS)
+    assert log == [('first', 1)]
+    assert governor.status()['busy_cores'] == 1
+
+    hold.set()
+    first.join(10), second.join(10)
+    assert log == [('first', 1), ('second', 1)]
+    assert governor.status()['queues']['interactive'] == {'limit': 2, 'running': 0,
+                                                          'queued': 0}
+
+
+def test_interactive_jobs_start_before_batch_jobs(governor):
+    governor.admit(['blocker'], 'interactive')
+    log, hold = [], threading.Event()
+    blocker = run_in_thread(governor, 'blocker', log, hold)
+    while not log:
+        time.sleep(0.01)
+    governor.admit(['report'], 'batch')
+    governor.admit(['upload'], 'interactive')
+    waiting = [run_in_thread(governor, 'report', log, done_event())]
+    time.sleep(3 * dashboard.COMPUTE_POLL_SECONDS)
+    waiting.append(run_in_thread(governor, 'upload', log, done_event()))
+    time.sleep(3 * dashboard.COMPUTE_POLL_SECONDS)
+
+    hold.set()
+    for thread in [blocker, *waiting]:
+        thread.join(10)
+    assert [job_id for job_id, _ in log] == ['blocker', 'upload', 'report']
+
+
+def test_tickets_of_dead_processes_are_dropped(governor):
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    with governor._state() as state:
+        state['tickets']['orphan'] = {'priority': 'interactive', 'status': 'running',
+                                      'threads': 1, 'pid': child.pid,
+                                      'created_at': time.time()}
+    status = governor.status()
+    assert status['busy_cores'] == 0
+    assert status['queues']['interactive']['running'] == 0
+
+
+def test_finished_jobs_update_the_typical_job_time(governor):
+    governor.admit(['quick'], 'interactive')
+    with governor.running('quick'):
+        pass
+    assert governor.status()['job_seconds'] == pytest.approx(
+        0.8 * dashboard.COMPUTE_DEFAULT_SECONDS, abs=0.01)
+
+
+def test_full_queue_answers_429_with_retry_after(client, full, fresh_csv):
+    os.makedirs(dashboard.UPLOADS_DIR, exist_ok=True)
+    uploads = os.listdir(dashboard.UPLOADS_DIR)
+    response = upload(client, str(fresh_csv))
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(dashboard.COMPUTE_DEFAULT_SECONDS)
+    body = response.get_json()
+    assert body['success'] is False
+    assert body['retry_after'] == dashboard.COMPUTE_DEFAULT_SECONDS
+    assert body['error'].startswith('Too many interactive analyses are queued.')
+    assert os.listdir(dashboard.UPLOADS_DIR) == uploads
+
+
+def test_full_batch_queue_answers_429(client, full, fresh_csv):
+    with open(fresh_csv, 'rb') as f:
+        response = client.post('/upload_batch', data={'files': [(f, 'fresh.csv')]})
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+
+
+def test_compute_status(client, full):
+    body = client.get('/compute').get_json()
+    assert body['success'] and body['cores'] == 1
+    assert set(body['queues']) == {'interactive', 'batch'}
@@ -0,0 +1,84 @@
+"""Time-budgeted feature importance engines."""
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.inspection import permutation_importance
+
+from app import (PERMUTATION_REPEATS, RANDOM_STATE, AnalysisError,
+                 compute_feature_importance)
+
+NAMES = ['signal_a', 'signal_b', 'noise_a', 'noise_b', 'constant']
+
+
+@pytest.fixture(scope='module')
+def holdout():
+    rng = np.random.RandomState(0)
+    X = np.column_stack([rng.normal(size=(800, 4)), np.ones(800)])
+    y = (X[:, 0] + X[:, 1] + rng.normal(scale=0.3, size=800) > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=20, max_depth=6,
+                                   random_state=0).fit(X[:500], y[:500])
+    return model, X[500:], y[500:]
+
+
+def by_feature(importance, key='Importance'):
+    return {item['Feature']: item[key] for item in importance}
+
+
+def test_full_permutation_run_matches_sklearn(holdout):
+    model, X, y = holdout
+    importance, report = compute_feature_importance(model, X, y, NAMES,
+                                                    method='permutation',
+                                                    max_seconds=0)
+    expected = permutation_importance(model, X, y, n_repeats=PERMUTATION_REPEATS,
+                                      random_state=RANDOM_STATE)
+    values = by_feature(importance)
+    np.testing.assert_allclose([values[name] for name in NAMES],
+                               expected.importances_mean)
+    assert report['rounds'] == PERMUTATION_REPEATS
+    assert not report['budget_exhausted']
+
+
+@pytest.mark.parametrize('method', ['permutation', 'sampled', 'contribution'])
+def test_budget_keeps_the_first_estimate(holdout, method):
+    model, X, y = holdout
+    importance, report = compute_feature_importance(model, X, y, NAMES,
+                                                    method=method,
+                                                    max_seconds=1e-9)
+    assert report['method'] == method and report['budget_exhausted']
+    assert report.get('rounds', 1) == 1
+    assert len(importance) == len(NAMES)
+
+
+@pytest.mark.parametrize('method', ['permutation', 'sampled', 'impurity',
+                                    'contribution'])
+def test_engines_rank_signal_above_noise(holdout, method):
+    model, X, y = holdout
+    importance, _ = compute_feature_importance(model, X, y, NAMES, method=method,
+                                               max_seconds=0)
+    assert {item['Feature'] for item in importance[:2]} == {'signal_a', 'signal_b'}
+    assert by_feature(importance)['constant'] == 0
+    values = [item['Importance'] for item in importance]
+    assert values == sorted(values, reverse=True)
+
+
+def test_sampled_permutation_gives_intervals(holdout):
+    model, X, y = holdout
+    importance, report = compute_feature_importance(model, X, y, NAMES,
+                                                    method='sampled', max_seconds=0)
+    assert report['rows'] == min(500, len(X))
+    for item in importance:
+        assert item['Low'] <= item['Importance'] <= item['High']
+
+
+def test_tree_methods_fall_back_to_permutation(holdout):
+    _, X, y = holdout
+    model = HistGradientBoostingClassifier(max_iter=20).fit(X, y)
+    _, report = compute_feature_importance(model, X, y, NAMES, method='impurity',
+                                           max_seconds=0)
+    assert report['method'] == 'permutation'
+
+
+def test_unknown_method_is_rejected(holdout):
+    model, X, y = holdout
+    with pytest.raises(AnalysisError, match='Unknown importance method: shap'):
+        compute_feature_importance(model, X, y, NAMES, method='shap')
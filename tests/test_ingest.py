@@ -0,0 +1,37 @@
+"""Streaming, chunked CSV cleaning gives the same frame as clean_data."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import StreamingCleaner, clean_data
+from conftest import sample_path
+
+
+def assert_same_cleaning(path, spool, chunk_rows):
+    expected, quality = clean_data(pd.read_csv(path))
+    df, profile = StreamingCleaner(str(spool), chunk_rows=chunk_rows).clean(path)
+
+    # Category order follows first appearance rather than sorting
+    pd.testing.assert_frame_equal(df.reset_index(drop=True),
+                                  expected.reset_index(drop=True),
+                                  check_categorical=False)
+    assert profile['data_quality_score'] == pytest.approx(quality)
+
+
+@pytest.mark.parametrize('number', [1, 2, 3, 4, 5])
+def test_sample_datasets_clean_as_in_memory(number, tmp_path):
+    assert_same_cleaning(sample_path(number), tmp_path, chunk_rows=700)
+
+
+def test_missing_invalid_and_duplicate_rows_clean_as_in_memory(tmp_path):
+    df = pd.read_csv(sample_path(1), nrows=2000)
+    rng = np.random.default_rng(0)
+    for col in ('tenure', 'contract', 'monthlyCharges', 'paymentMethod'):
+        df.loc[rng.choice(len(df), 50, replace=False), col] = np.nan
+    df['totalCharges'] = df['totalCharges'].astype(object)
+    df.loc[rng.choice(len(df), 20, replace=False), 'totalCharges'] = ' '
+    df = pd.concat([df, df.iloc[:30]], ignore_index=True)
+    path = tmp_path / 'messy.csv'
+    df.to_csv(path, index=False)
+
+    assert_same_cleaning(str(path), tmp_path / 'spool', chunk_rows=300)
@@ -0,0 +1,42 @@
+"""Background analysis jobs behind /upload and /jobs/<job_id>."""
+import pandas as pd
+
+from conftest import sample_path, upload, wait_for_job
+
+
+def test_upload_queues_a_job_and_returns_at_once(client, tmp_path):
+    path = tmp_path / 'fresh.csv'
+    pd.read_csv(sample_path(2), nrows=1000).to_csv(path, index=False)
+    response = upload(client, str(path), current_revenue='500')
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['success'] and body['job_id'] and body['dataset_id']
+    assert body['status_url'] == f"/jobs/{body['job_id']}"
+
+    job = wait_for_job(client, body['job_id'])
+    assert job['status'] == 'completed'
+    assert job['progress'] == 1.0
+    assert [stage['name'] for stage in job['stages']] == ['clean', 'train',
+                                                          'importance', 'charts']
+    assert all(stage['status'] == 'done' for stage in job['stages'])
+    assert job['result']['success']
+    assert job['result']['dataset_id'] == body['dataset_id']
+
+
+def test_failed_analysis_is_reported_on_the_job(client, tmp_path):
+    path = tmp_path / 'no_churn.csv'
+    rows = [f'{i},{i % 50},Month-to-month' for i in range(1, 21)]
+    path.write_text('\n'.join(['id,tenure,contract'] + rows) + '\n')
+    body = upload(client, str(path)).get_json()
+
+    job = wait_for_job(client, body['job_id'])
+    assert job['status'] == 'failed'
+    assert not job['result']['success']
+    assert job['result']['warning'] == 'No Churn column found.'
+
+
+def test_unknown_job_is_404(client):
+    response = client.get('/jobs/0123456789abcdef')
+    assert response.status_code == 404
+    assert not response.get_json()['success']
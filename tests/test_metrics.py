@@ -0,0 +1,121 @@
+"""Duration histograms, /metrics, Server-Timing and the slow-work profiler."""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app import Metrics, SlowWorkProfiler
+
+BUCKETS = [0.1, 1, 10]
+# Observed in the parent and counted in a forked child; never flushed
+SHARED = Metrics('unused', BUCKETS)
+
+
+@pytest.fixture
+def histograms(tmp_path):
+    return Metrics(str(tmp_path / 'metrics'), BUCKETS)
+
+
+def busy(seconds):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def shared_histograms():
+    return len(SHARED._snapshot())
+
+
+def test_render_gives_cumulative_buckets(histograms):
+    for seconds in [0.05, 0.5, 0.7, 20]:
+        histograms.observe('churn_span_duration_seconds', seconds, span='train')
+    lines = histograms.render().splitlines()
+
+    assert lines[:2] == ['# HELP churn_span_duration_seconds Time spent in a traced '
+                         'block of work.',
+                         '# TYPE churn_span_duration_seconds histogram']
+    assert lines[2:] == [
+        'churn_span_duration_seconds_bucket{span="train",le="0.1"} 1',
+        'churn_span_duration_seconds_bucket{span="train",le="1"} 3',
+        'churn_span_duration_seconds_bucket{span="train",le="10"} 3',
+        'churn_span_duration_seconds_bucket{span="train",le="+Inf"} 4',
+        'churn_span_duration_seconds_sum{span="train"} 21.250000',
+        'churn_span_duration_seconds_count{span="train"} 4'
+    ]
+
+
+def test_collect_adds_up_every_process(histograms):
+    histograms.observe('work', 0.5, kind='a')
+    histograms.flush()
+    with open(os.path.join(histograms.directory, f'{os.getpid()}.json')) as f:
+        assert json.load(f) == [{'name': 'work', 'labels': {'kind': 'a'},
+                                 'counts': [0, 1, 0, 0], 'sum': 0.5}]
+    with open(os.path.join(histograms.directory, '1.json'), 'w') as f:
+        json.dump([{'name': 'work', 'labels': {'kind': 'a'},
+                    'counts': [2, 0, 0, 1], 'sum': 40.0}], f)
+    with open(os.path.join(histograms.directory, '2.json'), 'w') as f:
+        f.write('{half written')
+
+    merged = histograms.collect()
+    assert merged == {('work', (('kind', 'a'),)): {'counts': [2, 1, 0, 1],
+                                                    'sum': 40.5}}
+
+
+def test_unforced_flushes_are_rate_limited(histograms):
+    path = os.path.join(histograms.directory, f'{os.getpid()}.json')
+    histograms.observe('work', 0.5)
+    histograms.flush(force=False)
+    histograms.observe('work', 0.5)
+    histograms.flush(force=False)
+    with open(path) as f:
+        assert json.load(f)[0]['counts'] == [0, 1, 0, 0]
+    histograms.flush()
+    with open(path) as f:
+        assert json.load(f)[0]['counts'] == [0, 2, 0, 0]
+
+
+def test_forked_children_start_empty():
+    SHARED.observe('work', 0.5)
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        assert executor.submit(shared_histograms).result() == 0
+    assert shared_histograms() == 1
+
+
+def test_responses_carry_server_timing(client, analysed):
+    response = client.post('/predict_customer', json={
+        'dataset_id': analysed, 'customer': {'tenure': 3}})
+    timings = [part.split(';')[0]
+               for part in response.headers['Server-Timing'].split(', ')]
+    assert timings[0] == 'predict.encode'
+    assert timings[-1] == 'total'
+
+
+def test_metrics_lists_requests_and_job_stages(client, analysed):
+    client.get('/profile', query_string={'dataset_id': analysed})
+    text = client.get('/metrics').get_data(as_text=True)
+    assert ('churn_request_duration_seconds_count{endpoint="dataset_profile",'
+            'method="GET",status="200"}') in text
+    assert '# TYPE churn_job_stage_duration_seconds histogram' in text
+    assert 'stage="train"' in text
+
+
+def test_profiler_keeps_only_slow_work(tmp_path):
+    profiler = SlowWorkProfiler(str(tmp_path), 0.005, threshold=0.1)
+    profiler.start()
+    busy(0.02)
+    assert profiler.stop('GET /fast', 0.02) is None
+
+    profiler.start()
+    busy(0.3)
+    path = profiler.stop('GET /slow', 0.3)
+    assert os.path.dirname(path) == str(tmp_path)
+    assert path.endswith(f'-GET__slow-{os.getpid()}.folded')
+    with open(path) as f:
+        stacks = [line.rsplit(' ', 1) for line in f]
+    frame = f'busy ({os.path.basename(__file__)}:{busy.__code__.co_firstlineno})'
+    assert any(stack.endswith(frame) for stack, _ in stacks)
+    assert sum(int(count) for _, count in stacks) >= 10
@@ -0,0 +1,110 @@
+"""Model registry over the analysis store: list, show, load, promote, delete."""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import AnalysisStore, analysis_store
+from conftest import sample_path, upload, wait_for_job
+
+
+@pytest.fixture(scope='module')
+def export(tmp_path_factory):
+    path = tmp_path_factory.mktemp('models') / 'april.csv'
+    pd.read_csv(sample_path(5), nrows=900).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(scope='module')
+def version(client, export):
+    job = upload(client, str(export), current_revenue='100').get_json()
+    result = wait_for_job(client, job['job_id'])['result']
+    assert result['success'], result
+    return result['dataset_id']
+
+
+@pytest.fixture
+def promoted(client, version):
+    assert client.post(f'/models/{version}/promote').get_json() == {
+        'success': True, 'promoted': version}
+    yield version
+    path = os.path.join(analysis_store.root, 'promoted')
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@pytest.fixture(scope='module')
+def client():
+    from app import app
+    return app.test_client()
+
+
+def test_versions_are_listed_with_their_record(client, export, version):
+    body = client.get('/models').get_json()
+    record = next(m for m in body['models'] if m['model_id'] == version)
+    sha256 = hashlib.sha256(export.read_bytes()).hexdigest()
+    assert record['source'] == {'file': 'april.csv', 'sha256': sha256}
+    assert record['rows'] == 900
+    assert record['engine'] == 'hist_gradient_boosting'
+    assert record['features'][:2] == ['gender', 'seniorcitizen']
+    assert not record['promoted']
+    created = [m['created_at'] for m in body['models']]
+    assert created == sorted(created, reverse=True)
+
+    assert client.get(f'/models/{version}').get_json()['model'] == record
+
+
+@pytest.mark.parametrize('method, url', [
+    ('get', '/models/{}'), ('post', '/models/{}/load'),
+    ('post', '/models/{}/promote'), ('delete', '/models/{}')])
+def test_unknown_versions_are_404(client, method, url):
+    response = getattr(client, method)(url.format('0' * 64))
+    assert response.status_code == 404
+    assert response.get_json() == {'success': False, 'error': 'Model not found'}
+
+
+def test_loading_makes_the_version_current(version):
+    from app import app
+    fresh = app.test_client()
+    body = fresh.post(f'/models/{version}/load').get_json()
+    assert body['success'] and body['dataset_id'] == version
+    assert body['model']['model_id'] == version and body['load_seconds'] >= 0
+    assert fresh.get('/profile').get_json()['dataset_id'] == version
+
+
+def test_promoted_version_answers_requests_without_a_dataset(promoted):
+    from app import app
+    stranger = app.test_client()
+    assert stranger.get('/profile').get_json()['dataset_id'] == promoted
+    assert stranger.get('/models').get_json()['promoted'] == promoted
+
+
+def test_promoted_version_is_never_evicted(tmp_path):
+    store = AnalysisStore(str(tmp_path), max_bytes=10 ** 9)
+    for dataset_id in ('kept', 'other'):
+        store.save(dataset_id, {}, pd.DataFrame({'values': np.zeros(1000)}), {})
+    store.promote('kept')
+    store.max_bytes = 1
+    store.enforce_limit()
+    assert store.exists('kept') and not store.exists('other')
+
+
+def test_pipelines_are_memory_mapped(tmp_path):
+    store = AnalysisStore(str(tmp_path), max_bytes=10 ** 9)
+    weights = np.arange(100000, dtype=np.float64)
+    store.save('mapped', {}, pd.DataFrame({'x': [1]}), {'weights': weights},
+               {'forest_value': weights})
+    reopened = AnalysisStore(str(tmp_path), max_bytes=10 ** 9)
+    assert isinstance(reopened.load_pipeline('mapped')['weights'], np.memmap)
+    assert isinstance(reopened.load_array('mapped', 'forest_value'), np.memmap)
+
+
+def test_deleting_removes_the_version_and_its_promotion(client, promoted):
+    body = client.delete(f'/models/{promoted}').get_json()
+    assert body == {'success': True, 'deleted': promoted}
+    assert not analysis_store.exists(promoted)
+    assert analysis_store.promoted_model() is None
+    listed = client.get('/models').get_json()['models']
+    assert promoted not in [record['model_id'] for record in listed]
@@ -0,0 +1,78 @@
+"""Single-customer scoring from flattened forests and the prediction batcher."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from app import (PredictionBatcher, analysis_store, clean_data, compile_forest,
+                 compile_scorer, encode_customer, forest_proba,
+                 predict_churn_probability, scorer_proba, train_churn_model)
+
+
+@pytest.fixture(scope='module')
+def forest_pipeline(small_csv):
+    df, _ = clean_data(pd.read_csv(small_csv))
+    grid = {'n_estimators': [20], 'max_depth': [6], 'min_samples_split': [2]}
+    pipeline, *_ = train_churn_model(df, 'churn', param_grid=grid, n_jobs=1,
+                                     engine='random_forest', compare=False)
+    return pipeline, df.head(200)
+
+
+def customers(df):
+    return df.drop(columns=['churn']).to_dict('records')
+
+
+def test_flattened_forest_matches_predict_proba():
+    X, y = make_classification(n_samples=600, n_features=8, random_state=0)
+    model = RandomForestClassifier(n_estimators=15, max_depth=8,
+                                   random_state=0).fit(X, y)
+    np.testing.assert_allclose(forest_proba(compile_forest(model), X),
+                               model.predict_proba(X)[:, 1])
+
+
+def test_forest_scorer_matches_the_pipeline(forest_pipeline):
+    pipeline, df = forest_pipeline
+    scorer = compile_scorer(pipeline, compile_forest(pipeline['model']))
+    rows = np.vstack([encode_customer(scorer, c) for c in customers(df)])
+    np.testing.assert_allclose(scorer_proba(scorer, rows),
+                               predict_churn_probability(pipeline, df))
+
+
+def test_customer_records_are_encoded_like_frames(forest_pipeline):
+    pipeline, df = forest_pipeline
+    scorer = compile_scorer(pipeline)
+    record = {'TENURE': 'n/a', 'contract': 'One Year', 'gender': None}
+    expected = predict_churn_probability(
+        pipeline, pd.DataFrame([{col: record.get(col.upper(), record.get(col))
+                                 for col in pipeline['features']}]))
+    probability = scorer_proba(scorer, encode_customer(scorer, record)[None, :])
+    np.testing.assert_allclose(probability, expected)
+
+
+def test_batcher_answers_every_caller(forest_pipeline):
+    pipeline, df = forest_pipeline
+    scorer = compile_scorer(pipeline, compile_forest(pipeline['model']))
+    batcher = PredictionBatcher(max_rows=16, max_wait=0.05)
+    futures = [batcher.submit('forest', scorer, encode_customer(scorer, c))
+               for c in customers(df)]
+    np.testing.assert_allclose([f.result(timeout=30) for f in futures],
+                               predict_churn_probability(pipeline, df))
+
+
+def test_predict_customer_endpoint(client, analysed, small_csv):
+    customer = pd.read_csv(small_csv, nrows=1).drop(columns=['churn'])
+    body = client.post('/predict_customer', json={
+        'dataset_id': analysed, 'customer': customer.iloc[0].to_dict()}).get_json()
+
+    customer.columns = customer.columns.str.lower()
+    expected = predict_churn_probability(analysis_store.load_pipeline(analysed),
+                                         customer)
+    assert body['success'] and body['dataset_id'] == analysed
+    assert body['churn_probability'] == round(float(expected[0]), 4)
+
+
+def test_predict_customer_needs_a_record(client, analysed):
+    body = client.post('/predict_customer', json={'dataset_id': analysed,
+                                                  'customer': [1, 2]}).get_json()
+    assert body == {'success': False, 'error': 'Expected a customer object'}
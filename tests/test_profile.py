@@ -0,0 +1,48 @@
+"""Dataset profile built once at cleaning time and reused for the quality score."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import (StreamingCleaner, analysis_store, build_data_info, build_profile,
+                 profile_column)
+from conftest import sample_path
+
+
+def test_profile_counts_imputed_values_and_duplicates(tmp_path):
+    df = pd.read_csv(sample_path(1), nrows=1000)
+    rng = np.random.default_rng(1)
+    df.loc[rng.choice(np.arange(10, 1000), 40, replace=False), 'tenure'] = np.nan
+    df.loc[rng.choice(np.arange(10, 1000), 25, replace=False), 'contract'] = np.nan
+    df = pd.concat([df, df.iloc[:10]], ignore_index=True)
+    path = tmp_path / 'gaps.csv'
+    df.to_csv(path, index=False)
+
+    _, profile = StreamingCleaner(str(tmp_path / 'spool')).clean(str(path))
+    columns = {column['name']: column for column in profile['columns']}
+    assert columns['tenure']['imputed'] == 40
+    assert columns['contract']['imputed'] == 25
+    assert columns['monthlycharges']['imputed'] == 0
+    assert (profile['rows'], profile['source_rows']) == (1000, 1010)
+    assert profile['duplicate_ratio'] == pytest.approx(10 / 1010)
+    assert profile['data_quality_score'] == pytest.approx(100 * (1 - 10 / 1010 / 2))
+
+
+def test_profile_column_statistics():
+    values = pd.Series([3.0, np.nan, 1.0, 8.0, 2.0], name='tenure')
+    entry = profile_column(values, imputed=1)
+    assert entry == {'name': 'tenure', 'dtype': 'float64', 'nulls': 1, 'distinct': 4,
+                     'memory_bytes': 40, 'imputed': 1, 'min': 1.0, 'max': 8.0,
+                     'median': 2.5}
+
+
+def test_stored_profile_drives_the_dashboard_summary(client, analysed):
+    body = client.get('/profile', query_string={'dataset_id': analysed}).get_json()
+    profile = body['profile']
+
+    data = analysis_store.load_data(analysed)
+    assert profile['rows'] == len(data)
+    assert [column['name'] for column in profile['columns']] == list(data.columns)
+    fresh = build_profile(data, profile['source_rows'])
+    assert profile['data_quality_score'] == pytest.approx(fresh['data_quality_score'])
+    assert (analysis_store.load_analysis(analysed)['data_info']
+            == build_data_info(profile))
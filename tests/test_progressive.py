@@ -0,0 +1,104 @@
+"""Progressive analysis: read-only preliminary results, then the full one."""
+import shutil
+
+import pytest
+
+import app as dashboard
+from app import (PRELIMINARY_ERROR, PROGRESSIVE_STAGES, AnalysisError,
+                 analysis_store, append_dataset, create_job, load_job,
+                 progressive_analysis)
+from conftest import sample_path
+
+
+@pytest.fixture
+def progressive(monkeypatch, tmp_path):
+    """Small preview and sample stages; collects what each publish exposed."""
+    monkeypatch.setattr(dashboard, 'PROGRESSIVE_PREVIEW_ROWS', 500)
+    monkeypatch.setattr(dashboard, 'PROGRESSIVE_SAMPLE_ROWS', 2000)
+    path = tmp_path / 'large.csv'
+    shutil.copy(sample_path(1), path)
+    published = []
+    publish = dashboard.publish_job_result
+
+    def recording_publish(job_id, result):
+        publish(job_id, result)
+        published.append((result, analysis_store.load_analysis(result['dataset_id'])))
+    monkeypatch.setattr(dashboard, 'publish_job_result', recording_publish)
+    job = create_job('analysis', PROGRESSIVE_STAGES)
+    return job['job_id'], str(path), published
+
+
+def test_preliminary_results_come_first_and_are_removed(progressive):
+    job_id, path, published = progressive
+    result = progressive_analysis(job_id, path, 1000, 'e' * 64)
+
+    assert [r['progressive']['stage'] for r, _ in published] == ['preview', 'sample']
+    preview, sample = (r for r, _ in published)
+    assert preview['progressive']['training_rows'] <= 500
+    assert sample['progressive']['training_rows'] == 2000
+    assert 'churn_rate' in preview['insights']['intervals']
+    assert all(stored['progressive'] for _, stored in published)
+    assert load_job(job_id)['partial']['dataset_id'] == sample['dataset_id']
+
+    assert result['success'] and result['progressive'] is None
+    assert result['dataset_id'] == 'e' * 64
+    assert not any(analysis_store.exists(r['dataset_id']) for r, _ in published)
+    assert analysis_store.exists('e' * 64)
+
+
+def test_preliminary_results_are_removed_when_the_analysis_fails(progressive,
+                                                                 monkeypatch):
+    job_id, path, published = progressive
+    analyse = dashboard.analyse_dataset
+
+    def failing_analysis(job_id, df, profile, dataset_id, *args):
+        if dataset_id == 'f' * 64:
+            raise MemoryError('out of memory')
+        return analyse(job_id, df, profile, dataset_id, *args)
+    monkeypatch.setattr(dashboard, 'analyse_dataset', failing_analysis)
+
+    with pytest.raises(MemoryError):
+        progressive_analysis(job_id, path, 1000, 'f' * 64)
+    assert len(published) == 2
+    assert not any(analysis_store.exists(r['dataset_id']) for r, _ in published)
+
+
+def test_preliminary_results_are_read_only(client, progressive, monkeypatch,
+                                           small_csv):
+    job_id, path, published = progressive
+    answers = []
+
+    def probe(result):
+        dataset_id = result['dataset_id']
+        with open(small_csv, 'rb') as f:
+            answers.extend([
+                client.post('/predict_customer', json={
+                    'dataset_id': dataset_id, 'customer': {'tenure': 3}}).get_json(),
+                client.post('/filter_by_date', json={
+                    'dataset_id': dataset_id, 'retrain': True, 'month': 1,
+                    'year': 2025}).get_json(),
+                client.post('/score', data={'dataset_id': dataset_id,
+                                            'file': (f, 'customers.csv')}).get_json()])
+        with open(small_csv, 'rb') as f:
+            answers.append(client.post('/upload', data={
+                'dataset_id': dataset_id, 'mode': 'append',
+                'file': (f, 'more.csv')}).get_json())
+        answers.append(client.post(f'/models/{dataset_id}/load').status_code)
+        command = dashboard.app.test_cli_runner().invoke(
+            args=['score', dataset_id, small_csv])
+        answers.append(command.output.strip())
+        with pytest.raises(AnalysisError, match=PRELIMINARY_ERROR):
+            append_dataset(job_id, None, None, dataset_id, 'a' * 63 + 'b', 0)
+
+    publish = dashboard.publish_job_result
+    monkeypatch.setattr(dashboard, 'publish_job_result',
+                        lambda job_id, result: (publish(job_id, result),
+                                                probe(result)))
+    progressive_analysis(job_id, path, 1000, 'g' * 64)
+
+    rejected = {'success': False, 'error': PRELIMINARY_ERROR}
+    assert len(answers) == 2 * 6
+    for stage in (answers[:6], answers[6:]):
+        assert stage[:4] == [rejected] * 4
+        assert stage[4] == 404
+        assert stage[5] == f'Error: {PRELIMINARY_ERROR}'
@@ -0,0 +1,82 @@
+"""Monte Carlo projection of the revenue lost to churn."""
+import numpy as np
+import pytest
+
+from app import (AnalysisError, analysis_store, parse_projection,
+                 project_revenue_loss)
+
+
+@pytest.fixture(scope='module')
+def customers():
+    rng = np.random.default_rng(3)
+    probability = np.sort(rng.beta(1, 6, 5000))
+    charges = rng.uniform(20, 110, 5000)
+    return np.column_stack([probability, charges]).astype(np.float32)
+
+
+def expected_losses(customers, revenue, months, churn_reduction=0):
+    """Cumulative expected loss per month, customer by customer."""
+    probability = customers[:, 0].astype(float) * (1 - churn_reduction / 100)
+    charges = customers[:, 1].astype(float)
+    scale = revenue / charges.sum()
+    monthly = [scale * charges @ (1 - (1 - probability) ** month)
+               for month in range(1, months + 1)]
+    return np.cumsum(monthly)
+
+
+@pytest.mark.parametrize('churn_reduction', [0, 30])
+def test_mean_matches_the_analytic_loss(customers, churn_reduction):
+    projection = project_revenue_loss(customers, 10000, months=12, scenarios=4000,
+                                      churn_reduction=churn_reduction)
+    expected = expected_losses(customers, 10000, 12, churn_reduction)
+    simulated = [month['expected_loss'] for month in projection['by_month']]
+    np.testing.assert_allclose(simulated, expected, rtol=0.01)
+    assert projection['expected_loss'] == simulated[-1]
+
+
+def test_bands_are_ordered(customers):
+    projection = project_revenue_loss(customers, 10000, months=6, scenarios=2000)
+    for month in projection['by_month']:
+        assert month['p5'] < month['p50'] < month['p95']
+    assert projection['percentiles']['p95'] == projection['by_month'][-1]['p95']
+    assert 0 < projection['monthly_revenue_at_end'] < 10000
+
+
+def test_projections_are_repeatable(customers):
+    first = project_revenue_loss(customers, 500, months=3, scenarios=2500)
+    second = project_revenue_loss(customers, 500, months=3, scenarios=2500)
+    first.pop('seconds'), second.pop('seconds')
+    assert first == second
+
+
+def test_no_churn_loses_nothing(customers):
+    projection = project_revenue_loss(customers, 10000, months=4, scenarios=100,
+                                      churn_reduction=100)
+    assert projection['expected_loss'] == 0
+    assert projection['monthly_revenue_at_end'] == 10000
+
+
+@pytest.mark.parametrize('data, error', [
+    ({'months': 'soon'}, 'months, scenarios and churn_reduction must be numbers'),
+    ({'months': 61}, 'months must be between 1 and 60'),
+    ({'scenarios': 0}, 'scenarios must be between 1 and 50000'),
+    ({'churn_reduction': 120}, 'churn_reduction must be a percentage between 0 and 100')
+])
+def test_bad_requests_are_rejected(data, error):
+    with pytest.raises(AnalysisError, match=error):
+        parse_projection(data)
+
+
+def test_predict_revenue_projects_the_stored_customers(client, analysed):
+    body = client.post('/predict_revenue', json={
+        'dataset_id': analysed, 'current_revenue': 10000, 'months': 6,
+        'scenarios': 1000, 'churn_reduction': 10}).get_json()
+    assert body['success']
+    churn_rate = analysis_store.load_analysis(analysed)['churn_rate']
+    assert body['monthly_loss'] == pytest.approx(10000 * churn_rate)
+
+    projection = body.pop('projection')
+    stored = analysis_store.load_array(analysed, 'projection')
+    expected = project_revenue_loss(stored, 10000, 6, 1000, 10)
+    projection.pop('seconds'), expected.pop('seconds')
+    assert projection == expected
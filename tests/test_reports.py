@@ -0,0 +1,70 @@
+"""PDF reports built in the background and served from the store."""
+import time
+
+import app as dashboard
+from conftest import JOB_TIMEOUT, wait_for_job
+
+
+def report_status(client, dataset_id, revenue):
+    return client.get('/report_status', query_string={
+        'dataset_id': dataset_id, 'current_revenue': revenue}).get_json()
+
+
+def wait_until_ready(client, dataset_id, revenue):
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        status = report_status(client, dataset_id, revenue)
+        if status['status'] in ('ready', 'failed'):
+            return status
+        time.sleep(0.2)
+    raise AssertionError('report build timed out')
+
+
+def test_report_is_built_after_the_analysis(client, analysed):
+    status = wait_until_ready(client, analysed, 10000)
+    assert status == {'success': True, 'status': 'ready',
+                      'url': f'/download_report?dataset_id={analysed}'
+                             f'&current_revenue=10000.00'}
+
+    response = client.get(status['url'])
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.headers['Content-Disposition'].startswith(
+        'attachment; filename=churn_analysis_report_')
+    assert response.data.startswith(b'%PDF')
+
+
+def test_download_answers_202_while_building(client, analysed):
+    response = client.get('/download_report', query_string={
+        'dataset_id': analysed, 'current_revenue': 2500})
+    body = response.get_json()
+    assert response.status_code == 202
+    assert body['status'] in ('queued', 'running')
+    assert body['status_url'] == (f'/report_status?dataset_id={analysed}'
+                                  f'&current_revenue=2500.00')
+
+    assert wait_for_job(client, body['job_id'])['success']
+    path = dashboard.analysis_store.report_path(analysed, 2500)
+    with open(path, 'rb') as f:
+        assert f.read().startswith(b'%PDF')
+    assert report_status(client, analysed, 2500)['status'] == 'ready'
+
+
+def test_failed_builds_are_reported(client, analysed, monkeypatch):
+    def broken_pdf(*args):
+        raise RuntimeError('out of paper')
+
+    monkeypatch.setattr(dashboard, 'generate_pdf_report', broken_pdf)
+    status = wait_until_ready(client, analysed, 77)
+    assert status == {'success': False, 'status': 'failed',
+                      'error': 'Error generating report: out of paper'}
+
+    response = client.get('/download_report', query_string={
+        'dataset_id': analysed, 'current_revenue': 77})
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'Error generating report: out of paper'
+
+
+def test_unknown_dataset_has_no_report(client):
+    body = report_status(client, 'f' * 64, 100)
+    assert body == {'success': False, 'error': 'No data uploaded yet'}
@@ -0,0 +1,81 @@
+"""Persisted preprocessing pipeline and streaming batch scoring."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import (analysis_store, app, encode_features, predict_churn_probability,
+                 score_csv)
+from conftest import sample_path
+
+
+@pytest.fixture(scope='module')
+def customers(tmp_path_factory):
+    path = tmp_path_factory.mktemp('score') / 'customers.csv'
+    pd.read_csv(sample_path(2), nrows=250).to_csv(path, index=False)
+    return str(path)
+
+
+def expected_scores(pipeline, path):
+    raw = pd.read_csv(path)
+    raw.columns = raw.columns.str.lower()
+    return raw['id'].tolist(), np.round(predict_churn_probability(pipeline, raw), 4)
+
+
+def test_score_endpoint_streams_a_probability_per_customer(client, analysed,
+                                                           customers):
+    with open(customers, 'rb') as f:
+        response = client.post('/score', data={'dataset_id': analysed,
+                                               'file': (f, 'customers.csv')})
+    assert response.mimetype == 'text/csv'
+    scores = pd.read_csv(io.BytesIO(response.data))
+
+    ids, probabilities = expected_scores(analysis_store.load_pipeline(analysed),
+                                         customers)
+    assert list(scores.columns) == ['id', 'churn_probability']
+    assert scores['id'].tolist() == ids
+    np.testing.assert_allclose(scores['churn_probability'], probabilities)
+
+
+def test_chunked_scoring_matches_one_pass(analysed, customers):
+    pipeline = analysis_store.load_pipeline(analysed)
+    parts = list(score_csv(pipeline, customers, chunk_rows=64))
+
+    assert [rows for _, rows in parts] == [64, 64, 64, 58]
+    text = ''.join(part for part, _ in parts)
+    assert text.count('churn_probability') == 1
+    whole = ''.join(part for part, _ in score_csv(pipeline, customers))
+    assert text == whole
+
+
+def test_missing_feature_columns_are_named(client, analysed, tmp_path):
+    path = tmp_path / 'partial.csv'
+    pd.read_csv(sample_path(2), nrows=20).drop(columns=['tenure', 'contract']).to_csv(
+        path, index=False)
+    with open(path, 'rb') as f:
+        body = client.post('/score', data={'dataset_id': analysed,
+                                           'file': (f, 'partial.csv')}).get_json()
+    assert body == {'success': False, 'error': 'Missing columns: tenure, contract'}
+
+
+def test_unseen_and_missing_values_get_the_training_fills(analysed):
+    pipeline = analysis_store.load_pipeline(analysed)
+    row = {col: np.nan for col in pipeline['features']}
+    row['contract'] = 'Ten years'
+    X = encode_features(pipeline, pd.DataFrame([row]))
+
+    assert X.loc[0, 'contract'] == -1
+    assert X.loc[0, 'tenure'] == pipeline['fills']['tenure']
+    gender = pipeline['categories']['gender'].index(pipeline['fills']['gender'])
+    assert X.loc[0, 'gender'] == gender
+
+
+def test_score_command_writes_the_same_csv(analysed, customers, tmp_path):
+    output = tmp_path / 'scores.csv'
+    result = app.test_cli_runner().invoke(args=['score', analysed, customers,
+                                                '--output', str(output)])
+    assert result.exit_code == 0, result.output
+    pipeline = analysis_store.load_pipeline(analysed)
+    assert output.read_text() == ''.join(part for part, _ in score_csv(pipeline,
+                                                                       customers))
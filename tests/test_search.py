@@ -0,0 +1,47 @@
+"""Budgeted successive-halving hyperparameter search."""
+import pytest
+from sklearn.datasets import make_classification
+
+import app as dashboard
+from app import CV_FOLDS, successive_halving_search
+
+GRID = {'n_estimators': [10, 30], 'max_depth': [2, 4, None],
+        'min_samples_split': [2, 5]}
+
+
+@pytest.fixture(scope='module')
+def data():
+    return make_classification(n_samples=900, n_features=8, random_state=0)
+
+
+def test_last_rung_uses_every_row_and_the_full_forest(data):
+    X, y = data
+    model, best_params, report = successive_halving_search(X, y, GRID, n_jobs=1)
+
+    last = report['rungs'][-1]
+    assert last['n_samples'] == len(y)
+    assert last['tree_fraction'] == 1
+    assert [rung['n_samples'] for rung in report['rungs']] == [100, 300, 900]
+    assert report['candidates'] == 12 and not report['budget_exhausted']
+    assert model.get_params()['n_estimators'] == best_params['n_estimators']
+    assert best_params not in [entry['params'] for entry in report['pruned']]
+
+
+def test_search_stops_at_the_fit_budget(data, monkeypatch):
+    X, y = data
+    monkeypatch.setattr(dashboard, 'SEARCH_MAX_FITS', 3 * CV_FOLDS)
+    _, _, report = successive_halving_search(X, y, GRID, n_jobs=1)
+
+    assert report['budget_exhausted'] and not report['budget_overrun']
+    assert report['fits'] == 3 * CV_FOLDS + 1
+    assert report['rungs'][0]['evaluated'] == 3
+
+
+def test_budget_below_one_pass_still_scores_one_candidate(data, monkeypatch):
+    X, y = data
+    monkeypatch.setattr(dashboard, 'SEARCH_MAX_FITS', CV_FOLDS - 1)
+    _, best_params, report = successive_halving_search(X, y, GRID, n_jobs=1)
+
+    assert report['budget_exhausted'] and report['budget_overrun']
+    assert report['rungs'][0]['evaluated'] == 1
+    assert best_params == {'max_depth': 2, 'min_samples_split': 2, 'n_estimators': 10}
@@ -0,0 +1,128 @@
+"""Segment churn cube: dimensions, crossings and the /segments endpoint."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import (AnalysisError, clean_data, compute_segment_cube, query_segments,
+                 segment_answer, segment_layout)
+
+
+@pytest.fixture(scope='module')
+def customers(small_csv):
+    df, _ = clean_data(pd.read_csv(small_csv))
+    return df
+
+
+@pytest.fixture(scope='module')
+def cube(customers):
+    layout = segment_layout(customers, 'churn')
+    return layout, compute_segment_cube(customers, layout)
+
+
+def grouped(df, columns):
+    """customers, churned and charges per label (tuple) of columns, by pandas."""
+    frame = df.assign(**{col: df[col].astype(str).str.lower() for col in columns})
+    groups = frame.groupby(columns, observed=True)
+    totals = pd.DataFrame({'customers': groups.size(),
+                           'churned': groups['churn'].sum(),
+                           'charges': groups['monthlycharges'].sum()})
+    return {key if isinstance(key, tuple) else (key,): tuple(row)
+            for key, row in totals.iterrows()}
+
+
+def from_cube(records):
+    return {tuple(r['segment'].values()): (r['customers'], r['churned'], r['charges'])
+            for r in records if r['customers']}
+
+
+def assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, (customers, churned, charges) in expected.items():
+        assert actual[key][:2] == (customers, churned)
+        assert actual[key][2] == pytest.approx(charges, abs=0.01)
+
+
+@pytest.mark.parametrize('by', ['contract', 'paymentmethod', 'seniorcitizen',
+                                'contract,internetservice', 'seniorcitizen,contract'])
+def test_cube_matches_groupby(customers, cube, by):
+    layout, values = cube
+    assert_same(from_cube(query_segments(layout, values, by)),
+                grouped(customers, by.split(',')))
+
+
+def test_pairs_read_in_either_order(cube):
+    layout, values = cube
+    forward = query_segments(layout, values, 'contract,internetservice')
+    backward = query_segments(layout, values, 'internetservice,contract')
+    assert from_cube(forward) == from_cube(backward)
+
+
+def test_drill_down_keeps_one_label(customers, cube):
+    layout, values = cube
+    records = query_segments(layout, values, 'internetservice',
+                             {'contract': 'month-to-month'})
+    monthly = customers[customers['contract'] == 'month-to-month']
+    expected = {('month-to-month', label): row
+                for (label,), row in grouped(monthly, ['internetservice']).items()}
+    assert_same(from_cube(records), expected)
+
+
+def test_tenure_bands(customers, cube):
+    layout, values = cube
+    records = query_segments(layout, values, 'tenure_band')
+    bands = np.digitize(customers['tenure'], [6, 12, 24, 36, 48, 60])
+    assert [r['customers'] for r in records] == np.bincount(bands, minlength=7).tolist()
+    assert records[0]['segment']['tenure_band'] == '0-5 months'
+    assert records[-1]['segment']['tenure_band'] == '60+ months'
+
+
+def test_flag_columns_are_dimensions(customers):
+    flagged = customers.assign(seniorcitizen=customers['seniorcitizen'].astype(int))
+    layout = segment_layout(flagged, 'churn')
+    assert layout['dimensions']['seniorcitizen'] == ['false', 'true']
+    assert 'seniorcitizen,contract' in layout['cells']
+    values = compute_segment_cube(flagged, layout)
+    assert_same(from_cube(query_segments(layout, values, 'seniorcitizen,contract')),
+                grouped(customers, ['seniorcitizen', 'contract']))
+
+
+def test_numbers_with_other_values_are_not_flags(customers):
+    layout = segment_layout(customers.assign(seniorcitizen=2), 'churn')
+    assert 'seniorcitizen' not in layout['dimensions']
+
+
+@pytest.mark.parametrize('by, where, error', [
+    ('region', None, 'Unknown segment dimension: region'),
+    ('contract', {'gender': 'other'}, 'Unknown gender value: other'),
+    ('contract,gender', {'partner': 'true'},
+     'Segments can be broken down by at most two dimensions'),
+    ('gender,partner', None, 'No segment cube for gender x partner')
+])
+def test_bad_queries_are_rejected(cube, by, where, error):
+    layout, values = cube
+    with pytest.raises(AnalysisError, match=error):
+        query_segments(layout, values, by, where)
+
+
+def test_chat_answers_name_the_riskiest_segments(cube):
+    layout, values = cube
+    answer = segment_answer(layout, values, 'which payment method churns most?')
+    lines = answer.splitlines()
+    assert lines[0] == 'Churn by payment method:'
+    rates = [float(line.split(': ')[1].split('%')[0]) for line in lines[1:]]
+    assert len(rates) == 4 and rates == sorted(rates, reverse=True)
+
+
+def test_segments_endpoint(client, analysed):
+    body = client.get('/segments', query_string={
+        'dataset_id': analysed, 'by': 'Contract', 'sort': 'customers',
+        'order': 'asc'}).get_json()
+    assert body['success'] and body['by'] == ['contract']
+    counts = [record['customers'] for record in body['segments']]
+    assert counts == sorted(counts) and sum(counts) == 1500
+
+    body = client.get('/segments', query_string={'dataset_id': analysed,
+                                                 'top': 3}).get_json()
+    assert len(body['segments']) == 3
+    assert 'seniorcitizen,contract' in body['crossings']
+    assert all(record['customers'] >= 20 for record in body['segments'])
@@ -0,0 +1,62 @@
+"""Charting, reports and training are imported on first use, or preloaded."""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import ROOT
+
+HEAVY = ['matplotlib', 'reportlab', 'sklearn']
+
+LIGHT_REQUESTS = f"""
+import json, sys
+sys.path.insert(0, {ROOT!r})
+import app
+client = app.app.test_client()
+responses = [client.get('/'),
+             client.post('/predict_revenue', json={{'current_revenue': 1000}}),
+             client.post('/chat', json={{'query': 'what is the churn rate?'}})]
+statuses = [response.status_code for response in responses]
+loaded = [name for name in {HEAVY!r} if name in sys.modules]
+app.preload_analytics()
+preloaded = all(name in sys.modules for name in app.ANALYTICS_MODULES)
+print(json.dumps([statuses, loaded, preloaded]))
+"""
+
+GUNICORN_HOOK = f"""
+import json, runpy, sys
+sys.path.insert(0, {ROOT!r})
+
+class Log:
+    def info(self, *args):
+        pass
+
+class Server:
+    log = Log()
+
+settings = runpy.run_path({os.path.join(ROOT, 'gunicorn.conf.py')!r})
+settings['when_ready'](Server())
+print(json.dumps([settings['preload_app'], 'sklearn.ensemble' in sys.modules]))
+"""
+
+
+def run_python(code, tmp_path, **env):
+    (tmp_path / 'tmp').mkdir(exist_ok=True)
+    result = subprocess.run([sys.executable, '-c', textwrap.dedent(code)],
+                            cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, **env})
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_light_requests_do_not_load_the_analytics_stack(tmp_path):
+    statuses, loaded, preloaded = run_python(LIGHT_REQUESTS, tmp_path)
+    assert statuses == [200, 200, 200]
+    assert loaded == []
+    assert preloaded
+
+
+def test_gunicorn_master_preloads_the_stack(tmp_path):
+    assert run_python(GUNICORN_HOOK, tmp_path) == [True, True]
+    assert run_python(GUNICORN_HOOK, tmp_path, PRELOAD_ANALYTICS='0') == [True, False]
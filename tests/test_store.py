@@ -0,0 +1,68 @@
+"""Per-session analysis store shared by all workers through the disk."""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import AnalysisStore
+from conftest import upload
+
+
+def test_sessions_keep_their_own_dataset(small_csv, analysed):
+    from app import app
+    first, second = app.test_client(), app.test_client()
+    upload(first, small_csv)
+
+    assert first.get('/profile').get_json()['dataset_id'] == analysed
+    assert second.get('/profile').get_json() == {'success': False,
+                                                'error': 'No data uploaded yet'}
+    named = second.get('/profile', query_string={'dataset_id': analysed})
+    assert named.get_json()['dataset_id'] == analysed
+
+
+def test_entry_round_trips_through_disk(tmp_path):
+    store = AnalysisStore(str(tmp_path), max_bytes=10 ** 9)
+    df = pd.DataFrame({'contract': ['One year', 'Month-to-month', 'One year'],
+                       'tenure': np.array([1, 20, 5], dtype=np.int16)})
+    store.save('abc123', {'churn_rate': 0.25}, df, {'model': 'stub'},
+               {'cube': np.arange(4)})
+
+    other = AnalysisStore(str(tmp_path), max_bytes=10 ** 9)
+    assert other.load_analysis('abc123')['churn_rate'] == 0.25
+    pd.testing.assert_frame_equal(other.load_data('abc123').astype({'contract': str}),
+                                  df)
+    assert other.load_pipeline('abc123') == {'model': 'stub'}
+    assert other.load_array('abc123', 'cube').tolist() == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize('dataset_id', ['../abc', 'abc/def', '..', '', None,
+                                        'abc.tmp'])
+def test_ids_that_could_leave_the_store_are_refused(tmp_path, dataset_id):
+    store = AnalysisStore(str(tmp_path / 'store'), max_bytes=10 ** 9)
+    assert not store.valid_id(dataset_id)
+    assert not store.exists(dataset_id)
+    assert store.load_analysis(dataset_id) is None
+    with pytest.raises(KeyError):
+        store.path(dataset_id, 'analysis.json')
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = AnalysisStore(str(tmp_path), max_bytes=10 ** 9)
+    df = pd.DataFrame({'values': np.zeros(10000)})
+    for dataset_id in ('old', 'used', 'new'):
+        store.save(dataset_id, {}, df, {})
+        time.sleep(0.02)
+    store.load_analysis('used')
+
+    store.max_bytes = entry_size(store, 'used') + entry_size(store, 'new')
+    store.enforce_limit()
+    assert [store.exists(name) for name in ('old', 'used', 'new')] == [False, True,
+                                                                      True]
+
+
+def entry_size(store, dataset_id):
+    """Bytes on disk of a store entry."""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(store.path(dataset_id)) for name in names)